@@ -0,0 +1,37 @@
+"""add blobs content-addressed store
+
+Revision ID: add_blobs_001
+Revises: add_upload_sessions_001
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_blobs_001'
+down_revision = 'add_upload_sessions_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create blobs table mapping file_hash to a reference-counted stored object"""
+    op.create_table(
+        'blobs',
+        sa.Column('file_hash', sa.String(), primary_key=True),
+        sa.Column('file_path', sa.String(), nullable=False),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True)
+    )
+    # Garbage collection scans for unreferenced blobs
+    op.create_index('idx_blobs_ref_count_updated_at', 'blobs', ['ref_count', 'updated_at'])
+
+
+def downgrade() -> None:
+    """Drop blobs table"""
+    op.drop_index('idx_blobs_ref_count_updated_at', table_name='blobs')
+    op.drop_table('blobs')
@@ -0,0 +1,40 @@
+"""add document_texts derived-text store
+
+Revision ID: add_document_texts_001
+Revises: add_owner_email_001
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_document_texts_001'
+down_revision = 'add_owner_email_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create document_texts table holding per-page extracted text keyed by file_hash"""
+    op.create_table(
+        'document_texts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('file_hash', sa.String(), nullable=False),
+        sa.Column('extractor_version', sa.String(), nullable=False),
+        sa.Column('page_number', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('is_ocr', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('file_hash', 'extractor_version', 'page_number', name='uq_document_texts_page')
+    )
+    op.create_index('ix_document_texts_id', 'document_texts', ['id'])
+    op.create_index('ix_document_texts_file_hash', 'document_texts', ['file_hash'])
+
+
+def downgrade() -> None:
+    """Drop document_texts table"""
+    op.drop_index('ix_document_texts_file_hash', table_name='document_texts')
+    op.drop_index('ix_document_texts_id', table_name='document_texts')
+    op.drop_table('document_texts')
@@ -0,0 +1,25 @@
+"""add listing index on documents
+
+Revision ID: add_documents_listing_index_001
+Revises: add_document_texts_001
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_documents_listing_index_001'
+down_revision = 'add_document_texts_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add composite index used by keyset pagination of /documents/list"""
+    op.create_index('idx_documents_owner_email_created_at', 'documents', ['owner_email', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    """Drop the listing index"""
+    op.drop_index('idx_documents_owner_email_created_at', table_name='documents')
@@ -0,0 +1,42 @@
+"""add operation_results cache
+
+Revision ID: add_operation_results_001
+Revises: add_blobs_001
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_operation_results_001'
+down_revision = 'add_blobs_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create operation_results table caching derived outputs by input hash, operation and parameters"""
+    op.create_table(
+        'operation_results',
+        sa.Column('cache_key', sa.String(), primary_key=True),
+        sa.Column('operation', sa.String(), nullable=False),
+        sa.Column('source_hash', sa.String(), nullable=False),
+        sa.Column('outputs', sa.Text(), nullable=False),
+        sa.Column('total_size', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_operation_results_source_hash', 'operation_results', ['source_hash'])
+    # Eviction walks entries least recently used first
+    op.create_index('idx_operation_results_last_used_at', 'operation_results', ['last_used_at'])
+
+
+def downgrade() -> None:
+    """Drop operation_results table"""
+    op.drop_index('idx_operation_results_last_used_at', table_name='operation_results')
+    op.drop_index('ix_operation_results_source_hash', table_name='operation_results')
+    op.drop_table('operation_results')
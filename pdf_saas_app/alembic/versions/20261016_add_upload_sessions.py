@@ -0,0 +1,48 @@
+"""add upload_sessions for resumable uploads
+
+Revision ID: add_upload_sessions_001
+Revises: add_documents_listing_index_001
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_upload_sessions_001'
+down_revision = 'add_documents_listing_index_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create upload_sessions table tracking resumable chunked uploads"""
+    op.create_table(
+        'upload_sessions',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('owner_id', sa.String(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('mime_type', sa.String(), nullable=True),
+        sa.Column('total_size', sa.BigInteger(), nullable=True),
+        sa.Column('received_bytes', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(), nullable=False, server_default='active'),
+        sa.Column('staging_path', sa.String(), nullable=False),
+        sa.Column('storage_upload_id', sa.String(), nullable=True),
+        sa.Column('storage_parts', sa.Text(), nullable=True),
+        sa.Column('storage_uploaded_bytes', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('storage_key', sa.String(), nullable=True),
+        sa.Column('document_id', sa.String(), sa.ForeignKey('documents.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_upload_sessions_id', 'upload_sessions', ['id'])
+    op.create_index('ix_upload_sessions_owner_id', 'upload_sessions', ['owner_id'])
+
+
+def downgrade() -> None:
+    """Drop upload_sessions table"""
+    op.drop_index('ix_upload_sessions_owner_id', table_name='upload_sessions')
+    op.drop_index('ix_upload_sessions_id', table_name='upload_sessions')
+    op.drop_table('upload_sessions')
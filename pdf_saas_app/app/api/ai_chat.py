@@ -2,11 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, Body, status
 from sqlalchemy.orm import Session
 from typing import Dict, Optional
 from pydantic import BaseModel
+import openai
 
-from app.db.session import get_db
+from app.db.session import get_db, run_in_session
 from app.db.models import User, Document, ChatHistory
 from app.services.auth_services import get_current_active_user
 from app.services.llm_service import AIService
+from app.services.retrieval_service import retrieval_service
+from app.services.text_store_service import text_store_service
+from app.services.executor_service import executor_service
 
 router = APIRouter()
 ai_service = AIService()
@@ -54,8 +58,25 @@ async def chat_with_pdf(
                 detail="Document not found"
             )
         
-        # Get document text content
-        context = document.get_text_content()
+        # Text comes from the store (or OCR) before an "ai" slot is taken, so
+        # extraction never holds up model calls
+        try:
+            text = await text_store_service.load_document_text(document)
+        except FileNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="The original file is no longer available"
+            )
+        if not text:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Could not extract text content from document"
+            )
+        
+        # Only the passages most relevant to the question are sent, not the whole text
+        context = await executor_service.run_in_thread(
+            "ai", run_in_session, retrieval_service.get_context, document, chat_request.query, text=text
+        )
         if not context:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -63,7 +84,7 @@ async def chat_with_pdf(
             )
     
     # Generate AI response
-    response = ai_service.generate_chat_response(chat_request.query, context)
+    response = await executor_service.run_in_thread("ai", ai_service.generate_chat_response, chat_request.query, context)
     
     # Save chat history if a document was referenced
     conversation_id = None
@@ -107,7 +128,13 @@ async def summarize_document(
         )
     
     # Get document text content
-    context = document.get_text_content()
+    try:
+        context = await text_store_service.load_document_text(document)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The original file is no longer available"
+        )
     if not context:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -115,7 +142,13 @@ async def summarize_document(
         )
     
     # Generate summary
-    summary = ai_service.summarize_document(context, max_length)
+    try:
+        summary = await executor_service.run_in_thread("ai", ai_service.summarize_document, context, max_length)
+    except openai.RateLimitError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The AI service is busy, please try again later"
+        )
     
     return {"summary": summary}
 
@@ -127,5 +160,5 @@ async def check_grammar(
     """
     Check grammar and spelling in text
     """
-    result = ai_service.check_grammar(request.text)
+    result = await executor_service.run_in_thread("ai", ai_service.check_grammar, request.text)
     return result
\ No newline at end of file
@@ -1,29 +1,45 @@
 import os
+import asyncio
 import shutil
 import tempfile
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, status, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel
 import uuid
 from datetime import datetime
 from PIL import Image
-from sqlalchemy import func
-import subprocess
+from sqlalchemy import func, exists, or_, and_
 import time
 import logging
 import io
-import fitz  # PyMuPDF
+import base64
 import hashlib
+import json
+import fitz  # PyMuPDF
 import mimetypes
 
-from app.db.session import get_db
-from app.db.models import User, Document
+from app.db.session import get_db, SessionLocal, run_in_session
+from app.db.models import User, Document, DocumentText, UploadSession
 from app.services.auth_services import get_current_active_user
 from app.services.storage_service import StorageService
 from app.core.pdf_operations import PDFProcessor
+from app.core import watermark
+from app.core.rasterizer import RASTER_FORMATS, select_pages
+from app.core.compression import DEFAULT_PROFILE, get_profile as get_compression_profile
+from app.services.text_store_service import text_store_service
+from app.services.executor_service import executor_service
 from app.utils.cache import cache_response, invalidate_cache, CacheManager
+from app.utils.streaming import stream_document, etag_matches, stream_zip, content_disposition
+from app.services.ingest_service import IngestPipeline, ingest_file_object
+from app.services.upload_session_service import upload_session_service, UploadOffsetError
+from app.services.blob_store_service import blob_store_service
+from app.services.operation_cache_service import operation_cache_service
+from app.services.redis_service import redis_service
+from app.services.thumbnail_service import thumbnail_service
+from app.config import settings
+from app.utils.file_utils import compute_file_hash
 
 def validate_file_type(file: UploadFile, allowed_extensions: List[str], allowed_mime_types: List[str]) -> None:
     """
@@ -78,149 +94,434 @@ class DocumentOperationResponse(BaseModel):
     class Config:
         from_attributes = True
 
-@router.post("/upload", response_model=DocumentResponse)
-@invalidate_cache("doc_list:*")  # Invalidate document list cache
-async def upload_document(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-):
+class DocumentListResponse(BaseModel):
+    documents: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+class DocumentTextResponse(BaseModel):
+    id: str
+    page_count: int
+    text: str
+    pages: Optional[List[Dict[str, Any]]] = None
+
+# Metadata fields that can be requested from /documents/list via ?fields=
+DOCUMENT_LIST_FIELDS = ("id", "filename", "content_type", "file_type", "file_size", "created_at", "download_url", "has_text")
+MAX_LIST_LIMIT = 200
+
+def _encode_list_cursor(created_at: datetime, document_id: str) -> str:
+    """Encode a keyset pagination cursor from the last (created_at, id) pair"""
+    raw = f"{created_at.isoformat()}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_list_cursor(cursor: str):
+    """Decode a cursor produced by _encode_list_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, document_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), document_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+def _delete_document(db: Session, document: Document) -> None:
     """
-    Upload any document file
+    Delete a document record and drop its references to shared content
+    The stored blob is garbage-collected, and the extracted text dropped, once
+    no other document references the same content.
     """
-    # Get file extension and determine file type
-    file_extension = os.path.splitext(file.filename)[1].lower()
-    
-    # Determine file type based on extension
-    file_type_mapping = {
-        '.pdf': 'pdf',
-        '.doc': 'doc',
-        '.docx': 'docx',
-        '.xls': 'xls',
-        '.xlsx': 'xlsx',
-        '.ppt': 'ppt',
-        '.pptx': 'pptx',
-        '.txt': 'txt',
-        '.rtf': 'rtf',
-        '.odt': 'odt',
-        '.ods': 'ods',
-        '.odp': 'odp',
-        '.csv': 'csv',
-        '.jpg': 'jpg',
-        '.jpeg': 'jpg',
-        '.png': 'png',
-        '.gif': 'gif',
-        '.bmp': 'bmp',
-        '.tiff': 'tiff',
-        '.tif': 'tiff'
-    }
-    
-    file_type = file_type_mapping.get(file_extension, 'unknown')
-    
-    # Create temp file with appropriate suffix
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_extension)
+    file_hash = document.file_hash
+    blob_store_service.release(db, document)
+    db.delete(document)
+    db.commit()
+    text_store_service.release(db, file_hash)
+
+async def _adopt_stored(db: Session, file_hash: str, file_path: str, file_size: int) -> str:
+    """blob_store_service.adopt_stored on the request session, deleting a redundant object in a thread"""
+    redundant: List[str] = []
+    file_path = blob_store_service.adopt_stored(db, file_hash, file_path, file_size, redundant)
+    for path in redundant:
+        await executor_service.run_in_thread("storage", StorageService().delete_file, path)
+    return file_path
+
+async def _store_file(db: Session, local_path: str, filename: str) -> Tuple[str, str]:
+    """
+    blob_store_service.store_file for async endpoints
+    Hashing and the upload run in the thread pool; the reference is taken on the
+    request session, so it is committed (or rolled back) with the Document as before.
+    Returns:
+        (file_path, file_hash)
+    """
+    file_hash = await executor_service.run_in_thread("storage", compute_file_hash, local_path)
+    blob = blob_store_service.acquire(db, file_hash)
+    if blob is not None:
+        logger.info(f"Deduplicated {filename} against blob {file_hash[:12]}")
+        return blob.file_path, file_hash
+    stored = await executor_service.run_in_thread(
+        "storage", blob_store_service.upload_object, local_path, filename, file_hash
+    )
+    return await _adopt_stored(db, file_hash, stored["file_path"], stored["file_size"]), file_hash
+
+async def _finalize_upload(
+    ingested: Dict[str, Any],
+    filename: str,
+    db: Session,
+    current_user: User
+) -> DocumentResponse:
+    """Record an ingested upload: duplicate check, document row and text extraction for PDFs"""
+    storage_service = StorageService()
     try:
-        # Save uploaded file to temp location
-        with temp_file as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Compute file hash for deduplication
-        def compute_file_hash(file_path):
-            hasher = hashlib.sha256()
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
-        file_hash = compute_file_hash(temp_file.name)
-        
-        # Check for duplicate for this user
-        existing_doc = db.query(Document).filter_by(file_hash=file_hash, owner_id=current_user.id).first()
+        # Check for duplicate for this user; the object is already stored, so drop it again
+        existing_doc = db.query(Document).filter_by(file_hash=ingested["file_hash"], owner_id=current_user.id).first()
         if existing_doc:
+            await executor_service.run_in_thread("storage", storage_service.delete_file, ingested["file_path"])
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Duplicate file. Document already uploaded.",
                 headers={"X-Existing-Document-ID": existing_doc.id}
             )
         
-        # Get file size
-        file_size = os.path.getsize(temp_file.name)
-        
-        # Upload to storage
-        storage_service = StorageService()
-        file_path = storage_service.upload_file(temp_file.name, file.filename)
-        
-        # Determine MIME type
-        mime_type = file.content_type if file.content_type else 'application/octet-stream'
+        # Register the stored object as a blob; identical content uploaded by anyone
+        # before is reused and the new copy dropped
+        file_path = await _adopt_stored(db, ingested["file_hash"], ingested["file_path"], ingested["file_size"])
+        if file_path != ingested["file_path"] and storage_service.storage_type == "local":
+            ingested["local_path"] = storage_service.get_file(file_path)
         
         # Save document in database
         db_document = Document(
-            filename=file.filename,
-            original_filename=file.filename,
+            filename=filename,
+            original_filename=filename,
             file_path=file_path,
-            file_size=file_size,
-            mime_type=mime_type,
-            file_type=file_type,
+            file_size=ingested["file_size"],
+            mime_type=ingested["mime_type"],
+            file_type=ingested["file_type"],
             owner_id=current_user.id,
             owner_email=current_user.email,  # Store email for resilience
-            file_hash=file_hash
+            file_hash=ingested["file_hash"]
         )
         
         db.add(db_document)
         db.commit()
         db.refresh(db_document)
         
-        # Extract text content only for PDFs
+        # Page strip thumbnails are rendered by a worker in the background
+        if ingested["file_type"] == 'pdf':
+            await executor_service.run_in_thread("storage", thumbnail_service.schedule_sprites, db_document)
+        
+        # Extract text content only for PDFs and persist it in the derived-text store,
+        # reading the local copy the ingest pipeline already produced
         text_content = None
-        if file_type == 'pdf':
+        if ingested["file_type"] == 'pdf' and ingested["local_path"]:
             try:
-                text_content = pdf_processor.extract_text(temp_file.name)
+                text_content = await executor_service.run_in_thread(
+                    "ocr", run_in_session, text_store_service.extract_and_store, ingested["file_hash"], ingested["local_path"]
+                )
             except Exception as e:
                 logger.warning(f"Could not extract text from PDF: {str(e)}")
         
         return DocumentResponse(
             id=db_document.id,
             filename=db_document.filename,
-            content_type=mime_type,
+            content_type=db_document.mime_type,
             text_content=text_content,
             created_at=db_document.created_at,
             download_url=f"/documents/{db_document.id}/download"
         )
-    
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_file.name):
-            os.remove(temp_file.name)
+        if ingested["local_path"]:
+            storage_service.release_file(ingested["local_path"])
 
-@router.get("/list", response_model=List[DocumentResponse])
+@router.post("/upload", response_model=DocumentResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
+async def upload_document(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Upload any document file
+    The file is hashed, sized, sniffed and written to storage in a single pass.
+    """
+    try:
+        ingested = await executor_service.run_in_thread(
+            "storage", ingest_file_object, file.file, file.filename, file.content_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return await _finalize_upload(ingested, file.filename, db, current_user)
+
+@router.put("/upload/stream", response_model=DocumentResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
+async def upload_document_stream(
+    request: Request,
+    filename: str = Query(..., min_length=1),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Upload a document as the raw request body (no multipart form)
+    Storage writes (S3 multipart parts, Azure blocks) start while the client is still sending.
+    """
+    filename = os.path.basename(filename)
+    pipeline = await executor_service.run_in_thread("storage", IngestPipeline, filename)
+    try:
+        try:
+            buffer = bytearray()
+            async for chunk in request.stream():
+                buffer += chunk
+                if len(buffer) >= settings.INGEST_CHUNK_SIZE:
+                    await executor_service.run_in_thread("storage", pipeline.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await executor_service.run_in_thread("storage", pipeline.write, bytes(buffer))
+            if pipeline.size == 0:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty upload")
+            ingested = await executor_service.run_in_thread(
+                "storage", pipeline.finish, request.headers.get("content-type")
+            )
+        except BaseException:
+            # Includes client disconnects mid-upload
+            await executor_service.run_in_thread("storage", pipeline.abort)
+            raise
+    except ValueError as e:
+        # Content does not match the extension
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return await _finalize_upload(ingested, filename, db, current_user)
+
+class UploadSessionCreateRequest(BaseModel):
+    filename: str
+    total_size: Optional[int] = None
+    mime_type: Optional[str] = None
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    filename: str
+    offset: int
+    total_size: Optional[int] = None
+    status: str
+    expires_at: datetime
+    chunk_url: str
+    finalize_url: str
+
+def _upload_session_response(upload: UploadSession) -> UploadSessionResponse:
+    base_url = f"/documents/uploads/{upload.id}"
+    return UploadSessionResponse(
+        id=upload.id,
+        filename=upload.filename,
+        offset=upload.received_bytes,
+        total_size=upload.total_size,
+        status=upload.status,
+        expires_at=upload.expires_at,
+        chunk_url=f"{base_url}?offset={upload.received_bytes}",
+        finalize_url=f"{base_url}/finalize"
+    )
+
+def _get_upload_session(db: Session, upload_id: str, current_user: User) -> UploadSession:
+    upload = upload_session_service.get_session(db, upload_id, current_user.id)
+    if not upload:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found"
+        )
+    return upload
+
+def _finalize_upload_session(db: Session, upload_id: str) -> Dict[str, Any]:
+    # Runs in an executor thread on a session of its own (see run_in_session)
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id).one()
+    if not upload_session_service.lock_row(db, upload):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A chunk is still being written to this upload")
+    return upload_session_service.finalize(db, upload)
+
+def _abort_upload_session(db: Session, upload_id: str) -> None:
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id).one()
+    upload_session_service.abort(db, upload)
+
+def _offset_conflict(e: UploadOffsetError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=str(e),
+        headers={"Upload-Offset": str(e.expected_offset)}
+    )
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    upload_request: UploadSessionCreateRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Start a resumable upload
+    Send the file with PUT /uploads/{id}?offset=N (raw body, any chunk size, in order),
+    check progress with GET /uploads/{id} after a dropped connection, then POST /uploads/{id}/finalize.
+    """
+    try:
+        upload = await executor_service.run_in_thread(
+            "storage", run_in_session, upload_session_service.create_session, current_user.id,
+            upload_request.filename, upload_request.total_size, upload_request.mime_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _upload_session_response(upload)
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Current offset of a resumable upload (where the next chunk must start)"""
+    return _upload_session_response(_get_upload_session(db, upload_id, current_user))
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Append a chunk (raw request body) at offset
+    Bytes are committed as they arrive, so a chunk cut off midway can be resumed from the returned offset.
+    """
+    upload = _get_upload_session(db, upload_id, current_user)
+    write_lock = upload_session_service.write_lock(upload.id)
+    if not write_lock.acquire(blocking=False):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another chunk is being written to this upload")
+    try:
+        # Held until the commit below, against requests served by other workers
+        if not upload_session_service.lock_row(db, upload):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Another chunk is being written to this upload")
+        try:
+            upload_session_service.check_offset(upload, offset)
+        except UploadOffsetError as e:
+            raise _offset_conflict(e)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        buffer = bytearray()
+        try:
+            async for chunk in request.stream():
+                buffer += chunk
+                if len(buffer) >= settings.INGEST_CHUNK_SIZE:
+                    await executor_service.run_in_thread("storage", upload_session_service.append, upload, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await executor_service.run_in_thread("storage", upload_session_service.append, upload, bytes(buffer))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        finally:
+            # Keep whatever was written, even if the client went away mid-chunk
+            db.commit()
+        return _upload_session_response(upload)
+    finally:
+        write_lock.release()
+
+@router.post("/uploads/{upload_id}/finalize", response_model=DocumentResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
+async def finalize_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Finish a resumable upload and create the document (409 on duplicate content)"""
+    upload = _get_upload_session(db, upload_id, current_user)
+    write_lock = upload_session_service.write_lock(upload.id)
+    if not write_lock.acquire(blocking=False):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A chunk is still being written to this upload")
+    try:
+        try:
+            ingested = await executor_service.run_in_thread("storage", run_in_session, _finalize_upload_session, upload.id)
+        except UploadOffsetError as e:
+            raise _offset_conflict(e)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    finally:
+        write_lock.release()
+
+    document = await _finalize_upload(ingested, upload.filename, db, current_user)
+    upload.document_id = document.id
+    db.commit()
+    return document
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Abort a resumable upload and discard staged data"""
+    upload = _get_upload_session(db, upload_id, current_user)
+    await executor_service.run_in_thread("storage", run_in_session, _abort_upload_session, upload.id)
+    return {"message": "Upload aborted"}
+
+@router.get("/list", response_model=DocumentListResponse)
 @cache_response(ttl=300, key_prefix="doc_list")  # Cache for 5 minutes
 async def list_documents(
+    fields: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_LIST_LIMIT),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    List all documents owned by the current user (by email)
+    List documents owned by the current user (by email), newest first.
+    
+    Returns metadata only; text is served by /documents/{id}/text.
+    - fields: optional comma-separated subset of DOCUMENT_LIST_FIELDS
+    - limit/cursor: keyset pagination, pass back next_cursor to get the next page
     """
+    if fields:
+        selected_fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown_fields = set(selected_fields) - set(DOCUMENT_LIST_FIELDS)
+        if unknown_fields:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}. Allowed: {', '.join(DOCUMENT_LIST_FIELDS)}"
+            )
+    else:
+        selected_fields = list(DOCUMENT_LIST_FIELDS)
+    
+    # has_text is answered from the derived-text store without touching any file
+    has_text = exists().where(
+        DocumentText.file_hash == Document.file_hash,
+        DocumentText.extractor_version == text_store_service.extractor_version
+    ).label("has_text")
+    
     # Use email-based filtering for better resilience
-    documents = db.query(Document).filter(Document.owner_email == current_user.email).all()
+    query = db.query(Document, has_text).filter(Document.owner_email == current_user.email)
     
-    # Convert Document models to DocumentResponse models
-    response_documents = []
-    for doc in documents:
-        # Get text content only for PDFs
-        text_content = None
-        if doc.file_type == 'pdf':
-            text_content = doc.get_text_content()
-        
-        response_documents.append(DocumentResponse(
-            id=doc.id,
-            filename=doc.filename,
-            content_type=doc.mime_type or "application/octet-stream",
-            text_content=text_content,
-            created_at=doc.created_at,
-            download_url=f"/documents/{doc.id}/download"
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = _decode_list_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(
+            Document.created_at < cursor_created_at,
+            and_(Document.created_at == cursor_created_at, Document.id < cursor_id)
         ))
     
-    return response_documents
+    rows = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_doc = rows[-1][0]
+        next_cursor = _encode_list_cursor(last_doc.created_at, last_doc.id)
+    
+    response_documents = []
+    for doc, doc_has_text in rows:
+        item = {
+            "id": doc.id,
+            "filename": doc.filename,
+            "content_type": doc.mime_type or "application/octet-stream",
+            "file_type": doc.file_type,
+            "file_size": doc.file_size,
+            "created_at": doc.created_at,
+            "download_url": f"/documents/{doc.id}/download",
+            "has_text": bool(doc_has_text)
+        }
+        response_documents.append({field: item[field] for field in selected_fields})
+    
+    return DocumentListResponse(documents=response_documents, next_cursor=next_cursor)
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 @cache_response(ttl=600, key_prefix="doc_detail")  # Cache for 10 minutes
@@ -247,7 +548,10 @@ async def get_document(
     # Get text content only for PDFs
     text_content = None
     if document.file_type == 'pdf':
-        text_content = document.get_text_content()
+        try:
+            text_content = await text_store_service.load_document_text(document)
+        except Exception as e:
+            logger.error(f"Error extracting text content for document {document_id}: {str(e)}")
     
     return DocumentResponse(
         id=document.id,
@@ -258,14 +562,57 @@ async def get_document(
         download_url=f"/documents/{document.id}/download"
     )
 
+@router.get("/{document_id}/text", response_model=DocumentTextResponse)
+async def get_document_text(
+    document_id: str,
+    include_pages: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get the extracted text of a document from the derived-text store
+    (extracted and persisted on first request)
+    """
+    document = db.query(Document).filter(Document.id == document_id, Document.owner_email == current_user.email).first()
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    if document.file_type != 'pdf':
+        raise HTTPException(status_code=400, detail="Text is only available for PDF documents")
+    
+    try:
+        text = await text_store_service.load_document_text(document)
+    except FileNotFoundError as e:
+        logger.error(f"File not found for document {document_id}: {str(e)}")
+        raise HTTPException(
+            status_code=404,
+            detail="The file is no longer available. Please upload the file again."
+        )
+    
+    stored_pages = text_store_service.get_pages(db, document.file_hash) or []
+    pages = None
+    if include_pages:
+        pages = [{"page": p.page_number, "text": p.text, "ocr": p.is_ocr} for p in stored_pages]
+    
+    return DocumentTextResponse(
+        id=document.id,
+        page_count=len(stored_pages),
+        text=text or "",
+        pages=pages
+    )
+
 @router.get("/{document_id}/download")
 async def download_document(
     document_id: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Download a document by ID (email-based validation)
+    Streams from storage and supports Range, If-None-Match and If-Range (ETag is the file hash).
     """
     document = db.query(Document).filter(Document.id == document_id, Document.owner_email == current_user.email).first()
     if not document:
@@ -278,19 +625,12 @@ async def download_document(
         # Update last accessed timestamp
         document.last_accessed = func.now()
         db.commit()
-        # Get the file from storage and return it
-        storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
-        return FileResponse(
-            local_file_path,
-            media_type=document.mime_type or "application/octet-stream",
-            filename=document.filename
-        )
+        # Stream the file straight from storage
+        return await stream_document(request, document)
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
         # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
+        _delete_document(db, document)
         logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
@@ -298,54 +638,152 @@ async def download_document(
         )
 
 @router.post("/merge", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def merge_documents(
     document_ids: List[str] = Form(...),
     output_filename: str = Form("merged.pdf"),
+    page_ranges: Optional[str] = Form(None),  # JSON list aligned with document_ids, e.g. ["1-3", null, "5-"]
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Merge multiple documents into a single PDF
+    Merge multiple documents into a single PDF, optionally selecting pages from each
     """
-    # Check that all documents exist and are owned by the user
+    ranges = None
+    if page_ranges:
+        try:
+            ranges = json.loads(page_ranges)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid page_ranges format")
+        if not isinstance(ranges, list) or len(ranges) != len(document_ids):
+            raise HTTPException(status_code=400, detail="page_ranges must have one entry per document")
+    
+    # Check that all documents exist and are owned by the user; each file is leased until the merge is done
+    storage_service = StorageService()
     pdf_paths = []
-    for doc_id in document_ids:
-        document = db.query(Document).filter(Document.id == doc_id, Document.owner_id == current_user.id).first()
-        if not document:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Document with ID {doc_id} not found or not owned by user"
-            )
+    try:
+        for doc_id in document_ids:
+            document = db.query(Document).filter(Document.id == doc_id, Document.owner_id == current_user.id).first()
+            if not document:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Document with ID {doc_id} not found or not owned by user"
+                )
         
+            try:
+                # Get file from storage
+                local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+                pdf_paths.append(local_file_path)
+            except FileNotFoundError as e:
+                logger.error(f"File not found for document {doc_id}: {str(e)}")
+                # Delete the orphaned database record
+                _delete_document(db, document)
+                logger.info(f"Deleted orphaned document record: {doc_id}")
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Document {doc_id} is no longer available. The document record has been cleaned up. Please upload the file again."
+                )
+    
+        # Create temp output file
+        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
+    
         try:
-            # Get file from storage
-            storage_service = StorageService()
-            local_file_path = storage_service.get_file(document.file_path)
-            pdf_paths.append(local_file_path)
-        except FileNotFoundError as e:
-            logger.error(f"File not found for document {doc_id}: {str(e)}")
-            # Delete the orphaned database record
-            db.delete(document)
+            # Merge PDFs
+            try:
+                await executor_service.run_in_process("merge", pdf_processor.merge_pdfs, pdf_paths, output_path, ranges)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+            # Get merged file size
+            file_size = os.path.getsize(output_path)
+        
+            # Upload merged file to storage
+            file_path, file_hash = await _store_file(db, output_path, output_filename)
+        
+            # Save document in database
+            db_document = Document(
+                filename=output_filename,
+                original_filename=output_filename,
+                file_path=file_path,
+                file_size=file_size,
+                mime_type="application/pdf",
+                owner_id=current_user.id,
+                owner_email=current_user.email,
+                file_hash=file_hash
+            )
+        
+            db.add(db_document)
             db.commit()
-            logger.info(f"Deleted orphaned document record: {doc_id}")
-            raise HTTPException(
-                status_code=404,
-                detail=f"Document {doc_id} is no longer available. The document record has been cleaned up. Please upload the file again."
+            db.refresh(db_document)
+        
+            return DocumentOperationResponse(
+                id=db_document.id,
+                filename=db_document.filename,
+                content_type="application/pdf",
+                created_at=db_document.created_at,
+                download_url=f"/documents/{db_document.id}/download",
+                message="Documents merged successfully"
             )
     
-    # Create temp output file
-    output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
-    
+        finally:
+            # Clean up temp files
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    finally:
+        for local_file_path in pdf_paths:
+            storage_service.release_file(local_file_path)
+
+def _watermark_params(watermark_text: Optional[str], image_data: Optional[bytes], opacity: float,
+                      rotation: float, pages: Optional[str], color: Optional[str]) -> Dict[str, Any]:
+    """Operation cache parameters of a watermark request (images are keyed by their hash)"""
+    return {
+        "text": watermark_text if not image_data else None,
+        "image": hashlib.sha256(image_data).hexdigest() if image_data else None,
+        "opacity": opacity,
+        "rotation": rotation,
+        "pages": pages or None,
+        "color": color
+    }
+
+async def _watermark_document(db: Session, document: Document, owner_id: str, owner_email: str, stamp: bytes,
+                              rotation: float, pages: Optional[str], params: Dict[str, Any]) -> Document:
+    """
+    Create a watermarked copy of a document with a stamp from watermark.build_stamp
+    The output comes from the operation cache when the same watermark was applied to the same content.
+    """
+    output_filename = f"watermarked_{document.filename}"
+    output_path = None
     try:
-        # Merge PDFs
-        pdf_processor.merge_pdfs(pdf_paths, output_path)
-        
-        # Get merged file size
-        file_size = os.path.getsize(output_path)
-        
-        # Upload merged file to storage
-        storage_service = StorageService()
-        file_path = storage_service.upload_file(output_path, output_filename)
+        cached = operation_cache_service.get(db, document.file_hash, "watermark", params)
+        if cached:
+            file_path, file_hash, file_size = cached[0]["file_path"], cached[0]["file_hash"], cached[0]["file_size"]
+        else:
+            # Get file from storage
+            storage_service = StorageService()
+            local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+            logger.info(f"Retrieved local file path: {local_file_path}")
+            
+            try:
+                # Create temp output file
+                output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
+                
+                # Add watermark
+                logger.info(f"Starting watermark process for {document.filename}")
+                await executor_service.run_in_process(
+                    "watermark", pdf_processor.add_watermark, local_file_path, None, output_path,
+                    rotation=rotation, page_range=pages, stamp=stamp
+                )
+            finally:
+                storage_service.release_file(local_file_path)
+            
+            # Get file size
+            file_size = os.path.getsize(output_path)
+            logger.info(f"Watermarked PDF size: {file_size} bytes")
+            
+            # Upload to storage
+            file_path, file_hash = await _store_file(db, output_path, output_filename)
+            logger.info(f"Uploaded watermarked PDF to storage: {file_path}")
+            operation_cache_service.put(db, document.file_hash, "watermark", params, [(file_hash, output_filename)])
         
         # Save document in database
         db_document = Document(
@@ -354,39 +792,143 @@ async def merge_documents(
             file_path=file_path,
             file_size=file_size,
             mime_type="application/pdf",
-            owner_id=current_user.id
+            owner_id=owner_id,
+            owner_email=owner_email,
+            file_hash=file_hash
         )
         
         db.add(db_document)
         db.commit()
         db.refresh(db_document)
-        
-        return DocumentOperationResponse(
-            id=db_document.id,
-            filename=db_document.filename,
-            content_type="application/pdf",
-            created_at=db_document.created_at,
-            download_url=f"/documents/{db_document.id}/download",
-            message="Documents merged successfully"
-        )
-    
+        return db_document
+    except Exception:
+        db.rollback()
+        raise
     finally:
         # Clean up temp files
-        if os.path.exists(output_path):
+        if output_path and os.path.exists(output_path):
             os.remove(output_path)
+            logger.info(f"Cleaned up temporary file: {output_path}")
+
+@router.post("/watermark/batch")
+async def batch_watermark(
+    document_ids: List[str] = Form(...),
+    watermark_text: Optional[str] = Form(None),
+    watermark_image: Optional[UploadFile] = File(None),  # PNG/JPEG stamped instead of text
+    opacity: float = Form(0.3),  # 0 (invisible) to 1 (opaque)
+    rotation: float = Form(45),  # degrees counter-clockwise
+    pages: Optional[str] = Form(None),  # 1-based page range applied to every document
+    color: Optional[str] = Form(None),  # text color as #rrggbb
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Watermark many documents with the same stamp, streaming one NDJSON line per document.
+    
+    The stamp is built once and shared by all documents, which are processed
+    WATERMARK_BATCH_CONCURRENCY at a time. Lines are written in completion order:
+    {"document_id", "status": "ok", "id", "filename", "download_url"} or
+    {"document_id", "status": "error", "error"}, followed by a final
+    {"done": true, "succeeded", "failed"} line.
+    """
+    document_ids = list(dict.fromkeys(document_ids))
+    logger.info(f"Batch watermark request for {len(document_ids)} documents by user {current_user.id}")
+    if len(document_ids) > settings.WATERMARK_BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.WATERMARK_BATCH_MAX_DOCUMENTS} documents can be watermarked at once"
+        )
+    
+    image_data = await watermark_image.read() if watermark_image else None
+    if (not watermark_text) == (not image_data):
+        raise HTTPException(status_code=400, detail="Provide either watermark_text or watermark_image")
+    try:
+        stamp = await executor_service.run_in_thread(
+            "watermark", watermark.build_stamp, None if image_data else watermark_text, image_data, opacity, color
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    params = _watermark_params(watermark_text, image_data, opacity, rotation, pages, color)
+    owner_id, owner_email = current_user.id, current_user.email
+    semaphore = asyncio.Semaphore(settings.WATERMARK_BATCH_CONCURRENCY)
+    
+    async def process(document_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            # Each document gets its own session; the request session is not shared across tasks
+            task_db = SessionLocal()
+            try:
+                document = task_db.query(Document).filter(Document.id == document_id, Document.owner_id == owner_id).first()
+                if not document:
+                    return {"document_id": document_id, "status": "error", "error": "Document not found"}
+                db_document = await _watermark_document(task_db, document, owner_id, owner_email, stamp, rotation, pages, params)
+                return {
+                    "document_id": document_id,
+                    "status": "ok",
+                    "id": db_document.id,
+                    "filename": db_document.filename,
+                    "download_url": f"/documents/{db_document.id}/download"
+                }
+            except FileNotFoundError:
+                return {"document_id": document_id, "status": "error", "error": "The original file is no longer available"}
+            except Exception as e:
+                logger.error(f"Error watermarking document {document_id} in batch: {str(e)}")
+                return {"document_id": document_id, "status": "error", "error": str(e)}
+            finally:
+                task_db.close()
+    
+    async def generate_results():
+        tasks = [asyncio.ensure_future(process(document_id)) for document_id in document_ids]
+        succeeded = failed = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                if result["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client went away: stop documents that have not finished
+            for task in tasks:
+                task.cancel()
+            if succeeded and settings.CACHE_ENABLED:
+                redis_service.clear_cache_pattern("doc_list:*")
+        yield json.dumps({"done": True, "succeeded": succeeded, "failed": failed}) + "\n"
+    
+    return StreamingResponse(
+        generate_results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.post("/{document_id}/watermark", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def add_watermark(
     document_id: str,
-    watermark_text: str = Form(...),
+    watermark_text: Optional[str] = Form(None),
+    watermark_image: Optional[UploadFile] = File(None),  # PNG/JPEG stamped instead of text
+    opacity: float = Form(0.3),  # 0 (invisible) to 1 (opaque)
+    rotation: float = Form(45),  # degrees counter-clockwise
+    pages: Optional[str] = Form(None),  # 1-based page range, e.g. "1-3,7" (all pages when empty)
+    color: Optional[str] = Form(None),  # text color as #rrggbb
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Add a watermark to a PDF document
+    Add a text or image watermark to a PDF document
     """
     logger.info(f"Watermark request for document {document_id} by user {current_user.id}")
     
+    image_data = await watermark_image.read() if watermark_image else None
+    if (not watermark_text) == (not image_data):
+        raise HTTPException(status_code=400, detail="Provide either watermark_text or watermark_image")
+    try:
+        stamp = await executor_service.run_in_thread(
+            "watermark", watermark.build_stamp, None if image_data else watermark_text, image_data, opacity, color
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Get document
     document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
     if not document:
@@ -397,42 +939,8 @@ async def add_watermark(
         )
     
     try:
-        # Get file from storage
-        storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
-        logger.info(f"Retrieved local file path: {local_file_path}")
-        
-        # Create temp output file
-        output_filename = f"watermarked_{document.filename}"
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
-        
-        # Add watermark
-        logger.info(f"Starting watermark process for {document.filename}")
-        pdf_processor.add_watermark(local_file_path, watermark_text, output_path)
-        
-        # Get file size
-        file_size = os.path.getsize(output_path)
-        logger.info(f"Watermarked PDF size: {file_size} bytes")
-        
-        # Upload to storage
-        storage_service = StorageService()
-        file_path = storage_service.upload_file(output_path, output_filename)
-        logger.info(f"Uploaded watermarked PDF to storage: {file_path}")
-        
-        # Save document in database
-        db_document = Document(
-            filename=output_filename,
-            original_filename=output_filename,
-            file_path=file_path,
-            file_size=file_size,
-            mime_type="application/pdf",
-            owner_id=current_user.id
-        )
-        
-        db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
-        
+        params = _watermark_params(watermark_text, image_data, opacity, rotation, pages, color)
+        db_document = await _watermark_document(db, document, current_user.id, current_user.email, stamp, rotation, pages, params)
         logger.info(f"Successfully created watermarked document with ID: {db_document.id}")
         
         return DocumentOperationResponse(
@@ -447,27 +955,24 @@ async def add_watermark(
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
         # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
+        _delete_document(db, document)
         logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
             detail="The original file is no longer available. The document record has been cleaned up. Please upload the file again."
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error adding watermark to PDF {document_id}: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to add watermark: {str(e)}"
         )
-    finally:
-        # Clean up temp files
-        if 'output_path' in locals() and os.path.exists(output_path):
-            os.remove(output_path)
-            logger.info(f"Cleaned up temporary file: {output_path}")
 
 @router.delete("/{document_id}")
 @invalidate_cache("doc_list:*")  # Invalidate document list cache
+@invalidate_cache("doc_detail:*")  # Invalidate document detail cache
 async def delete_document(
     document_id: str,
     db: Session = Depends(get_db),
@@ -483,13 +988,7 @@ async def delete_document(
             detail="Document not found"
         )
     
-    # Delete from storage
-    storage_service = StorageService()
-    storage_service.delete_file(document.file_path)
-    
-    # Delete from database
-    db.delete(document)
-    db.commit()
+    _delete_document(db, document)
     
     return {"message": "Document deleted successfully"}
 
@@ -504,64 +1003,182 @@ async def extract_text_from_pdf(
         raise HTTPException(status_code=404, detail="Document not found")
     
     try:
-        storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
-        text = pdf_processor.extract_text(local_file_path)
+        text = await text_store_service.load_document_text(document)
         return {"text": text}
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
         # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
+        _delete_document(db, document)
         logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
             detail="The file is no longer available. The document record has been cleaned up. Please upload the file again."
         )
 
+@router.get("/{document_id}/extract-text/stream")
+async def stream_text_from_pdf(
+    document_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Stream extracted text page by page as {page, text, ocr, ms} events.
+    
+    - format=ndjson: one JSON object per line (application/x-ndjson)
+    - format=sse: Server-Sent Events with a "page" event per page and a final "done" event
+    
+    Pages already in the derived-text store are replayed from it; otherwise pages are
+    emitted as the OCR engine produces them and persisted in batches of
+    TEXT_STREAM_BATCH_PAGES, becoming visible to reads once the stream completes.
+    """
+    document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    stored_pages = text_store_service.get_pages(db, document.file_hash)
+    storage_service = StorageService()
+    local_file_path = None
+    if stored_pages is None:
+        try:
+            # Leased until the stream ends; OCR reopens the file for every page
+            local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+        except FileNotFoundError as e:
+            logger.error(f"File not found for document {document_id}: {str(e)}")
+            raise HTTPException(
+                status_code=404,
+                detail="The file is no longer available. Please upload the file again."
+            )
+    
+    file_hash = document.file_hash
+    
+    def generate_pages():
+        if stored_pages is not None:
+            for stored in stored_pages:
+                yield {"page": stored.page_number, "text": stored.text or "", "ocr": bool(stored.is_ocr), "ms": 0}
+            return
+        
+        # Persist in a fresh session; the request session may already be closed while streaming
+        store_db = SessionLocal() if file_hash else None
+        
+        def persist(write, *args) -> None:
+            # A failed write stops persisting, not the stream
+            nonlocal store_db
+            if store_db is None:
+                return
+            try:
+                write(store_db, file_hash, *args)
+            except Exception as e:
+                logger.warning(f"Could not persist streamed text for {file_hash}: {str(e)}")
+                store_db.rollback()
+                store_db.close()
+                store_db = None
+        
+        run = text_store_service.begin_pages()
+        batch = []
+        finished = False
+        try:
+            try:
+                for page in pdf_processor.iter_pages(local_file_path):
+                    batch.append(page)
+                    yield page
+                    if len(batch) >= settings.TEXT_STREAM_BATCH_PAGES:
+                        persist(text_store_service.append_pages, run, batch)
+                        batch = []
+            finally:
+                storage_service.release_file(local_file_path)
+            persist(text_store_service.append_pages, run, batch)
+            persist(text_store_service.finish_pages, run)
+            finished = True
+        finally:
+            if not finished:
+                # Client gone or extraction failed: drop this run's batches
+                persist(text_store_service.abort_pages, run)
+            if store_db is not None:
+                store_db.close()
+    
+    def generate_events():
+        page_count = 0
+        try:
+            for page in generate_pages():
+                page_count += 1
+                if format == "sse":
+                    yield f"event: page\ndata: {json.dumps(page)}\n\n"
+                else:
+                    yield json.dumps(page) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming text for document {document_id}: {str(e)}")
+            error = {"error": str(e)}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n" if format == "sse" else json.dumps(error) + "\n"
+            return
+        if format == "sse":
+            yield f"event: done\ndata: {json.dumps({'pages': page_count})}\n\n"
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        generate_events(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/{document_id}/compress", response_model=DocumentOperationResponse)
 @invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def compress_pdf(
     document_id: str,
+    profile: str = Form(DEFAULT_PROFILE),  # screen, ebook or print
+    quality: Optional[int] = Form(None),  # JPEG quality override (1-95)
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Compress a PDF document
+    Compress a PDF document by downsampling and re-encoding oversized images
     """
     logger.info(f"Compress PDF request for document {document_id} by user {current_user.id}")
     
+    try:
+        get_compression_profile(profile, quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
     if not document:
         logger.warning(f"Document {document_id} not found or not owned by user {current_user.id}")
         raise HTTPException(status_code=404, detail="Document not found")
     
     try:
-        # Get the local file path
-        storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
-        logger.info(f"Retrieved local file path: {local_file_path}")
-        logger.info(f"File path type: {type(local_file_path)}")
-        logger.info(f"File exists: {os.path.exists(local_file_path)}")
-        logger.info(f"File size: {os.path.getsize(local_file_path) if os.path.exists(local_file_path) else 'N/A'}")
-        
         output_filename = f"compressed_{document.filename}"
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
-        
-        # Compress the PDF
-        logger.info(f"Starting PDF compression for {document.filename}")
-        logger.info(f"Input file path: {local_file_path}")
-        logger.info(f"Output file path: {output_path}")
-        pdf_processor.compress_pdf(local_file_path, output_path)
-        
-        # Get file size
-        file_size = os.path.getsize(output_path)
-        logger.info(f"Compressed PDF size: {file_size} bytes")
-        
-        # Upload to storage
-        storage_service = StorageService()
-        file_path = storage_service.upload_file(output_path, output_filename)
-        logger.info(f"Uploaded compressed PDF to storage: {file_path}")
+        params = {"profile": profile, "quality": quality}
+        cached = operation_cache_service.get(db, document.file_hash, "compress", params)
+        if cached:
+            file_path, file_hash, file_size = cached[0]["file_path"], cached[0]["file_hash"], cached[0]["file_size"]
+        else:
+            # Get the local file path
+            storage_service = StorageService()
+            local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+            logger.info(f"Retrieved local file path: {local_file_path}")
+            try:
+                logger.info(f"File path type: {type(local_file_path)}")
+                logger.info(f"File exists: {os.path.exists(local_file_path)}")
+                logger.info(f"File size: {os.path.getsize(local_file_path) if os.path.exists(local_file_path) else 'N/A'}")
+                
+                output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
+                
+                # Compress the PDF
+                logger.info(f"Starting PDF compression for {document.filename}")
+                logger.info(f"Input file path: {local_file_path}")
+                logger.info(f"Output file path: {output_path}")
+                await executor_service.run_in_thread("compress", pdf_processor.compress_pdf, local_file_path, output_path, profile, quality)
+            finally:
+                storage_service.release_file(local_file_path)
+            
+            # Get file size
+            file_size = os.path.getsize(output_path)
+            logger.info(f"Compressed PDF size: {file_size} bytes")
+            
+            # Upload to storage
+            file_path, file_hash = await _store_file(db, output_path, output_filename)
+            logger.info(f"Uploaded compressed PDF to storage: {file_path}")
+            operation_cache_service.put(db, document.file_hash, "compress", params, [(file_hash, output_filename)])
         
         # Create new document record
         db_document = Document(
@@ -570,7 +1187,9 @@ async def compress_pdf(
             file_path=file_path,
             file_size=file_size,
             mime_type="application/pdf",
-            owner_id=current_user.id
+            owner_id=current_user.id,
+            owner_email=current_user.email,
+            file_hash=file_hash
         )
         
         db.add(db_document)
@@ -591,8 +1210,7 @@ async def compress_pdf(
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
         # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
+        _delete_document(db, document)
         logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
@@ -610,29 +1228,34 @@ async def compress_pdf(
             os.remove(output_path)
             logger.info(f"Cleaned up temporary file: {output_path}")
 
+def _images_to_pdf(image_files: List[Any], output_path: str) -> None:
+    """Write the images (file objects) as the pages of one PDF"""
+    images = [Image.open(image_file).convert("RGB") for image_file in image_files]
+    images[0].save(output_path, save_all=True, append_images=images[1:])
+
 @router.post("/image-to-pdf", response_model=DocumentResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def image_to_pdf(
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    images = []
-    for file in files:
-        img = Image.open(file.file).convert("RGB")
-        images.append(img)
     output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
-    images[0].save(output_path, save_all=True, append_images=images[1:])
+    # Decoding the images is as heavy as writing the PDF; keep both off the event loop
+    await executor_service.run_in_thread("convert", _images_to_pdf, [file.file for file in files], output_path)
     output_filename = "images_to_pdf.pdf"
     file_size = os.path.getsize(output_path)
     storage_service = StorageService()
-    file_path = storage_service.upload_file(output_path, output_filename)
+    file_path, file_hash = await _store_file(db, output_path, output_filename)
     db_document = Document(
         filename=output_filename,
         original_filename=output_filename,  # Set to output_filename or a concatenation of image names if desired
         file_path=file_path,
         file_size=file_size,
         mime_type="application/pdf",
-        owner_id=current_user.id
+        owner_id=current_user.id,
+        owner_email=current_user.email,
+        file_hash=file_hash
     )
     db.add(db_document)
     db.commit()
@@ -651,6 +1274,7 @@ async def image_to_pdf(
     )
 
 @router.post("/{document_id}/to-epub")
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def pdf_to_epub(
     document_id: str,
     db: Session = Depends(get_db),
@@ -664,23 +1288,35 @@ async def pdf_to_epub(
         raise HTTPException(status_code=404, detail="Document not found")
     
     try:
-        storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
         output_filename = document.filename.rsplit(".", 1)[0] + ".epub"
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.epub').name
-        
-        pdf_processor.pdf_to_epub(local_file_path, output_path)
+        cached = operation_cache_service.get(db, document.file_hash, "to_epub")
+        if cached:
+            file_path, file_hash, file_size = cached[0]["file_path"], cached[0]["file_hash"], cached[0]["file_size"]
+        else:
+            storage_service = StorageService()
+            local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+            output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.epub').name
+            
+            try:
+                await executor_service.run_in_thread("epub", pdf_processor.pdf_to_epub, local_file_path, output_path)
+            finally:
+                storage_service.release_file(local_file_path)
+            
+            file_size = os.path.getsize(output_path)
+            file_path, file_hash = await _store_file(db, output_path, output_filename)
+            operation_cache_service.put(db, document.file_hash, "to_epub", None, [(file_hash, output_filename)])
         
         # Create a new document record for the EPUB
-        file_path = storage_service.upload_file(output_path, output_filename)
         epub_doc = Document(
             filename=output_filename,
             original_filename=output_filename,
             file_path=file_path,
-            file_size=os.path.getsize(output_path),
+            file_size=file_size,
             mime_type="application/epub+zip",
             file_type="epub",
-            owner_id=current_user.id
+            owner_id=current_user.id,
+            owner_email=current_user.email,
+            file_hash=file_hash
         )
         
         db.add(epub_doc)
@@ -695,8 +1331,7 @@ async def pdf_to_epub(
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
         # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
+        _delete_document(db, document)
         logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
@@ -706,71 +1341,204 @@ async def pdf_to_epub(
         if 'output_path' in locals() and os.path.exists(output_path):
             os.remove(output_path)
 
+async def _stream_page_archive(document: Document, owner: User, fmt: str, pages: Optional[str],
+                               persist: bool, dpi: int = 200) -> StreamingResponse:
+    """
+    Stream a ZIP of a document's page images, adding each page as soon as it is rendered
+    Raises ValueError (invalid page range) and FileNotFoundError before the response starts.
+    """
+    storage_service = StorageService()
+    # Leased until the archive is complete
+    local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+    try:
+        page_count = await executor_service.run_in_thread("storage", pdf_processor.count_pages, local_file_path)
+        select_pages(pages, page_count)
+    except Exception:
+        storage_service.release_file(local_file_path)
+        raise
+    
+    archive_name = f"{os.path.splitext(document.filename)[0]}_pages.zip"
+    archive_id = str(uuid.uuid4()) if persist else None
+    owner_id, owner_email = owner.id, owner.email
+    width = len(str(page_count))
+    extension = RASTER_FORMATS[fmt]
+    output_dir = tempfile.mkdtemp()
+    
+    def entries():
+        for page_number, path in pdf_processor.iter_image_pages(local_file_path, output_dir, dpi, fmt, pages):
+            yield f"page_{page_number:0{width}d}{extension}", path
+    
+    def generate_archive():
+        archive_path = os.path.join(output_dir, archive_name)
+        archive_file = open(archive_path, "wb") if persist else None
+        try:
+            for data in stream_zip(entries(), remove_files=True):
+                if archive_file:
+                    archive_file.write(data)
+                yield data
+            if archive_file:
+                archive_file.close()
+                _store_page_archive(archive_id, archive_path, archive_name, owner_id, owner_email)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated archive
+            logger.error(f"Error streaming page archive for document {document.id}: {str(e)}")
+            raise
+        finally:
+            if archive_file:
+                archive_file.close()
+            shutil.rmtree(output_dir, ignore_errors=True)
+            storage_service.release_file(local_file_path)
+    
+    headers = {"Content-Disposition": content_disposition(archive_name), "Cache-Control": "no-cache"}
+    if archive_id:
+        headers["X-Document-ID"] = archive_id
+    return StreamingResponse(generate_archive(), media_type="application/zip", headers=headers)
+
+def _store_page_archive(archive_id: str, archive_path: str, archive_name: str, owner_id: str, owner_email: str) -> None:
+    """Record a streamed page archive as a document (own session: the request's may be closed)"""
+    store_db = SessionLocal()
+    try:
+        file_path, file_hash = blob_store_service.store_file(store_db, archive_path, archive_name)
+        store_db.add(Document(
+            id=archive_id,
+            filename=archive_name,
+            original_filename=archive_name,
+            file_path=file_path,
+            file_size=os.path.getsize(archive_path),
+            mime_type="application/zip",
+            file_type="zip",
+            conversion_type="pdf_to_images",
+            owner_id=owner_id,
+            owner_email=owner_email,
+            file_hash=file_hash
+        ))
+        store_db.commit()
+        if settings.CACHE_ENABLED:
+            redis_service.clear_cache_pattern("doc_list:*")
+    except Exception as e:
+        store_db.rollback()
+        logger.error(f"Could not store page archive {archive_id}: {str(e)}")
+    finally:
+        store_db.close()
+
 @router.post("/{document_id}/to-jpg")
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def pdf_to_jpg(
     document_id: str,
+    output: str = Query("documents", pattern="^(documents|zip)$"),
+    format: str = Query("jpeg", pattern="^(jpeg|png|webp)$"),  # zip output only
+    pages: Optional[str] = Query(None),  # 1-based page range, e.g. "1-3,7" (all pages when empty)
+    persist: bool = Query(False),  # zip output: also store the archive as one document
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Convert a PDF document to JPG images (one per page)
+    Convert a PDF document to images
+    
+    - output=documents: one JPG document per page, returned as download URLs
+    - output=zip: a ZIP of the page images streamed as pages are rendered, without
+      creating a document per page; with persist=true the archive is also stored as
+      one document whose id is sent in the X-Document-ID header
     """
     document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    if output == "documents" and format != "jpeg":
+        raise HTTPException(status_code=400, detail="Only JPEG is supported for output=documents; use output=zip")
     
     try:
+        if output == "zip":
+            return await _stream_page_archive(document, current_user, format, pages or None, persist)
+        
+        params = {"dpi": 200, "pages": pages or None}
+        cached = operation_cache_service.get(db, document.file_hash, "to_jpg", params)
         storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
-        output_dir = tempfile.mkdtemp()
+        local_file_path = None
+        output_dir = None
+        # Objects uploaded so far, deleted again if the request fails before its records are committed
+        uploaded = []
         try:
-            image_paths = pdf_processor.pdf_to_jpg(local_file_path, output_dir)
-            if not image_paths:
-                raise HTTPException(
-                    status_code=500,
-                    detail="No images were generated from the PDF"
+            if cached:
+                images = cached
+            else:
+                local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+                output_dir = tempfile.mkdtemp()
+                
+                def rasterize_and_upload() -> List[Dict[str, Any]]:
+                    # Pages are rendered in parallel; each one is uploaded as soon as it is done
+                    # and its local copy dropped, so neither memory nor temp disk grows with page count
+                    for page_number, img_path in pdf_processor.iter_image_pages(local_file_path, output_dir, params["dpi"], page_range=params["pages"]):
+                        uploaded.append((page_number, blob_store_service.upload_object(img_path, os.path.basename(img_path))))
+                        os.remove(img_path)
+                    return [image for _, image in sorted(uploaded, key=lambda item: item[0])]
+                
+                images = await executor_service.run_in_thread("rasterize", rasterize_and_upload)
+                if not images:
+                    raise HTTPException(
+                        status_code=500,
+                        detail="No images were generated from the PDF"
+                    )
+                for image in images:
+                    image["file_path"] = await _adopt_stored(db, image["file_hash"], image["file_path"], image["file_size"])
+                operation_cache_service.put(
+                    db, document.file_hash, "to_jpg", params, [(image["file_hash"], image["filename"]) for image in images]
                 )
             
-            download_urls = []
-            filenames = []
-            for img_path in image_paths:
-                # Upload to storage
-                storage_path = storage_service.upload_file(img_path, os.path.basename(img_path))
-                # Create a new document record for each image
-                doc = Document(
-                    filename=os.path.basename(img_path),
-                    original_filename=os.path.basename(img_path),
-                    file_path=storage_path,
-                    file_size=os.path.getsize(img_path),
+            # One document record per image, inserted in a single transaction
+            docs = [
+                Document(
+                    filename=image["filename"],
+                    original_filename=image["filename"],
+                    file_path=image["file_path"],
+                    file_size=image["file_size"],
                     mime_type="image/jpeg",
                     file_type="jpg",
-                    owner_id=current_user.id
+                    owner_id=current_user.id,
+                    owner_email=current_user.email,
+                    file_hash=image["file_hash"]
                 )
-                db.add(doc)
-                db.commit()
-                db.refresh(doc)
-                
-                # Add download URL and filename
-                download_urls.append(f"/documents/{doc.id}/download")
-                filenames.append(doc.filename)
+                for image in images
+            ]
+            db.add_all(docs)
+            db.flush()
+            # Read ids before commit expires the rows (avoids a reload per image)
+            download_urls = [f"/documents/{doc.id}/download" for doc in docs]
+            filenames = [doc.filename for doc in docs]
+            db.commit()
             
             return {
                 "download_urls": download_urls,
                 "filenames": filenames,
-                "page_count": len(image_paths)
+                "page_count": len(images)
             }
+        except Exception:
+            if uploaded:
+                db.rollback()
+                try:
+                    await executor_service.run_in_thread(
+                        "storage", run_in_session, blob_store_service.discard_uploaded, [image for _, image in uploaded]
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not clean up page images of document {document_id}: {str(e)}")
+            raise
         finally:
-            shutil.rmtree(output_dir, ignore_errors=True)
+            if local_file_path:
+                storage_service.release_file(local_file_path)
+            if output_dir:
+                shutil.rmtree(output_dir, ignore_errors=True)
+    except HTTPException:
+        raise
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
         # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
+        _delete_document(db, document)
         logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
             detail="The original file is no longer available. The document record has been cleaned up. Please upload the file again."
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in pdf_to_jpg: {str(e)}")
         if "poppler" in str(e).lower():
@@ -783,7 +1551,73 @@ async def pdf_to_jpg(
             detail=f"Failed to convert PDF to JPG: {str(e)}"
         )
 
+async def _convert_office_upload(
+    file: UploadFile,
+    default_suffix: str,
+    conversion_type: str,
+    message: str,
+    db: Session,
+    current_user: User
+) -> DocumentOperationResponse:
+    """Shared path for the office-to-PDF endpoints: convert through the LibreOffice pool and store the result"""
+    # Keep the real extension so LibreOffice picks the right import filter
+    suffix = os.path.splitext(file.filename or "")[1].lower() or default_suffix
+    temp_input = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+    temp_output.close()
+    try:
+        with temp_input:
+            temp_input.write(await file.read())
+
+        await executor_service.run_in_thread(
+            "office_convert", pdf_processor.convert_office_to_pdf, temp_input.name, temp_output.name
+        )
+
+        filename = f"{os.path.splitext(file.filename)[0]}_{uuid.uuid4()}.pdf"
+        try:
+            file_path, file_hash = await _store_file(db, temp_output.name, filename)
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to upload converted file to storage: {str(e)}"
+            )
+
+        # Create document record with owner
+        doc = Document(
+            filename=filename,
+            original_filename=file.filename,
+            file_path=file_path,
+            file_type="pdf",
+            conversion_type=conversion_type,
+            owner_id=current_user.id,
+            owner_email=current_user.email,
+            file_hash=file_hash
+        )
+        db.add(doc)
+        db.commit()
+        db.refresh(doc)
+
+        return DocumentOperationResponse(
+            id=doc.id,
+            filename=doc.filename,
+            content_type="application/pdf",
+            created_at=doc.created_at,
+            download_url=f"/documents/{doc.id}/download",
+            message=message
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Clean up temporary files
+        for temp_path in (temp_input.name, temp_output.name):
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
 @router.post("/convert/word-to-pdf", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def word_to_pdf(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -801,146 +1635,12 @@ async def word_to_pdf(
     ]
     validate_file_type(file, allowed_extensions, allowed_mime_types)
     
-    try:
-        # Create a temporary file for the input
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_input:
-            content = await file.read()
-            temp_input.write(content)
-            temp_input.flush()
-            
-            # Create a temporary file for the output
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_output:
-                # Get LibreOffice path using the same logic as pdf_operations.py
-                if os.name == 'nt':  # Windows
-                    libreoffice_paths = [
-                        r"C:\Program Files\LibreOffice\program\soffice.exe",
-                        r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-                        os.path.expanduser("~\\AppData\\Local\\Programs\\LibreOffice\\program\\soffice.exe")
-                    ]
-                    soffice_path = None
-                    for path in libreoffice_paths:
-                        if os.path.exists(path):
-                            soffice_path = path
-                            break
-                else:  # Linux/Mac
-                    linux_paths = [
-                        "/usr/bin/libreoffice",
-                        "/usr/bin/soffice",
-                        "/usr/lib/libreoffice/program/soffice",
-                        "/opt/libreoffice/program/soffice",
-                        "/snap/bin/libreoffice",
-                        "/usr/local/bin/libreoffice",
-                        "/usr/local/bin/soffice"
-                    ]
-                    soffice_path = None
-                    for path in linux_paths:
-                        if os.path.exists(path):
-                            soffice_path = path
-                            break
-                    if not soffice_path:
-                        try:
-                            soffice_path = subprocess.check_output(['which', 'libreoffice']).decode().strip()
-                        except Exception as e:
-                            logger.error(f"Error finding libreoffice: {str(e)}")
-                            try:
-                                soffice_path = subprocess.check_output(['which', 'soffice']).decode().strip()
-                            except Exception as e:
-                                logger.error(f"Error finding soffice: {str(e)}")
-                                raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-                if not soffice_path:
-                    raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-                # Convert using LibreOffice
-                result = subprocess.run([
-                    soffice_path,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', os.path.dirname(temp_output.name),
-                    temp_input.name
-                ], capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Conversion failed: {result.stderr}"
-                    )
-                
-                # Get the converted file path
-                converted_file = os.path.join(
-                    os.path.dirname(temp_output.name),
-                    os.path.splitext(os.path.basename(temp_input.name))[0] + '.pdf'
-                )
-                
-                if not os.path.exists(converted_file):
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Converted file not found"
-                    )
-                
-                # Move the converted file to our output location
-                shutil.move(converted_file, temp_output.name)
-                
-                # Create document record with owner
-                doc = Document(
-                    filename=f"{os.path.splitext(file.filename)[0]}_{uuid.uuid4()}.pdf",
-                    original_filename=file.filename,
-                    file_type="pdf",
-                    conversion_type="word_to_pdf",
-                    owner_id=current_user.id
-                )
-                db.add(doc)
-                db.commit()
-                db.refresh(doc)
-                
-                try:
-                    # Verify the temp file exists and has content
-                    if not os.path.exists(temp_output.name):
-                        raise HTTPException(status_code=500, detail="Temporary output file was not created")
-                    
-                    if os.path.getsize(temp_output.name) == 0:
-                        raise HTTPException(status_code=500, detail="Temporary output file is empty")
-                    
-                    # Upload the file using the filename only - storage service will handle the path
-                    storage_service = StorageService()
-                    file_path = storage_service.upload_file(temp_output.name, doc.filename)
-                    print(f"Word to PDF conversion - storage service returned: {file_path}")
-                    
-                    # Update document with storage path
-                    doc.file_path = file_path
-                    db.commit()
-                    db.refresh(doc)
-                    print(f"Word to PDF conversion - saved to database with file_path: {doc.file_path}")
-                    
-                    # Construct the download URL with the correct API path
-                    download_url = f"/documents/{doc.id}/download"
-                    
-                    return DocumentOperationResponse(
-                        id=doc.id,
-                        filename=doc.filename,
-                        content_type="application/pdf",
-                        created_at=doc.created_at,
-                        download_url=download_url,
-                        message="Word document converted successfully"
-                    )
-                except Exception as e:
-                    # If storage upload fails, delete the document record
-                    db.delete(doc)
-                    db.commit()
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to upload converted file to storage: {str(e)}"
-                    )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up temporary files
-        if 'temp_input' in locals():
-            os.unlink(temp_input.name)
-        if 'temp_output' in locals():
-            os.unlink(temp_output.name)
+    return await _convert_office_upload(
+        file, '.docx', "word_to_pdf", "Word document converted successfully", db, current_user
+    )
 
 @router.post("/convert/excel-to-pdf", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def excel_to_pdf(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -958,144 +1658,12 @@ async def excel_to_pdf(
     ]
     validate_file_type(file, allowed_extensions, allowed_mime_types)
     
-    try:
-        # Create a temporary file for the input
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as temp_input:
-            content = await file.read()
-            temp_input.write(content)
-            temp_input.flush()
-            
-            # Create a temporary file for the output
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_output:
-                # Get LibreOffice path using the same logic as pdf_operations.py
-                if os.name == 'nt':  # Windows
-                    libreoffice_paths = [
-                        r"C:\Program Files\LibreOffice\program\soffice.exe",
-                        r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-                        os.path.expanduser("~\\AppData\\Local\\Programs\\LibreOffice\\program\\soffice.exe")
-                    ]
-                    soffice_path = None
-                    for path in libreoffice_paths:
-                        if os.path.exists(path):
-                            soffice_path = path
-                            break
-                else:  # Linux/Mac
-                    linux_paths = [
-                        "/usr/bin/libreoffice",
-                        "/usr/bin/soffice",
-                        "/usr/lib/libreoffice/program/soffice",
-                        "/opt/libreoffice/program/soffice",
-                        "/snap/bin/libreoffice",
-                        "/usr/local/bin/libreoffice",
-                        "/usr/local/bin/soffice"
-                    ]
-                    soffice_path = None
-                    for path in linux_paths:
-                        if os.path.exists(path):
-                            soffice_path = path
-                            break
-                    if not soffice_path:
-                        try:
-                            soffice_path = subprocess.check_output(['which', 'libreoffice']).decode().strip()
-                        except Exception as e:
-                            logger.error(f"Error finding libreoffice: {str(e)}")
-                            try:
-                                soffice_path = subprocess.check_output(['which', 'soffice']).decode().strip()
-                            except Exception as e:
-                                logger.error(f"Error finding soffice: {str(e)}")
-                                raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-                if not soffice_path:
-                    raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-                # Convert using LibreOffice
-                result = subprocess.run([
-                    soffice_path,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', os.path.dirname(temp_output.name),
-                    temp_input.name
-                ], capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Conversion failed: {result.stderr}"
-                    )
-                
-                # Get the converted file path
-                converted_file = os.path.join(
-                    os.path.dirname(temp_output.name),
-                    os.path.splitext(os.path.basename(temp_input.name))[0] + '.pdf'
-                )
-                
-                if not os.path.exists(converted_file):
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Converted file not found"
-                    )
-                
-                # Move the converted file to our output location
-                shutil.move(converted_file, temp_output.name)
-                
-                # Create document record with owner
-                doc = Document(
-                    filename=f"{os.path.splitext(file.filename)[0]}_{uuid.uuid4()}.pdf",
-                    original_filename=file.filename,
-                    file_type="pdf",
-                    conversion_type="excel_to_pdf",
-                    owner_id=current_user.id
-                )
-                db.add(doc)
-                db.commit()
-                db.refresh(doc)
-                
-                try:
-                    # Verify the temp file exists and has content
-                    if not os.path.exists(temp_output.name):
-                        raise HTTPException(status_code=500, detail="Temporary output file was not created")
-                    
-                    if os.path.getsize(temp_output.name) == 0:
-                        raise HTTPException(status_code=500, detail="Temporary output file is empty")
-                    
-                    # Upload the file using the filename only - storage service will handle the path
-                    storage_service = StorageService()
-                    file_path = storage_service.upload_file(temp_output.name, doc.filename)
-                    
-                    # Update document with storage path
-                    doc.file_path = file_path
-                    db.commit()
-                    db.refresh(doc)
-                    
-                    # Construct the download URL with the correct API path
-                    download_url = f"/documents/{doc.id}/download"
-                    
-                    return DocumentOperationResponse(
-                        id=doc.id,
-                        filename=doc.filename,
-                        content_type="application/pdf",
-                        created_at=doc.created_at,
-                        download_url=download_url,
-                        message="Excel document converted successfully"
-                    )
-                except Exception as e:
-                    # If storage upload fails, delete the document record
-                    db.delete(doc)
-                    db.commit()
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to upload converted file to storage: {str(e)}"
-                    )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up temporary files
-        if 'temp_input' in locals():
-            os.unlink(temp_input.name)
-        if 'temp_output' in locals():
-            os.unlink(temp_output.name)
+    return await _convert_office_upload(
+        file, '.xlsx', "excel_to_pdf", "Excel document converted successfully", db, current_user
+    )
 
 @router.post("/convert/ppt-to-pdf", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def ppt_to_pdf(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
@@ -1111,153 +1679,62 @@ async def ppt_to_pdf(
     ]
     validate_file_type(file, allowed_extensions, allowed_mime_types)
     
+    return await _convert_office_upload(
+        file, '.pptx', "ppt_to_pdf", "PowerPoint document converted successfully", db, current_user
+    )
+
+async def _thumbnail_response(request: Request, db: Session, document: Document, page_number: Optional[int], size: str,
+                              sprite_index: Optional[int] = None) -> Response:
+    """
+    JPEG thumbnail of a page, or sprite strip when sprite_index is given, with an ETag
+    derived from the content hash, page and size (304 when unchanged)
+    """
     try:
-        # Create a temporary file for the input
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pptx') as temp_input:
-            content = await file.read()
-            temp_input.write(content)
-            temp_input.flush()
-            
-            # Create a temporary file for the output
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_output:
-                # Get LibreOffice path using the same logic as pdf_operations.py
-                if os.name == 'nt':  # Windows
-                    libreoffice_paths = [
-                        r"C:\Program Files\LibreOffice\program\soffice.exe",
-                        r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-                        os.path.expanduser("~\\AppData\\Local\\Programs\\LibreOffice\\program\\soffice.exe")
-                    ]
-                    soffice_path = None
-                    for path in libreoffice_paths:
-                        if os.path.exists(path):
-                            soffice_path = path
-                            break
-                else:  # Linux/Mac
-                    linux_paths = [
-                        "/usr/bin/libreoffice",
-                        "/usr/bin/soffice",
-                        "/usr/lib/libreoffice/program/soffice",
-                        "/opt/libreoffice/program/soffice",
-                        "/snap/bin/libreoffice",
-                        "/usr/local/bin/libreoffice",
-                        "/usr/local/bin/soffice"
-                    ]
-                    soffice_path = None
-                    for path in linux_paths:
-                        if os.path.exists(path):
-                            soffice_path = path
-                            break
-                    if not soffice_path:
-                        try:
-                            soffice_path = subprocess.check_output(['which', 'libreoffice']).decode().strip()
-                        except Exception as e:
-                            logger.error(f"Error finding libreoffice: {str(e)}")
-                            try:
-                                soffice_path = subprocess.check_output(['which', 'soffice']).decode().strip()
-                            except Exception as e:
-                                logger.error(f"Error finding soffice: {str(e)}")
-                                raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-                if not soffice_path:
-                    raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-                # Convert using LibreOffice
-                result = subprocess.run([
-                    soffice_path,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', os.path.dirname(temp_output.name),
-                    temp_input.name
-                ], capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Conversion failed: {result.stderr}"
-                    )
-                
-                # Get the converted file path
-                converted_file = os.path.join(
-                    os.path.dirname(temp_output.name),
-                    os.path.splitext(os.path.basename(temp_input.name))[0] + '.pdf'
-                )
-                
-                if not os.path.exists(converted_file):
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Converted file not found"
-                    )
-                
-                # Move the converted file to our output location
-                shutil.move(converted_file, temp_output.name)
-                
-                # Create document record with owner
-                doc = Document(
-                    filename=f"{os.path.splitext(file.filename)[0]}_{uuid.uuid4()}.pdf",
-                    original_filename=file.filename,
-                    file_type="pdf",
-                    conversion_type="ppt_to_pdf",
-                    owner_id=current_user.id
-                )
-                db.add(doc)
-                db.commit()
-                db.refresh(doc)
-                
-                try:
-                    # Verify the temp file exists and has content
-                    if not os.path.exists(temp_output.name):
-                        raise HTTPException(status_code=500, detail="Temporary output file was not created")
-                    
-                    if os.path.getsize(temp_output.name) == 0:
-                        raise HTTPException(status_code=500, detail="Temporary output file is empty")
-                    
-                    # Upload the file using the filename only - storage service will handle the path
-                    storage_service = StorageService()
-                    file_path = storage_service.upload_file(temp_output.name, doc.filename)
-                    
-                    # Update document with storage path
-                    doc.file_path = file_path
-                    db.commit()
-                    db.refresh(doc)
-                    
-                    # Construct the download URL with the correct API path
-                    download_url = f"/documents/{doc.id}/download"
-                    
-                    return DocumentOperationResponse(
-                        id=doc.id,
-                        filename=doc.filename,
-                        content_type="application/pdf",
-                        created_at=doc.created_at,
-                        download_url=download_url,
-                        message="PowerPoint document converted successfully"
-                    )
-                except Exception as e:
-                    # If storage upload fails, delete the document record
-                    db.delete(doc)
-                    db.commit()
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Failed to upload converted file to storage: {str(e)}"
-                    )
+        if sprite_index is None:
+            etag = f'"{thumbnail_service.cache_key(document, page_number, size)}"'
+        else:
+            etag = f'"{thumbnail_service.sprite_cache_key(document, size, str(sprite_index))}"'
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Content-addressed: the same URL serves the same bytes until the document is replaced
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    try:
+        if sprite_index is None:
+            thumbnail = await thumbnail_service.get_thumbnail(document, page_number, size)
+        else:
+            thumbnail = await thumbnail_service.get_sprite(document, sprite_index, size)
+        return Response(content=thumbnail, media_type="image/jpeg", headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found for document {document.id}: {str(e)}")
+        # Delete the orphaned database record
+        _delete_document(db, document)
+        logger.info(f"Deleted orphaned document record: {document.id}")
+        raise HTTPException(
+            status_code=404,
+            detail="The file is no longer available. The document record has been cleaned up. Please upload the file again."
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up temporary files
-        if 'temp_input' in locals():
-            os.unlink(temp_input.name)
-        if 'temp_output' in locals():
-            os.unlink(temp_output.name)
+        logger.error(f"Error generating thumbnail: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate thumbnail"
+        )
 
 @router.get("/{document_id}/preview")
 async def get_document_preview(
     document_id: str,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-    response: Response = None
+    current_user: User = Depends(get_current_active_user)
 ):
     """
     Get a preview image of the first page of a PDF document.
-    Returns a JPEG image with caching headers.
+    Returns the "medium" JPEG thumbnail with caching headers.
     """
     document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
     
@@ -1267,63 +1744,97 @@ async def get_document_preview(
             detail="Document not found"
         )
     
-    try:
-        # Get the file from storage
-        storage_service = StorageService()
-        local_file_path = storage_service.get_file(document.file_path)
-        
-        # Open the PDF
-        pdf_document = fitz.open(local_file_path)
-        
-        # Get the first page
-        first_page = pdf_document[0]
-        
-        # Convert to image with higher resolution (2x for better quality)
-        pix = first_page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        
-        # Convert to PIL Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        # Resize to thumbnail size while maintaining aspect ratio
-        max_size = (400, 400)
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        
-        # Convert to bytes with good quality
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='JPEG', quality=85, optimize=True)
-        img_byte_arr.seek(0)
-        
-        # Close the PDF
-        pdf_document.close()
-        
-        # Set cache headers (1 hour cache)
-        response.headers["Cache-Control"] = "public, max-age=3600"
-        response.headers["ETag"] = f'"{document.id}-{document.last_accessed.timestamp()}"'
-        
-        return Response(
-            content=img_byte_arr.getvalue(),
-            media_type="image/jpeg"
+    return await _thumbnail_response(request, db, document, 0, "medium")
+
+@router.get("/{document_id}/thumbnails/{page_number}")
+async def get_page_thumbnail(
+    document_id: str,
+    page_number: int,  # 0-based, like the page editing endpoints
+    request: Request,
+    size: str = Query("small"),  # name from THUMBNAIL_SIZES
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get a JPEG thumbnail of any page at one of the standard sizes.
+    Rendered once per (content, page, size) and served from the thumbnail cache afterwards.
+    """
+    document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    return await _thumbnail_response(request, db, document, page_number, size)
+
+@router.get("/{document_id}/sprites")
+async def get_sprite_manifest(
+    document_id: str,
+    size: str = Query("small"),  # name from THUMBNAIL_SIZES
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Layout of a document's thumbnail sprites for a page strip.
+    Each sprite is a vertical JPEG strip of page thumbnails; "pages" gives every
+    page's box inside its sprite. Sprites are pre-generated after upload.
+    """
+    document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
         )
+    
+    try:
+        manifest = await thumbnail_service.get_sprite_manifest(document, size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except FileNotFoundError as e:
         logger.error(f"File not found for document {document_id}: {str(e)}")
-        # Delete the orphaned database record
-        db.delete(document)
-        db.commit()
-        logger.info(f"Deleted orphaned document record: {document_id}")
         raise HTTPException(
             status_code=404,
-            detail="The file is no longer available. The document record has been cleaned up. Please upload the file again."
+            detail="The file is no longer available. Please upload the file again."
         )
     except Exception as e:
-        logger.error(f"Error generating preview: {str(e)}")
+        logger.error(f"Error generating sprite manifest: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate preview"
+            detail="Failed to generate thumbnails"
+        )
+    for sprite in manifest["sprites"]:
+        sprite["url"] = f"/documents/{document.id}/sprites/{sprite['index']}?size={size}"
+    return manifest
+
+@router.get("/{document_id}/sprites/{sprite_index}")
+async def get_sprite(
+    document_id: str,
+    sprite_index: int,
+    request: Request,
+    size: str = Query("small"),  # name from THUMBNAIL_SIZES
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Get one thumbnail sprite strip as a JPEG (layout from /sprites).
+    """
+    document = db.query(Document).filter(Document.id == document_id, Document.owner_id == current_user.id).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
         )
+    
+    return await _thumbnail_response(request, db, document, None, size, sprite_index)
 
 
 # PDF Editing Endpoints
 @router.post("/{document_id}/edit-text", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def edit_text(
     document_id: str,
     page_number: int = Form(...),
@@ -1351,17 +1862,20 @@ async def edit_text(
             )
         
         # Get the file path
-        file_path = storage_service.get_file(document.file_path)
+        file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
         
         # Create output path
         output_filename = f"{document.filename}_edited_{int(time.time())}.pdf"
         output_path = os.path.join(tempfile.gettempdir(), output_filename)
         
         # Edit the text
-        PDFProcessor().edit_text_on_page(file_path, output_path, page_number, old_text, new_text)
+        try:
+            await executor_service.run_in_process("edit", pdf_processor.edit_text_on_page, file_path, output_path, page_number, old_text, new_text)
+        finally:
+            storage_service.release_file(file_path)
         
         # Upload the edited file
-        new_file_url = storage_service.upload_file(output_path, output_filename)
+        new_file_url, file_hash = await _store_file(db, output_path, output_filename)
         
         # Create new document record
         new_document = Document(
@@ -1374,8 +1888,9 @@ async def edit_text(
             conversion_type="text_edit",
             created_at=datetime.utcnow(),
             last_accessed=datetime.utcnow(),
-            file_hash=None,
-            owner_id=current_user.id
+            file_hash=file_hash,
+            owner_id=current_user.id,
+            owner_email=current_user.email
         )
         
         db.add(new_document)
@@ -1401,6 +1916,7 @@ async def edit_text(
 
 
 @router.post("/{document_id}/add-text", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def add_text(
     document_id: str,
     page_number: int = Form(...),
@@ -1428,17 +1944,21 @@ async def add_text(
             )
         
         # Get the file path
-        file_path = storage_service.get_file(document.file_path)
+        storage_service = StorageService()
+        file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
         
         # Create output path
         output_filename = f"{document.filename}_added_text_{int(time.time())}.pdf"
         output_path = os.path.join(tempfile.gettempdir(), output_filename)
         
         # Add the text
-        PDFProcessor().add_text_to_page(file_path, output_path, page_number, text, (x, y), font_size)
+        try:
+            await executor_service.run_in_process("edit", pdf_processor.add_text_to_page, file_path, output_path, page_number, text, (x, y), font_size)
+        finally:
+            storage_service.release_file(file_path)
         
         # Upload the edited file
-        new_file_url = storage_service.upload_file(output_path, output_filename)
+        new_file_url, file_hash = await _store_file(db, output_path, output_filename)
         
         # Create new document record
         new_document = Document(
@@ -1451,8 +1971,9 @@ async def add_text(
             conversion_type="add_text",
             created_at=datetime.utcnow(),
             last_accessed=datetime.utcnow(),
-            file_hash=None,
-            owner_id=current_user.id
+            file_hash=file_hash,
+            owner_id=current_user.id,
+            owner_email=current_user.email
         )
         
         db.add(new_document)
@@ -1478,6 +1999,7 @@ async def add_text(
 
 
 @router.post("/{document_id}/remove-images", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def remove_images(
     document_id: str,
     page_number: int = Form(...),
@@ -1501,17 +2023,21 @@ async def remove_images(
             )
         
         # Get the file path
-        file_path = storage_service.get_file(document.file_path)
+        storage_service = StorageService()
+        file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
         
         # Create output path
         output_filename = f"{document.filename}_no_images_{int(time.time())}.pdf"
         output_path = os.path.join(tempfile.gettempdir(), output_filename)
         
         # Remove images
-        PDFProcessor().remove_images_from_page(file_path, output_path, page_number)
+        try:
+            await executor_service.run_in_process("edit", pdf_processor.remove_images_from_page, file_path, output_path, page_number)
+        finally:
+            storage_service.release_file(file_path)
         
         # Upload the edited file
-        new_file_url = storage_service.upload_file(output_path, output_filename)
+        new_file_url, file_hash = await _store_file(db, output_path, output_filename)
         
         # Create new document record
         new_document = Document(
@@ -1524,8 +2050,9 @@ async def remove_images(
             conversion_type="remove_images",
             created_at=datetime.utcnow(),
             last_accessed=datetime.utcnow(),
-            file_hash=None,
-            owner_id=current_user.id
+            file_hash=file_hash,
+            owner_id=current_user.id,
+            owner_email=current_user.email
         )
         
         db.add(new_document)
@@ -1551,6 +2078,7 @@ async def remove_images(
 
 
 @router.post("/{document_id}/annotate", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def annotate(
     document_id: str,
     page_number: int = Form(...),
@@ -1587,17 +2115,21 @@ async def annotate(
             )
         
         # Get the file path
-        file_path = storage_service.get_file(document.file_path)
+        storage_service = StorageService()
+        file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
         
         # Create output path
         output_filename = f"{document.filename}_annotated_{int(time.time())}.pdf"
         output_path = os.path.join(tempfile.gettempdir(), output_filename)
         
         # Add annotation
-        PDFProcessor().annotate_page(file_path, output_path, page_number, annotation_type, annotation_data)
+        try:
+            await executor_service.run_in_process("edit", pdf_processor.annotate_page, file_path, output_path, page_number, annotation_type, annotation_data)
+        finally:
+            storage_service.release_file(file_path)
         
         # Upload the edited file
-        new_file_url = storage_service.upload_file(output_path, output_filename)
+        new_file_url, file_hash = await _store_file(db, output_path, output_filename)
         
         # Create new document record
         new_document = Document(
@@ -1610,8 +2142,9 @@ async def annotate(
             conversion_type="annotate",
             created_at=datetime.utcnow(),
             last_accessed=datetime.utcnow(),
-            file_hash=None,
-            owner_id=current_user.id
+            file_hash=file_hash,
+            owner_id=current_user.id,
+            owner_email=current_user.email
         )
         
         db.add(new_document)
@@ -1637,6 +2170,7 @@ async def annotate(
 
 
 @router.post("/{document_id}/reorder-pages", response_model=DocumentOperationResponse)
+@invalidate_cache("doc_list:*")  # Invalidate document list cache
 async def reorder_pages(
     document_id: str,
     new_order: str = Form(...),  # JSON string
@@ -1670,32 +2204,45 @@ async def reorder_pages(
                 detail="Invalid page order format"
             )
         
-        # Get the file path
-        file_path = storage_service.get_file(document.file_path)
-        
-        # Create output path
         output_filename = f"{document.filename}_reordered_{int(time.time())}.pdf"
-        output_path = os.path.join(tempfile.gettempdir(), output_filename)
-        
-        # Reorder pages
-        PDFProcessor().reorder_pages(file_path, output_path, new_order_list)
-        
-        # Upload the edited file
-        new_file_url = storage_service.upload_file(output_path, output_filename)
+        params = {"new_order": new_order_list}
+        output_path = None
+        cached = operation_cache_service.get(db, document.file_hash, "reorder_pages", params)
+        if cached:
+            new_file_url, file_hash, file_size = cached[0]["file_path"], cached[0]["file_hash"], cached[0]["file_size"]
+        else:
+            # Get the file path
+            storage_service = StorageService()
+            file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+            
+            # Create output path
+            output_path = os.path.join(tempfile.gettempdir(), output_filename)
+            
+            # Reorder pages
+            try:
+                await executor_service.run_in_process("edit", pdf_processor.reorder_pages, file_path, output_path, new_order_list)
+            finally:
+                storage_service.release_file(file_path)
+            
+            # Upload the edited file
+            file_size = os.path.getsize(output_path)
+            new_file_url, file_hash = await _store_file(db, output_path, output_filename)
+            operation_cache_service.put(db, document.file_hash, "reorder_pages", params, [(file_hash, output_filename)])
         
         # Create new document record
         new_document = Document(
             filename=output_filename,
             original_filename=document.original_filename,
             file_path=new_file_url,
-            file_size=os.path.getsize(output_path),
+            file_size=file_size,
             mime_type=document.mime_type,
             file_type=document.file_type,
             conversion_type="reorder_pages",
             created_at=datetime.utcnow(),
             last_accessed=datetime.utcnow(),
-            file_hash=None,
-            owner_id=current_user.id
+            file_hash=file_hash,
+            owner_id=current_user.id,
+            owner_email=current_user.email
         )
         
         db.add(new_document)
@@ -1703,7 +2250,8 @@ async def reorder_pages(
         db.refresh(new_document)
         
         # Clean up temp file
-        os.unlink(output_path)
+        if output_path:
+            os.unlink(output_path)
         
         return DocumentOperationResponse(
             success=True,
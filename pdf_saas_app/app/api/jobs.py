@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional
+from pydantic import BaseModel
+
+from app.db.session import get_db
+from app.db.models import User, Document
+from app.services.auth_services import get_current_active_user
+from app.services.job_service import job_service, JOB_OPERATIONS, JOB_PRIORITY_NORMAL, JOB_PRIORITY_LOW
+from app.config import settings
+
+router = APIRouter()
+
+class JobCreateRequest(BaseModel):
+    operation: str
+    document_id: str
+    params: Dict[str, Any] = {}
+
+class JobCreateResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    progress_url: str
+
+class JobProgressResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: int
+    message: Optional[str] = None
+
+def _get_owned_job(job_id: str, current_user: User) -> Dict[str, Any]:
+    job = job_service.get_job(job_id)
+    if not job or job["owner_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.post("", response_model=JobCreateResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    job_request: JobCreateRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Queue a long-running operation (compress, ocr, office_to_pdf, to_epub, to_jpg, thumbnails) on a document.
+    Thumbnail sprite generation runs at low priority.
+    Returns immediately with a job id to poll.
+    """
+    if job_request.operation not in JOB_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown operation. Supported: {', '.join(JOB_OPERATIONS)}"
+        )
+
+    document = db.query(Document).filter(
+        Document.id == job_request.document_id,
+        Document.owner_id == current_user.id
+    ).first()
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+
+    try:
+        priority = JOB_PRIORITY_LOW if job_request.operation == "thumbnails" else JOB_PRIORITY_NORMAL
+        job = job_service.create_job(job_request.operation, document.id, current_user.id, job_request.params, priority)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+    status_url = f"{settings.API_V1_STR}/jobs/{job['id']}"
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": status_url,
+        "progress_url": f"{status_url}/progress"
+    }
+
+@router.get("/stats")
+async def get_job_stats(current_user: User = Depends(get_current_active_user)):
+    """Queue depth for the background job queue"""
+    return job_service.get_queue_stats()
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get a job's status, result (when succeeded) or error (when failed)"""
+    job = _get_owned_job(job_id, current_user)
+    return {
+        "job_id": job["id"],
+        "operation": job["operation"],
+        "document_id": job["document_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+
+@router.get("/{job_id}/progress", response_model=JobProgressResponse)
+async def get_job_progress(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Lightweight progress poll"""
+    job = _get_owned_job(job_id, current_user)
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"]
+    }
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Response, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Response, Form
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.services import pdf_services
@@ -7,6 +7,10 @@ import os
 from app.core.pdf_operations import PDFProcessor
 from app.db.models import Document
 from app.services.storage_service import StorageService
+from app.services.text_store_service import text_store_service
+from app.services.blob_store_service import blob_store_service
+from app.services.operation_cache_service import operation_cache_service
+from app.utils.streaming import stream_document
 from datetime import datetime
 from tempfile import NamedTemporaryFile
 
@@ -14,29 +18,56 @@ router = APIRouter(tags=["PDFs"])
 
 storage_service = StorageService()
 
-def _create_new_document_from_file(db, original_doc, new_file_path, suffix):
+def _create_new_document_from_file(db, original_doc, new_file_path, suffix, operation=None, params=None):
     # Upload the new file to storage
     new_filename = os.path.basename(new_file_path)
-    new_file_url = storage_service.upload_file(new_file_path, new_filename)
+    new_file_url, file_hash = blob_store_service.store_file(db, new_file_path, new_filename)
+    if operation:
+        operation_cache_service.put(db, original_doc.file_hash, operation, params, [(file_hash, new_filename)])
+    return _create_new_document(db, original_doc, suffix, new_file_url, file_hash, os.path.getsize(new_file_path))
+
+def _create_new_document(db, original_doc, suffix, new_file_url, file_hash, file_size):
     # Create new Document record
     new_doc = Document(
         filename=f"{os.path.splitext(original_doc.filename)[0]}{suffix}{os.path.splitext(original_doc.filename)[1]}",
         original_filename=original_doc.original_filename,
         file_path=new_file_url,
-        file_size=os.path.getsize(new_file_path),
+        file_size=file_size,
         mime_type=original_doc.mime_type,
         file_type=original_doc.file_type,
         conversion_type=original_doc.conversion_type,
         created_at=datetime.utcnow(),
         last_accessed=datetime.utcnow(),
-        file_hash=None,  # Optionally compute hash
-        owner_id=original_doc.owner_id
+        file_hash=file_hash,
+        owner_id=original_doc.owner_id,
+        owner_email=original_doc.owner_email
     )
     db.add(new_doc)
     db.commit()
     db.refresh(new_doc)
     return new_doc
 
+def _edit_document(db, original_doc, suffix, tag, edit, operation=None, params=None):
+    """
+    Run edit(input_path, output_path) on a local copy of a document and store the result as a new document
+    The output goes to a private temp file, never next to the shared cached copy.
+    """
+    try:
+        file_path = storage_service.acquire_file(original_doc.file_path, original_doc.file_hash)
+    except Exception:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    with NamedTemporaryFile(suffix=f".{tag}.pdf", delete=False) as tmp_out:
+        output_path = tmp_out.name
+    try:
+        try:
+            edit(file_path, output_path)
+        finally:
+            storage_service.release_file(file_path)
+        return _create_new_document_from_file(db, original_doc, output_path, suffix, operation, params)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
 @router.post("/upload")
 def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)):
     file_location = os.path.join(pdf_services.PDF_STORAGE_DIR, file.filename)
@@ -51,24 +82,25 @@ def list_pdfs(db: Session = Depends(get_db)):
     return [{"id": pdf.id, "filename": pdf.filename, "upload_date": pdf.upload_date} for pdf in pdfs]
 
 @router.get("/{pdf_id}")
-def download_pdf(pdf_id: str, db: Session = Depends(get_db)):
+async def download_pdf(pdf_id: str, request: Request, db: Session = Depends(get_db)):
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
     try:
-        file_path = storage_service.get_file(doc.file_path)
+        return await stream_document(request, doc, media_type="application/pdf", inline=True,
+                                     storage_service=storage_service)
     except Exception:
         raise HTTPException(status_code=404, detail="PDF not found")
-    with open(file_path, "rb") as f:
-        return Response(content=f.read(), media_type="application/pdf")
 
 @router.delete("/{pdf_id}")
 def delete_pdf(pdf_id: str, db: Session = Depends(get_db)):
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if doc:
-        storage_service.delete_file(doc.file_path)
+        blob_store_service.release(db, doc)
+        file_hash = doc.file_hash
         db.delete(doc)
         db.commit()
+        text_store_service.release(db, file_hash)
         return {"detail": "PDF deleted"}
     raise HTTPException(status_code=404, detail="PDF not found")
 
@@ -77,13 +109,10 @@ def edit_text(pdf_id: str, page_number: int, old_text: str, new_text: str, db: S
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
-    output_path = file_path + ".edited.pdf"
-    PDFProcessor().edit_text_on_page(file_path, output_path, page_number, old_text, new_text)
-    new_doc = _create_new_document_from_file(db, doc, output_path, suffix=" (edited)")
+    new_doc = _edit_document(
+        db, doc, " (edited)", "edited",
+        lambda file_path, output_path: PDFProcessor().edit_text_on_page(file_path, output_path, page_number, old_text, new_text)
+    )
     return {"detail": "Text edit complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path}
 
 @router.post("/{pdf_id}/add_text")
@@ -91,13 +120,10 @@ def add_text(pdf_id: str, page_number: int, text: str, x: float, y: float, font_
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
-    output_path = file_path + ".addtext.pdf"
-    PDFProcessor().add_text_to_page(file_path, output_path, page_number, text, (x, y), font_size)
-    new_doc = _create_new_document_from_file(db, doc, output_path, suffix=" (addtext)")
+    new_doc = _edit_document(
+        db, doc, " (addtext)", "addtext",
+        lambda file_path, output_path: PDFProcessor().add_text_to_page(file_path, output_path, page_number, text, (x, y), font_size)
+    )
     return {"detail": "Add text complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path}
 
 @router.post("/{pdf_id}/add_image")
@@ -105,14 +131,11 @@ def add_image(pdf_id: str, page_number: int, image_path: str, x: float, y: float
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
-    output_path = file_path + ".addimage.pdf"
     size = (width, height) if width and height else None
-    PDFProcessor().add_image_to_page(file_path, output_path, page_number, image_path, (x, y), size)
-    new_doc = _create_new_document_from_file(db, doc, output_path, suffix=" (addimage)")
+    new_doc = _edit_document(
+        db, doc, " (addimage)", "addimage",
+        lambda file_path, output_path: PDFProcessor().add_image_to_page(file_path, output_path, page_number, image_path, (x, y), size)
+    )
     return {"detail": "Add image complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path}
 
 @router.post("/{pdf_id}/remove_images")
@@ -120,13 +143,10 @@ def remove_images(pdf_id: str, page_number: int, db: Session = Depends(get_db)):
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
-    output_path = file_path + ".noimages.pdf"
-    PDFProcessor().remove_images_from_page(file_path, output_path, page_number)
-    new_doc = _create_new_document_from_file(db, doc, output_path, suffix=" (noimages)")
+    new_doc = _edit_document(
+        db, doc, " (noimages)", "noimages",
+        lambda file_path, output_path: PDFProcessor().remove_images_from_page(file_path, output_path, page_number)
+    )
     return {"detail": "Remove images complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path}
 
 @router.post("/{pdf_id}/annotate")
@@ -134,13 +154,10 @@ def annotate(pdf_id: str, page_number: int, annotation_type: str, data: dict, db
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
-    output_path = file_path + ".annotated.pdf"
-    PDFProcessor().annotate_page(file_path, output_path, page_number, annotation_type, data)
-    new_doc = _create_new_document_from_file(db, doc, output_path, suffix=" (annotated)")
+    new_doc = _edit_document(
+        db, doc, " (annotated)", "annotated",
+        lambda file_path, output_path: PDFProcessor().annotate_page(file_path, output_path, page_number, annotation_type, data)
+    )
     return {"detail": "Annotate complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path}
 
 @router.post("/{pdf_id}/reorder_pages")
@@ -154,13 +171,16 @@ def reorder_pages(pdf_id: str, new_order: str = Form(...), db: Session = Depends
     doc = db.query(Document).filter(Document.id == pdf_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
-    output_path = file_path + ".reordered.pdf"
-    PDFProcessor().reorder_pages(file_path, output_path, new_order_list)
-    new_doc = _create_new_document_from_file(db, doc, output_path, suffix=" (reordered)")
+    params = {"new_order": new_order_list}
+    cached = operation_cache_service.get(db, doc.file_hash, "reorder_pages", params)
+    if cached:
+        new_doc = _create_new_document(db, doc, " (reordered)", cached[0]["file_path"], cached[0]["file_hash"], cached[0]["file_size"])
+        return {"detail": "Reorder pages complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path}
+    new_doc = _edit_document(
+        db, doc, " (reordered)", "reordered",
+        lambda file_path, output_path: PDFProcessor().reorder_pages(file_path, output_path, new_order_list),
+        operation="reorder_pages", params=params
+    )
     return {"detail": "Reorder pages complete", "new_document_id": new_doc.id, "download_url": new_doc.file_path} 
 
 @router.post("/{pdf_id}/to_word")
@@ -174,37 +194,49 @@ def convert_pdf_to_word(pdf_id: str, db: Session = Depends(get_db)):
     if not doc:
         raise HTTPException(status_code=404, detail="PDF not found")
 
-    # Get local path to the PDF from storage
-    try:
-        file_path = storage_service.get_file(doc.file_path)
-    except Exception:
-        raise HTTPException(status_code=404, detail="PDF not found")
+    new_filename = f"{os.path.splitext(doc.filename)[0]}.docx"
+    output_path = None
+    cached = operation_cache_service.get(db, doc.file_hash, "to_word")
+    if cached:
+        new_file_url, file_hash, file_size = cached[0]["file_path"], cached[0]["file_hash"], cached[0]["file_size"]
+    else:
+        # Get local path to the PDF from storage
+        try:
+            file_path = storage_service.acquire_file(doc.file_path, doc.file_hash)
+        except Exception:
+            raise HTTPException(status_code=404, detail="PDF not found")
 
-    # Prepare temporary output DOCX path
-    with NamedTemporaryFile(suffix=".docx", delete=False) as tmp_out:
-        output_path = tmp_out.name
+        # Prepare temporary output DOCX path
+        with NamedTemporaryFile(suffix=".docx", delete=False) as tmp_out:
+            output_path = tmp_out.name
 
     try:
-        # Convert
-        PDFProcessor().pdf_to_docx(file_path, output_path)
+        if not cached:
+            # Convert
+            try:
+                PDFProcessor().pdf_to_docx(file_path, output_path)
+            finally:
+                storage_service.release_file(file_path)
 
-        # Upload converted file
-        new_filename = f"{os.path.splitext(doc.filename)[0]}.docx"
-        new_file_url = storage_service.upload_file(output_path, new_filename)
+            # Upload converted file
+            file_size = os.path.getsize(output_path)
+            new_file_url, file_hash = blob_store_service.store_file(db, output_path, new_filename)
+            operation_cache_service.put(db, doc.file_hash, "to_word", None, [(file_hash, new_filename)])
 
         # Create new Document record for the DOCX
         new_doc = Document(
             filename=new_filename,
             original_filename=doc.original_filename,
             file_path=new_file_url,
-            file_size=os.path.getsize(output_path),
+            file_size=file_size,
             mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             file_type="docx",
             conversion_type="pdf_to_word",
             created_at=datetime.utcnow(),
             last_accessed=datetime.utcnow(),
-            file_hash=None,
-            owner_id=doc.owner_id
+            file_hash=file_hash,
+            owner_id=doc.owner_id,
+            owner_email=doc.owner_email
         )
         db.add(new_doc)
         db.commit()
@@ -220,7 +252,7 @@ def convert_pdf_to_word(pdf_id: str, db: Session = Depends(get_db)):
     finally:
         # Clean up temp file
         try:
-            if os.path.exists(output_path):
+            if output_path and os.path.exists(output_path):
                 os.remove(output_path)
         except Exception:
             pass
\ No newline at end of file
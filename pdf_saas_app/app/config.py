@@ -24,6 +24,21 @@ class Settings(BaseSettings):
 
     # AI Services
     OPENAI_API_KEY: str
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE: int = 128           # chunks per embeddings request
+    EMBEDDING_INDEX_DIR: str = os.path.join("temp", "embeddings")  # one vector index per file_hash
+    EMBEDDING_INDEX_MAX_BYTES: int = 1024 * 1024 * 1024  # 1 GB
+    RETRIEVAL_CHUNK_CHARS: int = 1500         # characters per embedded chunk
+    RETRIEVAL_CHUNK_OVERLAP: int = 200
+    RETRIEVAL_TOP_K: int = 6                  # chunks sent to the model with each question
+    LLM_MAX_CONCURRENT_REQUESTS: int = 8      # OpenAI calls in flight across the process
+    LLM_MAX_RETRIES: int = 5                  # retries of a rate-limited (429) call
+    LLM_RETRY_BASE_DELAY: float = 1.0         # seconds, doubled on each retry (with jitter)
+    SUMMARY_MODEL: str = "gpt-3.5-turbo"
+    SUMMARY_CONCURRENCY: int = 4              # chunk summaries of one document requested at a time
+    SUMMARY_CHUNK_TOKENS: int = 2000          # tokens per summarized chunk
+    SUMMARY_CONTEXT_TOKENS: int = 8000        # partial summaries combined in one reduce call
+    SUMMARY_PARTIAL_CHARS: int = 1200         # length of each intermediate summary
 
     # Storage
     STORAGE_TYPE: str = "local"  # local, s3, azure
@@ -33,6 +48,27 @@ class Settings(BaseSettings):
     AZURE_CONNECTION_STRING: Optional[str] = None
     AZURE_CONTAINER_NAME: Optional[str] = None
     LOCAL_STORAGE_PATH: str = "storage"
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024  # bytes per chunk when streaming downloads
+    INGEST_CHUNK_SIZE: int = 1024 * 1024    # read/write buffer for the upload pipeline
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024  # S3 requires at least 5 MB per part
+    AZURE_BLOCK_SIZE: int = 8 * 1024 * 1024
+    # Content-addressed blobs
+    BLOB_GC_GRACE_SECONDS: int = 3600     # unreferenced blobs are deleted after this
+    BLOB_GC_INTERVAL_SECONDS: int = 600   # how often the worker collects garbage
+    # Operation-result cache (derived outputs reused by input hash, operation and parameters)
+    OPERATION_CACHE_ENABLED: bool = True
+    OPERATION_CACHE_TTL_HOURS: int = 7 * 24
+    OPERATION_CACHE_MAX_ENTRIES: int = 10000
+    OPERATION_CACHE_MAX_BYTES: int = 10 * 1024 * 1024 * 1024  # 10 GB of cached outputs
+    # Resumable uploads
+    UPLOAD_STAGING_DIR: str = os.path.join("temp", "uploads")
+    UPLOAD_MAX_SIZE: int = 2 * 1024 * 1024 * 1024  # 2 GB
+    UPLOAD_SESSION_TTL_HOURS: int = 24             # unfinished sessions are aborted after this
+    # Local read-through cache for S3/Azure objects used by StorageService.get_file
+    STORAGE_CACHE_ENABLED: bool = True
+    STORAGE_CACHE_DIR: str = os.path.join("temp", "storage_cache")
+    STORAGE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 2 GB
+    STORAGE_CACHE_MIN_AGE_SECONDS: int = 300  # never evict entries used more recently than this
 
     # Google OAuth
     GOOGLE_CLIENT_ID: str = ""
@@ -57,6 +93,68 @@ class Settings(BaseSettings):
     CACHE_ENABLED: bool = True
     CACHE_DEFAULT_TTL: int = 3600   # 1 hour default TTL
 
+    # Execution layer for blocking work in async endpoints
+    EXECUTOR_THREAD_WORKERS: int = 16            # IO / subprocess work
+    EXECUTOR_PROCESS_WORKERS: Optional[int] = None  # CPU-bound PDF work (defaults to CPU count)
+    EXECUTOR_DEFAULT_OPERATION_LIMIT: int = 4    # concurrent calls per operation
+    EXECUTOR_OPERATION_LIMITS: Dict[str, int] = {
+        "compress": 2,
+        "ocr": 2,
+        "text": 8,
+        "office_convert": 2,
+        "epub": 1,
+        "rasterize": 2,
+        "storage": 8
+    }
+
+    # Background jobs
+    JOB_QUEUE_NAME: str = "jobs"
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: int = 5     # doubled on each retry
+    JOB_VISIBILITY_TIMEOUT: int = 600      # seconds without a heartbeat before a job is considered lost
+    JOB_RESULT_TTL: int = 60 * 60 * 24 * 7 # keep finished job state for 7 days
+
+    # LibreOffice conversion pool
+    OFFICE_POOL_SIZE: int = 2                 # long-lived listeners, each with its own user profile
+    OFFICE_POOL_MAX_CONVERSIONS: int = 200    # recycle a listener after this many conversions
+    OFFICE_POOL_START_TIMEOUT: int = 30       # seconds to wait for a listener to accept connections
+    OFFICE_POOL_ACQUIRE_TIMEOUT: int = 120    # seconds to wait for a free listener
+    OFFICE_CONVERT_TIMEOUT: int = 120         # per-conversion limit; the listener is killed past this
+    OFFICE_POOL_PREWARM: bool = False         # start listeners at application startup
+    OFFICE_POOL_MODE: str = "auto"            # "unoserver", "cli" or "auto" (unoserver when it runs)
+    OFFICE_UNOSERVER_COMMAND: str = "/usr/bin/python3 -m unoserver.server"  # system Python, where python3-uno imports
+
+    # OCR
+    OCR_RENDER_DPI: int = 200       # render resolution for image-only pages
+    OCR_MAX_WORKERS: Optional[int] = None  # OCR process pool size (defaults to CPU count)
+    TEXT_STREAM_BATCH_PAGES: int = 50  # streamed pages persisted per transaction
+
+    # Compression
+    COMPRESS_MAX_WORKERS: Optional[int] = None  # compression process pool size (defaults to CPU count)
+    COMPRESS_PARALLEL_MIN_PAGES: int = 32       # smaller documents are compressed by a single worker
+
+    # PDF to image rasterization
+    RASTERIZE_BACKEND: str = "pymupdf"           # "pymupdf" (in-process MuPDF) or "poppler" (pdftoppm subprocesses)
+    RASTERIZE_MAX_WORKERS: Optional[int] = None  # parallel render processes (defaults to CPU count)
+    RASTERIZE_CHUNK_PAGES: int = 8               # pages rendered per task
+
+    # Page thumbnails
+    THUMBNAIL_SIZES: Dict[str, int] = {   # longer side in pixels
+        "small": 160,
+        "medium": 400,
+        "large": 1024
+    }
+    THUMBNAIL_JPEG_QUALITY: int = 80
+    THUMBNAIL_CACHE_DIR: str = os.path.join("temp", "thumbnails")  # must be one directory shared by the app and the workers (see docker-compose.yml)
+    THUMBNAIL_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 512 MB
+    THUMBNAIL_SPRITE_PAGES: int = 20        # page thumbnails per sprite strip
+    THUMBNAIL_PREGENERATE: bool = True      # queue a low-priority sprite job for every uploaded PDF
+    THUMBNAIL_PREGENERATE_SIZE: str = "small"
+
+    # Watermarking
+    WATERMARK_BATCH_MAX_DOCUMENTS: int = 200    # documents accepted by one batch request
+    WATERMARK_BATCH_CONCURRENCY: int = 4        # documents of one batch processed at a time
+
     @field_validator("SQLALCHEMY_DATABASE_URI", mode="before")
     def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
         # 1) If explicitly provided, respect it
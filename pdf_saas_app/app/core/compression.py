@@ -0,0 +1,296 @@
+import io
+import os
+import math
+import shutil
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# target_dpi: images are resampled to this resolution
+# threshold: only images above target_dpi * threshold are touched (as Ghostscript's DownsampleThreshold)
+# jpeg_quality: quality of re-encoded images
+COMPRESSION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "screen": {"target_dpi": 72, "threshold": 1.5, "jpeg_quality": 50},
+    "ebook": {"target_dpi": 150, "threshold": 1.5, "jpeg_quality": 70},
+    "print": {"target_dpi": 300, "threshold": 1.5, "jpeg_quality": 85},
+}
+DEFAULT_PROFILE = "ebook"
+
+def get_profile(profile: str, quality: Optional[int] = None) -> Dict[str, Any]:
+    """Look up a compression profile, optionally overriding its JPEG quality"""
+    if profile not in COMPRESSION_PROFILES:
+        raise ValueError(f"Unknown compression profile '{profile}', expected one of {', '.join(COMPRESSION_PROFILES)}")
+    options = dict(COMPRESSION_PROFILES[profile])
+    if quality is not None:
+        if not 1 <= quality <= 95:
+            raise ValueError("quality must be between 1 and 95")
+        options["jpeg_quality"] = quality
+    return options
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_compression_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the shared compression process pool, creating it on first use (None if processes are unavailable)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = settings.COMPRESS_MAX_WORKERS or os.cpu_count() or 1
+            try:
+                # spawn, as for the OCR pool: no forked copies of PyMuPDF state or server threads
+                _pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started compression process pool with {max_workers} workers")
+            except Exception as e:
+                logger.warning(f"Could not start compression process pool, compressing in-process: {str(e)}")
+                return None
+        return _pool
+
+def reset_compression_pool() -> None:
+    """Discard the shared pool (e.g. after a worker crash) so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _recompressible(doc: fitz.Document, xref: int) -> bool:
+    # Stencil masks, bilevel scans and images with a custom /Decode are left as they are
+    if doc.xref_get_key(xref, "ImageMask")[1] == "true":
+        return False
+    if doc.xref_get_key(xref, "BitsPerComponent")[1] == "1":
+        return False
+    return doc.xref_get_key(xref, "Decode")[0] == "null"
+
+def scan_pages(file_path: str, start: int, stop: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Describe the recompressible image XObjects drawn on pages [start, stop)
+    Module-level so shards can run in worker processes; each call opens the PDF itself.
+    Returns:
+        xref -> {"shown": largest drawn (width, height) in points, "pixels": (width, height),
+                 "content": SHA-256 of the raw stream, "raw_size": raw stream length}
+    """
+    images: Dict[int, Dict[str, Any]] = {}
+    with fitz.open(file_path) as doc:
+        for page_index in range(start, stop):
+            for info in doc[page_index].get_image_info(xrefs=True):
+                xref = info.get("xref")
+                if not xref:
+                    continue  # inline image
+                a, b, c, d = info["transform"][:4]
+                width, height = math.hypot(a, b), math.hypot(c, d)
+                if xref in images:
+                    shown = images[xref]["shown"]
+                    images[xref]["shown"] = (max(shown[0], width), max(shown[1], height))
+                    continue
+                if not _recompressible(doc, xref):
+                    images[xref] = {"shown": (width, height), "pixels": None}
+                    continue
+                raw = doc.xref_stream_raw(xref)
+                images[xref] = {
+                    "shown": (width, height),
+                    "pixels": (int(doc.xref_get_key(xref, "Width")[1]), int(doc.xref_get_key(xref, "Height")[1])),
+                    "content": hashlib.sha256(raw).hexdigest(),
+                    "raw_size": len(raw)
+                }
+    return images
+
+def _merge_scans(scans: List[Dict[int, Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+    """Combine shard scans; an image drawn in several shards keeps its largest drawn size"""
+    images: Dict[int, Dict[str, Any]] = {}
+    for scan in scans:
+        for xref, image in scan.items():
+            if xref in images:
+                shown = images[xref]["shown"]
+                images[xref]["shown"] = (max(shown[0], image["shown"][0]), max(shown[1], image["shown"][1]))
+            else:
+                images[xref] = dict(image)
+    return images
+
+def _plan(images: Dict[int, Dict[str, Any]], options: Dict[str, Any]) -> Dict[tuple, List[int]]:
+    """Group the images worth downsampling by (content, target width, target height)"""
+    plan: Dict[tuple, List[int]] = {}
+    for xref, image in sorted(images.items()):
+        shown_width, shown_height = image["shown"]
+        if image["pixels"] is None or shown_width <= 0 or shown_height <= 0:
+            continue
+        pixel_width, pixel_height = image["pixels"]
+        dpi = min(pixel_width / (shown_width / 72), pixel_height / (shown_height / 72))
+        if dpi <= options["target_dpi"] * options["threshold"]:
+            continue
+        scale = options["target_dpi"] / dpi
+        target = (image["content"], max(1, round(pixel_width * scale)), max(1, round(pixel_height * scale)))
+        plan.setdefault(target, []).append(xref)
+    return plan
+
+def encode_images(file_path: str, jobs: List[tuple], quality: int) -> List[Optional[tuple]]:
+    """
+    Downsample and JPEG-encode images, given as (xref, width, height)
+    Module-level so shards can run in worker processes.
+    Returns (data, colorspace) per job, or None where the image could not be decoded.
+    """
+    results = []
+    with fitz.open(file_path) as doc:
+        for xref, width, height in jobs:
+            try:
+                results.append(_encode_image(doc, xref, width, height, quality))
+            except Exception as e:
+                logger.warning(f"Could not recompress image {xref}: {str(e)}")
+                results.append(None)
+    return results
+
+def _encode_image(doc: fitz.Document, xref: int, width: int, height: int, quality: int) -> tuple:
+    """Render an image XObject, resample it to width x height and encode it as JPEG"""
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)  # the soft mask stays a separate object
+    if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    mode = "L" if pix.n == 1 else "RGB"
+    image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    if (width, height) != image.size:
+        image = image.resize((width, height), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), "/DeviceGray" if mode == "L" else "/DeviceRGB"
+
+def _replace_image_stream(doc: fitz.Document, xref: int, data: bytes, width: int, height: int, colorspace: str) -> None:
+    # Rewrites the object in place, so every page using it picks up the new image
+    doc.update_stream(xref, data, compress=False)
+    doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    doc.xref_set_key(xref, "DecodeParms", "null")
+    doc.xref_set_key(xref, "Width", str(width))
+    doc.xref_set_key(xref, "Height", str(height))
+    doc.xref_set_key(xref, "BitsPerComponent", "8")
+    doc.xref_set_key(xref, "ColorSpace", colorspace)
+
+def apply_and_save(file_path: str, output_path: str, replacements: Dict[int, tuple],
+                   stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Write the re-encoded images, given as xref -> (data, width, height, colorspace),
+    subset fonts, drop unused and duplicate objects and save linearized
+    """
+    with fitz.open(file_path) as doc:
+        for xref, (data, width, height, colorspace) in replacements.items():
+            _replace_image_stream(doc, xref, data, width, height, colorspace)
+
+        try:
+            doc.subset_fonts()
+        except Exception as e:
+            # Needs fontTools; the rest of the compression still applies without it
+            logger.warning(f"Font subsetting skipped: {str(e)}")
+
+        # garbage=4 also merges identical streams, which collapses duplicate images into one object
+        doc.save(output_path, garbage=4, deflate=True, deflate_images=True, deflate_fonts=True, linear=True)
+
+    if os.path.getsize(output_path) >= os.path.getsize(file_path):
+        # Nothing worth recompressing (e.g. already optimized); never hand back a bigger file
+        shutil.copyfile(file_path, output_path)
+        stats["unchanged"] = True
+    return stats
+
+def _shards(count: int, parts: int) -> List[tuple]:
+    size = math.ceil(count / parts)
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+def compress_pdf(file_path: str, output_path: str, profile: str = DEFAULT_PROFILE,
+                 quality: Optional[int] = None, parallel: bool = True) -> Dict[str, Any]:
+    """
+    Compress a PDF without rasterizing its pages
+    Images drawn above the profile's target DPI are downsampled and re-encoded as JPEG
+    (identical images are encoded once and merged on save); text and vector content
+    are untouched. Fonts are subset, unused and duplicate objects removed and the
+    output is linearized.
+
+    Documents of COMPRESS_PARALLEL_MIN_PAGES or more are sharded by page range over
+    the compression process pool: shards scan their pages and encode their share of
+    the images, and the re-encoded streams are written into the original document in
+    one final save, so outlines, links and forms are kept as they are. Smaller
+    documents run as a single task in the pool.
+    Returns:
+        Statistics: images seen, images recompressed and bytes saved on images
+    """
+    options = get_profile(profile, quality)
+    with fitz.open(file_path) as doc:
+        if doc.needs_pass:
+            raise ValueError("Cannot compress an encrypted PDF")
+        page_count = doc.page_count
+
+    pool = get_compression_pool() if parallel else None
+    workers = settings.COMPRESS_MAX_WORKERS or os.cpu_count() or 1
+    if pool is None or workers < 2 or page_count < settings.COMPRESS_PARALLEL_MIN_PAGES:
+        if pool is None:
+            return _compress(file_path, output_path, profile, options, [(0, page_count)], None)
+        try:
+            return pool.submit(compress_pdf, file_path, output_path, profile, quality, False).result()
+        except BrokenProcessPool:
+            logger.error("Compression process pool broke, compressing in-process")
+            reset_compression_pool()
+            return compress_pdf(file_path, output_path, profile, quality, False)
+
+    try:
+        return _compress(file_path, output_path, profile, options, _shards(page_count, workers), pool)
+    except BrokenProcessPool:
+        logger.error("Compression process pool broke, compressing in-process")
+        reset_compression_pool()
+        return compress_pdf(file_path, output_path, profile, quality, False)
+
+def _compress(file_path: str, output_path: str, profile: str, options: Dict[str, Any],
+              shards: List[tuple], pool: Optional[ProcessPoolExecutor]) -> Dict[str, Any]:
+    def run(func, *args):
+        return pool.submit(func, *args) if pool is not None else _Done(func(*args))
+
+    scans = [run(scan_pages, file_path, start, stop) for start, stop in shards]
+    images = _merge_scans([scan.result() for scan in scans])
+    plan = _plan(images, options)
+
+    # Spread the encoding work evenly, largest images first
+    jobs = sorted(plan.items(), key=lambda item: -images[item[1][0]]["raw_size"])
+    batches: List[List[tuple]] = [[] for _ in shards]
+    for i, job in enumerate(jobs):
+        batches[i % len(batches)].append(job)
+    encoded = [
+        (batch, run(encode_images, file_path, [(xrefs[0], width, height) for (_, width, height), xrefs in batch],
+                    options["jpeg_quality"]))
+        for batch in batches if batch
+    ]
+
+    stats = {"profile": profile, "images": len(images), "recompressed": 0, "image_bytes_saved": 0,
+             "unchanged": False, "shards": len(shards)}
+    replacements: Dict[int, tuple] = {}
+    for batch, future in encoded:
+        for ((_, width, height), xrefs), result in zip(batch, future.result()):
+            if result is None:
+                continue
+            data, colorspace = result
+            for xref in xrefs:
+                if len(data) >= images[xref]["raw_size"]:
+                    continue
+                replacements[xref] = (data, width, height, colorspace)
+                stats["recompressed"] += 1
+                stats["image_bytes_saved"] += images[xref]["raw_size"] - len(data)
+
+    # One final writer keeps the document structure intact
+    return run(apply_and_save, file_path, output_path, replacements, stats).result()
+
+class _Done:
+    """Already computed result with the Future interface, for in-process runs"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def result(self) -> Any:
+        return self.value
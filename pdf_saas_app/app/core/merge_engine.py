@@ -0,0 +1,109 @@
+import os
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# garbage=3 drops unused objects and merges duplicates, so resources shared by
+# several inputs (or by the pages of one input) are written once
+SAVE_OPTIONS = {"garbage": 3, "deflate": True}
+
+def parse_page_range(spec: Optional[str], page_count: int) -> List[Tuple[int, int]]:
+    """
+    Parse a 1-based page selection such as "1-3,7,10-" into 0-based inclusive runs
+    Runs keep the order given; a reversed run ("5-3") selects pages backwards.
+    None or an empty string selects every page.
+    Raises:
+        ValueError: The selection is malformed or out of range
+    """
+    if spec is None or not spec.strip():
+        return [(0, page_count - 1)] if page_count else []
+
+    runs = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                first, last = part.split("-", 1)
+                start = int(first) if first.strip() else 1
+                end = int(last) if last.strip() else page_count
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise ValueError(f"Invalid page range '{part}'")
+        if not (1 <= start <= page_count and 1 <= end <= page_count):
+            raise ValueError(f"Page range '{part}' is outside 1-{page_count}")
+        runs.append((start - 1, end - 1))
+    if not runs:
+        raise ValueError(f"Invalid page range '{spec}'")
+    return runs
+
+def _selected_pages(runs: Sequence[Tuple[int, int]]) -> List[int]:
+    pages = []
+    for start, end in runs:
+        step = 1 if end >= start else -1
+        pages.extend(range(start, end + step, step))
+    return pages
+
+def _remap_toc(toc: List[list], page_map: dict, offset: int) -> List[list]:
+    """Keep outline entries whose target page was merged, pointing them at the new page numbers"""
+    remapped = []
+    for level, title, page, *rest in toc:
+        # get_toc pages are 1-based; -1 or 0 means no destination
+        new_index = page_map.get(page - 1)
+        if new_index is None:
+            continue
+        entry = [level, title, offset + new_index + 1]
+        if rest and isinstance(rest[0], dict):
+            dest = {k: v for k, v in rest[0].items() if k in ("kind", "to", "zoom", "collapse", "color", "bold", "italic")}
+            dest["kind"] = fitz.LINK_GOTO
+            entry.append(dest)
+        remapped.append(entry)
+    return remapped
+
+def _normalize_toc_levels(toc: List[list]) -> List[list]:
+    """set_toc needs the first entry at level 1 and no level jumping by more than one"""
+    previous = 0
+    for entry in toc:
+        entry[0] = max(1, min(entry[0], previous + 1))
+        previous = entry[0]
+    return toc
+
+def merge_pdfs(inputs: Sequence[Tuple[str, Optional[str]]], output_path: str) -> str:
+    """
+    Merge PDFs with PyMuPDF's insert_pdf
+    Args:
+        inputs: (file_path, page_range) pairs; page_range uses parse_page_range syntax, None for all pages
+        output_path: Where to write the merged PDF
+    The outlines of the inputs are carried over for the pages that were kept.
+    """
+    merged = fitz.open()
+    toc = []
+    try:
+        for file_path, page_range in inputs:
+            with fitz.open(file_path) as source:
+                if source.needs_pass:
+                    raise ValueError(f"{os.path.basename(file_path)} is encrypted")
+                runs = parse_page_range(page_range, source.page_count)
+                offset = merged.page_count
+                for start, end in runs:
+                    merged.insert_pdf(source, from_page=start, to_page=end, links=True, annots=True)
+
+                # The first merged copy of a source page is where its bookmarks point
+                page_map = {}
+                for new_index, page_index in enumerate(_selected_pages(runs)):
+                    page_map.setdefault(page_index, new_index)
+                toc.extend(_remap_toc(source.get_toc(simple=False), page_map, offset))
+
+        if merged.page_count == 0:
+            raise ValueError("No pages selected to merge")
+        if toc:
+            merged.set_toc(_normalize_toc_levels(toc))
+        merged.save(output_path, **SAVE_OPTIONS)
+        return output_path
+    finally:
+        merged.close()
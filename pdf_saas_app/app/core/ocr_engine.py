@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Iterator, Deque, Tuple
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+def ocr_page(file_path: str, page_index: int, dpi: int) -> Dict[str, Any]:
+    """
+    Render a single page at the given DPI and OCR it.
+    Module-level so it can run in a worker process; each call opens the PDF itself.
+    """
+    started = time.perf_counter()
+    with fitz.open(file_path) as doc:
+        pix = doc[page_index].get_pixmap(dpi=dpi, alpha=False)
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    text = pytesseract.image_to_string(img)
+    return {"page": page_index + 1, "text": text, "ocr": True, "ms": _elapsed_ms(started)}
+
+def get_ocr_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the shared OCR process pool, creating it on first use (None if processes are unavailable)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = settings.OCR_MAX_WORKERS or os.cpu_count() or 1
+            try:
+                # spawn avoids forking a process that holds PyMuPDF/Tesseract state and server threads
+                _pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started OCR process pool with {max_workers} workers")
+            except Exception as e:
+                logger.warning(f"Could not start OCR process pool, falling back to serial OCR: {str(e)}")
+                return None
+        return _pool
+
+def reset_ocr_pool() -> None:
+    """Discard the shared pool (e.g. after a worker crash) so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+class OCREngine:
+    """
+    Page-parallel text extraction.
+
+    Pages are walked in the main process with PyMuPDF; pages that already have a
+    text layer are returned directly, image-only pages are rendered and OCR'd in a
+    process pool sized to the machine. Results keep page order.
+    """
+
+    def __init__(self, dpi: Optional[int] = None):
+        self.dpi = dpi or settings.OCR_RENDER_DPI
+
+    def extract_pages(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Extract text for every page
+        Returns a list of {"page", "text", "ocr", "ms"} dicts in page order (1-based pages)
+        """
+        return list(self.iter_pages(file_path))
+
+    def iter_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield {"page", "text", "ocr", "ms"} dicts in page order as soon as each page is ready.
+        OCR for all image-only pages is submitted up front; text pages are yielded
+        immediately unless an earlier OCR page is still running. Closing the generator
+        early (e.g. a client leaving a stream) cancels the OCR not yet started.
+        """
+        pending: Deque[Tuple[int, Any]] = deque()
+        pool = None
+        pool_checked = False
+
+        try:
+            with fitz.open(file_path) as doc:
+                for page in doc:
+                    started = time.perf_counter()
+                    page_text = page.get_text()
+                    if page_text.strip():
+                        pending.append((page.number, {"page": page.number + 1, "text": page_text, "ocr": False, "ms": _elapsed_ms(started)}))
+                    else:
+                        if not pool_checked:
+                            # Once per call: if the pool cannot start, every page is OCR'd in-process
+                            pool = get_ocr_pool()
+                            pool_checked = True
+                        future = pool.submit(ocr_page, file_path, page.number, self.dpi) if pool is not None else None
+                        pending.append((page.number, future))
+
+                    # Flush whatever is already finished at the head of the queue
+                    while pending and self._is_ready(pending[0][1]):
+                        yield self._resolve(file_path, *pending.popleft())
+
+            while pending:
+                yield self._resolve(file_path, *pending.popleft())
+        finally:
+            for _, item in pending:
+                if isinstance(item, Future):
+                    item.cancel()
+
+    @staticmethod
+    def _is_ready(item: Any) -> bool:
+        # None means serial OCR, which is resolved in-process right away
+        return item is None or isinstance(item, dict) or (isinstance(item, Future) and item.done())
+
+    def _resolve(self, file_path: str, page_index: int, item: Any) -> Dict[str, Any]:
+        """Turn a queued page (result, future or None for in-process OCR) into its result"""
+        if isinstance(item, dict):
+            return item
+        try:
+            return item.result() if item is not None else ocr_page(file_path, page_index, self.dpi)
+        except BrokenProcessPool:
+            logger.error("OCR process pool broke, retrying page in-process")
+            reset_ocr_pool()
+            return ocr_page(file_path, page_index, self.dpi)
@@ -0,0 +1,335 @@
+import os
+import queue
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+import xmlrpc.client
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_unoserver_available: Optional[bool] = None
+
+def unoserver_available() -> bool:
+    """
+    Whether OFFICE_UNOSERVER_COMMAND can run
+    unoserver needs python3-uno, which is only importable from the system Python next
+    to LibreOffice, so it runs as its own process and is driven over XML-RPC; the app's
+    interpreter never imports uno.
+    """
+    global _unoserver_available
+    if _unoserver_available is None:
+        if settings.OFFICE_POOL_MODE != "auto":
+            _unoserver_available = settings.OFFICE_POOL_MODE == "unoserver"
+        else:
+            command = shlex.split(settings.OFFICE_UNOSERVER_COMMAND)
+            try:
+                result = subprocess.run(command + ["--version"], capture_output=True, timeout=30)
+                _unoserver_available = result.returncode == 0
+            except (OSError, subprocess.TimeoutExpired):
+                _unoserver_available = False
+        logger.info(f"LibreOffice pool mode: {'unoserver' if _unoserver_available else 'cli'}")
+    return _unoserver_available
+
+def find_soffice() -> str:
+    """Locate the LibreOffice binary"""
+    if os.name == 'nt':  # Windows
+        candidates = [
+            r"C:\Program Files\LibreOffice\program\soffice.exe",
+            r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
+            os.path.expanduser("~\\AppData\\Local\\Programs\\LibreOffice\\program\\soffice.exe")
+        ]
+    else:  # Linux/Mac
+        candidates = [
+            "/usr/bin/libreoffice",
+            "/usr/bin/soffice",
+            "/usr/lib/libreoffice/program/soffice",
+            "/opt/libreoffice/program/soffice",
+            "/snap/bin/libreoffice",
+            "/usr/local/bin/libreoffice",
+            "/usr/local/bin/soffice"
+        ]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    for name in ("libreoffice", "soffice"):
+        path = shutil.which(name)
+        if path:
+            return path
+    raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport whose socket operations time out"""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+class OfficeListener:
+    """
+    One long-lived LibreOffice instance with its own user profile.
+
+    With unoserver available the slot runs `unoserver` (LibreOffice plus an XML-RPC
+    front end) on local ports and documents are converted over XML-RPC without a
+    process start. Otherwise the slot falls back to running `soffice --convert-to`
+    against its own (already initialised) profile, which still skips first-run
+    profile creation and lets slots convert concurrently.
+    """
+
+    def __init__(self, slot: int, soffice_path: str):
+        self.slot = slot
+        self.soffice_path = soffice_path
+        self.profile_dir = tempfile.mkdtemp(prefix=f"lo_profile_{slot}_")
+        self.process: Optional[subprocess.Popen] = None
+        self.port: Optional[int] = None
+        self.conversions = 0
+        self.started_at: Optional[float] = None
+
+    @property
+    def profile_url(self) -> str:
+        return "file://" + os.path.abspath(self.profile_dir).replace(os.sep, "/")
+
+    @property
+    def uses_server(self) -> bool:
+        return unoserver_available()
+
+    def start(self) -> None:
+        """Start the listener and wait until it accepts connections"""
+        self.conversions = 0
+        self.started_at = time.time()
+        if not self.uses_server:
+            self._warm_profile()
+            return
+
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            shlex.split(settings.OFFICE_UNOSERVER_COMMAND) + [
+                "--interface", "127.0.0.1", "--port", str(self.port),
+                "--uno-port", str(_free_port()),
+                "--executable", self.soffice_path,
+                "--user-installation", os.path.abspath(self.profile_dir)
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            # Own process group, so stop() also ends the soffice child
+            start_new_session=os.name != 'nt'
+        )
+        deadline = time.time() + settings.OFFICE_POOL_START_TIMEOUT
+        while time.time() < deadline:
+            if self.is_healthy():
+                logger.info(f"LibreOffice listener {self.slot} ready on port {self.port}")
+                return
+            time.sleep(0.2)
+        self.stop()
+        raise Exception(f"LibreOffice listener {self.slot} did not start within {settings.OFFICE_POOL_START_TIMEOUT}s")
+
+    def _warm_profile(self) -> None:
+        # First run of a fresh profile is most of soffice's cold start; do it once up front
+        if os.listdir(self.profile_dir):
+            return
+        subprocess.run(
+            [self.soffice_path, "--headless", "--terminate_after_init", f"-env:UserInstallation={self.profile_url}"],
+            capture_output=True,
+            timeout=settings.OFFICE_POOL_START_TIMEOUT
+        )
+
+    def stop(self) -> None:
+        if self.process is not None:
+            if self.process.poll() is None:
+                try:
+                    if os.name != 'nt':
+                        os.killpg(self.process.pid, signal.SIGKILL)
+                    else:
+                        self.process.kill()
+                except ProcessLookupError:
+                    pass
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            self.process = None
+
+    def is_healthy(self) -> bool:
+        """Process alive and XML-RPC port accepting (profile present in fallback mode)"""
+        if not self.uses_server:
+            return os.path.isdir(self.profile_dir)
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def recycle(self) -> None:
+        """Restart with a clean profile"""
+        logger.info(f"Recycling LibreOffice listener {self.slot} after {self.conversions} conversions")
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.start()
+
+    def destroy(self) -> None:
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def convert(self, input_path: str, output_path: str, timeout: int) -> None:
+        """Convert one document to PDF at output_path"""
+        if self.uses_server:
+            self._convert_server(input_path, output_path, timeout)
+        else:
+            self._convert_cli(input_path, output_path, timeout)
+        self.conversions += 1
+
+    def _convert_server(self, input_path: str, output_path: str, timeout: int) -> None:
+        # A timed-out call leaves the conversion running; the pool then stops the listener
+        proxy = xmlrpc.client.ServerProxy(
+            f"http://127.0.0.1:{self.port}", transport=_TimeoutTransport(timeout), allow_none=True
+        )
+        try:
+            # unoserver's convert(inpath, indata, outpath, convert_to)
+            proxy.convert(os.path.abspath(input_path), None, os.path.abspath(output_path), "pdf")
+        except socket.timeout:
+            raise TimeoutError(f"LibreOffice listener {self.slot} did not convert within {timeout}s")
+        except xmlrpc.client.Fault as e:
+            raise Exception(f"Conversion failed: {e.faultString}")
+        if not os.path.exists(output_path):
+            raise Exception("LibreOffice did not write the converted document")
+
+    def _convert_cli(self, input_path: str, output_path: str, timeout: int) -> None:
+        with tempfile.TemporaryDirectory() as out_dir:
+            result = subprocess.run(
+                [
+                    self.soffice_path, "--headless", "--norestore", "--nolockcheck",
+                    f"-env:UserInstallation={self.profile_url}",
+                    "--convert-to", "pdf", "--outdir", out_dir, os.path.abspath(input_path)
+                ],
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            if result.returncode != 0:
+                raise Exception(f"Conversion failed: {result.stderr}")
+            converted_file = os.path.join(out_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+            if not os.path.exists(converted_file):
+                raise Exception(f"Converted file not found in {out_dir}: {os.listdir(out_dir)}")
+            shutil.move(converted_file, output_path)
+
+class OfficePool:
+    """
+    Pool of warm LibreOffice listeners shared by every office-to-PDF conversion.
+
+    Listeners are handed out one conversion at a time, health-checked before use,
+    restarted after a failure and recycled after OFFICE_POOL_MAX_CONVERSIONS.
+    """
+
+    def __init__(self, size: Optional[int] = None,
+                 listener_factory: Optional[Callable[[int], OfficeListener]] = None):
+        self.size = size or settings.OFFICE_POOL_SIZE
+        self.listener_factory = listener_factory
+        self._idle: "queue.Queue[OfficeListener]" = queue.Queue()
+        self._listeners: List[OfficeListener] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._stats = {"conversions": 0, "failures": 0, "restarts": 0, "recycles": 0, "total_ms": 0.0}
+
+    def start(self) -> None:
+        """Create the listeners (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            factory = self.listener_factory
+            if factory is None:
+                soffice_path = find_soffice()
+                factory = lambda slot: OfficeListener(slot, soffice_path)
+            for slot in range(self.size):
+                listener = factory(slot)
+                try:
+                    listener.start()
+                except Exception as e:
+                    # Keep the slot; it is restarted on first use
+                    logger.error(f"Could not start LibreOffice listener {slot}: {str(e)}")
+                self._listeners.append(listener)
+                self._idle.put(listener)
+            self._started = True
+            logger.info(f"LibreOffice pool started with {self.size} listeners (mode={'unoserver' if unoserver_available() else 'cli'})")
+
+    @contextmanager
+    def acquire(self, timeout: Optional[int] = None) -> Iterator[OfficeListener]:
+        """Check out a healthy listener for one conversion"""
+        self.start()
+        try:
+            listener = self._idle.get(timeout=timeout or settings.OFFICE_POOL_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise Exception("No LibreOffice listener became available in time")
+        try:
+            if not listener.is_healthy():
+                logger.warning(f"LibreOffice listener {listener.slot} unhealthy, restarting")
+                self._stats["restarts"] += 1
+                listener.stop()
+                listener.start()
+            yield listener
+        finally:
+            self._idle.put(listener)
+
+    def convert(self, input_path: str, output_path: str, timeout: Optional[int] = None) -> None:
+        """Convert an office document to PDF through a pooled listener"""
+        timeout = timeout or settings.OFFICE_CONVERT_TIMEOUT
+        with self.acquire() as listener:
+            started = time.perf_counter()
+            try:
+                listener.convert(input_path, output_path, timeout)
+            except Exception:
+                self._stats["failures"] += 1
+                # A failed conversion may leave the instance wedged; start clean next time
+                listener.stop()
+                raise
+            self._stats["conversions"] += 1
+            self._stats["total_ms"] += (time.perf_counter() - started) * 1000
+            if listener.conversions >= settings.OFFICE_POOL_MAX_CONVERSIONS:
+                self._stats["recycles"] += 1
+                listener.recycle()
+
+    def get_stats(self) -> Dict[str, Any]:
+        conversions = self._stats["conversions"]
+        return {
+            "started": self._started,
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "mode": ("unoserver" if unoserver_available() else "cli") if self._started else None,
+            "conversions": conversions,
+            "failures": self._stats["failures"],
+            "restarts": self._stats["restarts"],
+            "recycles": self._stats["recycles"],
+            "avg_ms": round(self._stats["total_ms"] / conversions, 2) if conversions else 0.0
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for listener in self._listeners:
+                listener.destroy()
+            self._listeners = []
+            self._idle = queue.Queue()
+            self._started = False
+
+# Global LibreOffice pool (listeners start on first conversion or at startup with OFFICE_POOL_PREWARM)
+office_pool = OfficePool()
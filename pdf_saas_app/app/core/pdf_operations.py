@@ -1,57 +1,68 @@
 import os
 import fitz  # PyMuPDF
 from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from pdf2image import convert_from_path
 import io
-import tempfile
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict, Any, Iterator
 from docx import Document as DocxDocument
 from docx.shared import Pt
 from PIL import Image
-import pytesseract
 import subprocess
-import time
 import logging
-import shutil
+
+from app.config import settings
+from app.core.ocr_engine import OCREngine
+from app.core.office_pool import office_pool
+from app.core import compression, merge_engine, rasterizer, watermark
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever extraction output changes so persisted page text is re-derived;
+# the OCR render DPI changes OCR output, so it is part of the version
+TEXT_EXTRACTOR_VERSION = f"2-{settings.OCR_RENDER_DPI}dpi"
+
+# Bump whenever a derived operation (compress, watermark, conversions, page edits)
+# changes its output so cached operation results are not reused
+PROCESSOR_VERSION = f"4-pymupdf{fitz.VersionBind}"
+
 class PDFProcessor:
-    def extract_text(self, file_path: str) -> str:
+    def extract_pages(self, file_path: str) -> List[Dict[str, Any]]:
         """
-        Extract text from a PDF file, using OCR for image-only pages.
+        Extract text page by page, OCR'ing image-only pages in parallel.
+        Returns a list of {"page": int, "text": str, "ocr": bool, "ms": float} dicts (1-based pages).
         """
         try:
-            text = ""
-            with fitz.open(file_path) as doc:
-                for page in doc:
-                    page_text = page.get_text()
-                    if not page_text.strip():
-                        # If no text, do OCR
-                        pix = page.get_pixmap()
-                        img = Image.open(io.BytesIO(pix.tobytes()))
-                        page_text = pytesseract.image_to_string(img)
-                    text += page_text
-            return text
+            return OCREngine().extract_pages(file_path)
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-    def merge_pdfs(self, pdf_paths: List[str], output_path: str) -> str:
+    def iter_pages(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Generator version of extract_pages: yields each page's dict in order as soon
+        as it is ready, without building the whole document's text.
+        """
+        try:
+            yield from OCREngine().iter_pages(file_path)
+        except Exception as e:
+            raise Exception(f"Error extracting text from PDF: {str(e)}")
+
+    def extract_text(self, file_path: str) -> str:
+        """
+        Extract text from a PDF file, using OCR for image-only pages.
+        """
+        return "".join(page["text"] for page in self.iter_pages(file_path))
+
+    def merge_pdfs(self, pdf_paths: List[str], output_path: str,
+                   page_ranges: Optional[List[Optional[str]]] = None) -> str:
         """
         Merge multiple PDFs into a single PDF
+        page_ranges optionally selects pages per input (e.g. "1-3,7"), aligned with pdf_paths.
         """
+        if page_ranges is not None and len(page_ranges) != len(pdf_paths):
+            raise ValueError("page_ranges must have one entry per input")
         try:
-            writer = PdfWriter()
-            for pdf_path in pdf_paths:
-                reader = PdfReader(pdf_path)
-                for page in reader.pages:
-                    writer.add_page(page)
-            
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
-            return output_path
+            return merge_engine.merge_pdfs(list(zip(pdf_paths, page_ranges or [None] * len(pdf_paths))), output_path)
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error merging PDFs: {str(e)}")
 
@@ -76,154 +87,90 @@ class PDFProcessor:
         except Exception as e:
             raise Exception(f"Error splitting PDF: {str(e)}")
 
-    def compress_pdf(self, file_path: str, output_path: str, quality: int = 90) -> str:
+    def compress_pdf(self, file_path: str, output_path: str, profile: str = compression.DEFAULT_PROFILE,
+                     quality: Optional[int] = None) -> str:
         """
-        Compress a PDF file (lower quality = higher compression)
+        Compress a PDF by downsampling and re-encoding oversized images (see app.core.compression)
+        Args:
+            profile: "screen", "ebook" or "print"
+            quality: Optional JPEG quality (1-95) overriding the profile's
         """
         try:
-            logger.info(f"PDFProcessor.compress_pdf called with file_path: {file_path}")
-            logger.info(f"file_path type: {type(file_path)}")
-            logger.info(f"file_path exists: {os.path.exists(file_path)}")
-            
-            # Alternative compression method using PyMuPDF (fitz)
-            try:
-                logger.info("Attempting compression using PyMuPDF")
-                with fitz.open(file_path) as doc:
-                    # Create a new document
-                    new_doc = fitz.open()
-                    
-                    for page_num in range(len(doc)):
-                        page = doc.load_page(page_num)
-                        
-                        # Get the page as an image with reduced quality
-                        mat = fitz.Matrix(1.0, 1.0)  # Scale factor
-                        pix = page.get_pixmap(matrix=mat, alpha=False)
-                        
-                        # Convert to PIL Image for compression
-                        img_data = pix.tobytes("png")
-                        img = Image.open(io.BytesIO(img_data))
-                        
-                        # Compress the image
-                        img_byte_array = io.BytesIO()
-                        img.save(img_byte_array, format='JPEG', quality=quality, optimize=True)
-                        img_byte_array.seek(0)
-                        
-                        # Create a new page with the compressed image
-                        new_page = new_doc.new_page(width=page.rect.width, height=page.rect.height)
-                        new_page.insert_image(page.rect, stream=img_byte_array.getvalue())
-                    
-                    # Save the compressed PDF
-                    new_doc.save(output_path, garbage=4, deflate=True)
-                    new_doc.close()
-                
-                logger.info(f"Successfully compressed PDF using PyMuPDF")
-                return output_path
-                
-            except Exception as e:
-                logger.error(f"PyMuPDF compression failed: {str(e)}")
-                logger.info("Falling back to pdf2image method")
-                
-                # Fallback to original method
-                # Convert PDF to images
-                logger.info(f"Calling convert_from_path with: {file_path}")
-                try:
-                    images = convert_from_path(file_path, dpi=72)
-                except Exception as e2:
-                    logger.error(f"Error in convert_from_path: {str(e2)}")
-                    logger.error(f"Error type: {type(e2)}")
-                    # Try with explicit poppler path
-                    try:
-                        images = convert_from_path(file_path, dpi=72, poppler_path=None)
-                    except Exception as e3:
-                        logger.error(f"Error with explicit poppler path: {str(e3)}")
-                        raise e2
-                
-                # Create a new PDF from compressed images
-                output_pdf = PdfWriter()
-                
-                for img in images:
-                    img_byte_array = io.BytesIO()
-                    img.save(img_byte_array, format='JPEG', quality=quality)
-                    img_byte_array.seek(0)
-                    
-                    # Create temporary PDF from image
-                    temp_pdf_path = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False).name
-                    c = canvas.Canvas(temp_pdf_path, pagesize=letter)
-                    c.drawImage(img_byte_array, 0, 0, width=letter[0], height=letter[1])
-                    c.save()
-                    
-                    # Add page to output PDF
-                    reader = PdfReader(temp_pdf_path)
-                    output_pdf.add_page(reader.pages[0])
-                    os.unlink(temp_pdf_path)
-                
-                # Save the compressed PDF
-                with open(output_path, "wb") as output_file:
-                    output_pdf.write(output_file)
-                
-                return output_path
-                
+            stats = compression.compress_pdf(file_path, output_path, profile, quality)
+            logger.info(
+                f"Compressed {os.path.basename(file_path)} with '{profile}': "
+                f"{stats['recompressed']}/{stats['images']} images recompressed, "
+                f"{os.path.getsize(file_path)} -> {os.path.getsize(output_path)} bytes"
+            )
+            return output_path
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error compressing PDF: {str(e)}")
 
-    def add_watermark(self, file_path: str, watermark_text: str, output_path: str) -> str:
-        """
-        Add a text watermark to each page of a PDF
+    def add_watermark(self, file_path: str, watermark_text: Optional[str], output_path: str,
+                      image_data: Optional[bytes] = None, opacity: float = 0.3, rotation: float = 45,
+                      page_range: Optional[str] = None, color: Optional[str] = None,
+                      stamp: Optional[bytes] = None) -> str:
+        """
+        Stamp a text or image watermark on the pages of a PDF
+        Args:
+            watermark_text: Text to stamp, or None when image_data is given
+            image_data: Encoded image (PNG, JPEG, ...) to stamp instead of text
+            opacity: 0 (invisible) to 1 (opaque)
+            rotation: Degrees counter-clockwise
+            page_range: 1-based selection such as "1-3,7" (all pages when None)
+            color: Text color as "#rrggbb"
+            stamp: Stamp prebuilt with watermark.build_stamp, shared across a batch
         """
         try:
-            # Create watermark PDF
-            watermark_pdf = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False).name
-            c = canvas.Canvas(watermark_pdf, pagesize=letter)
-            c.setFont("Helvetica", 60)
-            c.setFillColorRGB(0.5, 0.5, 0.5, 0.3)  # Gray, semi-transparent
-            c.saveState()
-            c.translate(letter[0]/2, letter[1]/2)
-            c.rotate(45)
-            c.drawCentredString(0, 0, watermark_text)
-            c.restoreState()
-            c.save()
-            
-            # Open the input PDF
-            reader = PdfReader(file_path)
-            watermark_reader = PdfReader(watermark_pdf)
-            watermark_page = watermark_reader.pages[0]
-            
-            # Create output PDF
-            writer = PdfWriter()
-            
-            # Add watermark to each page
-            for page in reader.pages:
-                page.merge_page(watermark_page)
-                writer.add_page(page)
-            
-            # Save the watermarked PDF
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
-            
-            # Clean up
-            os.unlink(watermark_pdf)
-            
+            stamped = watermark.add_watermark(
+                file_path, output_path, text=watermark_text, image_data=image_data,
+                opacity=opacity, rotation=rotation, page_range=page_range, color=color, stamp=stamp
+            )
+            logger.info(f"Watermarked {stamped} pages of {os.path.basename(file_path)}")
             return output_path
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error adding watermark to PDF: {str(e)}")
 
     def convert_to_images(self, file_path: str, output_dir: str, dpi: int = 200) -> List[str]:
         """
-        Convert a PDF to a series of images
+        Convert a PDF to a series of PNG images, returned in page order
         """
         try:
-            images = convert_from_path(file_path, dpi=dpi)
-            image_paths = []
-            
-            for i, img in enumerate(images):
-                img_path = os.path.join(output_dir, f"page_{i+1}.png")
-                img.save(img_path, "PNG")
-                image_paths.append(img_path)
-            
-            return image_paths
+            pages = sorted(rasterizer.rasterize_pages(file_path, output_dir, dpi=dpi, fmt="png"))
+            return [path for _, path in pages]
         except Exception as e:
             raise Exception(f"Error converting PDF to images: {str(e)}")
 
+    def render_preview(self, file_path: str, max_size: int = 400) -> bytes:
+        """
+        Render the first page of a PDF as a JPEG thumbnail (returns the JPEG bytes)
+        """
+        return self.render_thumbnail(file_path, 0, max_size)
+
+    def render_thumbnail(self, file_path: str, page_number: int, max_size: int, quality: int = 80) -> bytes:
+        """
+        Render one page as a JPEG whose longer side is max_size pixels
+        The page is rasterized directly at the target scale, without oversampling and resizing.
+        Args:
+            page_number: 0-based page index
+        """
+        try:
+            with fitz.open(file_path) as pdf_document:
+                if not 0 <= page_number < pdf_document.page_count:
+                    raise ValueError(f"Page {page_number} is outside 0-{pdf_document.page_count - 1}")
+                page = pdf_document[page_number]
+                zoom = max_size / max(page.rect.width, page.rect.height)
+                pix = rasterizer.render_page(page, dpi=72 * zoom)
+                return pix.tobytes("jpeg", jpg_quality=quality)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error rendering thumbnail: {str(e)}")
+
     def count_pages(self, file_path: str) -> int:
         """
         Count the number of pages in a PDF
@@ -273,196 +220,49 @@ class PDFProcessor:
         except FileNotFoundError:
             raise Exception("Calibre's ebook-convert not found. Please install Calibre.")
 
-    def pdf_to_jpg(self, file_path: str, output_dir: str, dpi: int = 200) -> list:
+    def iter_image_pages(self, file_path: str, output_dir: str, dpi: int = 200, fmt: str = "jpeg",
+                         page_range: Optional[str] = None) -> Iterator[Tuple[int, str]]:
         """
-        Convert a PDF to a series of JPG images (one per page).
+        Render a PDF to image files, yielding (1-based page number, path) as pages are done
+        Pages are rendered in parallel and written straight to output_dir; see rasterizer.rasterize_pages.
+        Args:
+            fmt: jpeg, png or webp
+            page_range: 1-based selection such as "1-3,7" (all pages when None)
         """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Input PDF file not found: {file_path}")
         try:
-            # Check if Poppler is installed
-            if os.name == 'nt':  # Windows
-                poppler_paths = [
-                    r"C:\Program Files\poppler\bin",
-                    r"C:\Program Files (x86)\poppler\bin",
-                    os.path.expanduser("~\\AppData\\Local\\Programs\\poppler\\bin"),
-                    r"C:\Program Files\poppler\Release-24.08.0-0\poppler-24.08.0\Library\bin",  # Added actual path
-                    r"C:\Program Files\poppler\Release-24.08.0-0\Library\bin",  # Alternative path
-                    r"C:\Program Files\poppler\Library\bin"  # Generic path
-                ]
-                poppler_path = None
-                for path in poppler_paths:
-                    if os.path.exists(path):
-                        poppler_path = path
-                        logger.info(f"Found Poppler at: {path}")
-                        break
-                if not poppler_path:
-                    # Try to find pdfinfo in PATH
-                    try:
-                        pdfinfo_path = subprocess.check_output(['where', 'pdfinfo'], text=True).strip()
-                        if pdfinfo_path:
-                            poppler_path = os.path.dirname(pdfinfo_path)
-                            logger.info(f"Found Poppler via PATH at: {poppler_path}")
-                    except Exception as e:
-                        logger.error(f"Error finding pdfinfo in PATH: {str(e)}")
-                        pass
-                        
-                if not poppler_path:
-                    raise FileNotFoundError("Poppler not found. Please install Poppler and add its bin directory to PATH.")
-            else:  # Linux/Mac
-                poppler_path = None  # Let pdf2image find it in PATH
-
-            # Ensure output directory exists
-            os.makedirs(output_dir, exist_ok=True)
-            logger.info(f"Output directory: {output_dir}")
-
-            # Verify input file exists and is readable
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"Input PDF file not found: {file_path}")
-            logger.info(f"Input file: {file_path}")
-
-            from pdf2image import convert_from_path
-            logger.info(f"Using Poppler path: {poppler_path}")
-            try:
-                images = convert_from_path(file_path, dpi=dpi, poppler_path=poppler_path)
-                logger.info(f"Successfully converted PDF to {len(images)} images")
-            except Exception as e:
-                logger.error(f"Error in convert_from_path: {str(e)}")
-                raise
-            
-            if not images:
-                raise Exception("No images were generated from the PDF")
-                
-            image_paths = []
-            for i, img in enumerate(images):
-                img_path = os.path.join(output_dir, f"page_{i+1}.jpg")
-                try:
-                    img.save(img_path, "JPEG", quality=95)  # Higher quality JPEG
-                    logger.info(f"Saved image {i+1} to {img_path}")
-                    image_paths.append(img_path)
-                except Exception as e:
-                    logger.error(f"Error saving image {i+1}: {str(e)}")
-                    raise
-                
-            if not image_paths:
-                raise Exception("Failed to save any images")
-                
-            return image_paths
+            yield from rasterizer.rasterize_pages(file_path, output_dir, dpi=dpi, quality=95, fmt=fmt, page_range=page_range)
         except FileNotFoundError as e:
             if "Poppler" in str(e):
                 logger.error("Poppler not found error")
-                raise Exception("PDF to JPG conversion requires Poppler to be installed. Please install Poppler and add its bin directory to PATH.")
-            logger.error(f"File not found error: {str(e)}")
+                raise Exception("The poppler rasterize backend requires Poppler to be installed. Please install Poppler and add its bin directory to PATH, or use RASTERIZE_BACKEND=pymupdf.")
+            raise
+        except ValueError:
             raise
         except Exception as e:
             logger.error(f"Unexpected error in pdf_to_jpg: {str(e)}")
             raise Exception(f"Error converting PDF to JPG: {str(e)}")
 
+    def pdf_to_jpg(self, file_path: str, output_dir: str, dpi: int = 200) -> list:
+        """
+        Convert a PDF to a series of JPG images (one per page), returned in page order.
+        """
+        pages = sorted(self.iter_image_pages(file_path, output_dir, dpi))
+        if not pages:
+            raise Exception("No images were generated from the PDF")
+        return [path for _, path in pages]
+
     def convert_office_to_pdf(self, input_path: str, output_path: str) -> None:
         """
-        Convert Office documents (Word, Excel, PowerPoint) to PDF using LibreOffice
+        Convert Office documents (Word, Excel, PowerPoint) to PDF using the warm LibreOffice pool
         """
         try:
-            # Check if LibreOffice is installed
-            if os.name == 'nt':  # Windows
-                libreoffice_paths = [
-                    r"C:\Program Files\LibreOffice\program\soffice.exe",
-                    r"C:\Program Files (x86)\LibreOffice\program\soffice.exe",
-                    os.path.expanduser("~\\AppData\\Local\\Programs\\LibreOffice\\program\\soffice.exe")
-                ]
-                soffice_path = None
-                for path in libreoffice_paths:
-                    if os.path.exists(path):
-                        soffice_path = path
-                        break
-                if not soffice_path:
-                    raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-            else:  # Linux/Mac
-                # Check multiple possible paths for LibreOffice on Linux
-                linux_paths = [
-                    "/usr/bin/libreoffice",
-                    "/usr/bin/soffice",
-                    "/usr/lib/libreoffice/program/soffice",
-                    "/opt/libreoffice/program/soffice",
-                    "/snap/bin/libreoffice",
-                    "/usr/local/bin/libreoffice",
-                    "/usr/local/bin/soffice"
-                ]
-                soffice_path = None
-                for path in linux_paths:
-                    if os.path.exists(path):
-                        soffice_path = path
-                        break
-                if not soffice_path:
-                    # Try to find it in PATH
-                    try:
-                        soffice_path = subprocess.check_output(['which', 'libreoffice']).decode().strip()
-                    except:
-                        try:
-                            soffice_path = subprocess.check_output(['which', 'soffice']).decode().strip()
-                        except:
-                            raise FileNotFoundError("LibreOffice not found. Please install LibreOffice to use this feature.")
-
-            logger.info(f"Using LibreOffice at: {soffice_path}")
-
-            # Convert paths to absolute paths
             input_path = os.path.abspath(input_path)
             output_path = os.path.abspath(output_path)
-            output_dir = os.path.dirname(output_path)
-            input_filename = os.path.basename(input_path)
-            base_filename = os.path.splitext(input_filename)[0]
-
-            logger.info(f"Input file: {input_path}")
-            logger.info(f"Output path: {output_path}")
-
-            # Ensure output directory exists
-            os.makedirs(output_dir, exist_ok=True)
-
-            # Create a temporary directory for conversion
-            with tempfile.TemporaryDirectory() as temp_dir:
-                logger.info(f"Created temporary directory: {temp_dir}")
-
-                # Copy input file to temporary directory
-                temp_input = os.path.join(temp_dir, input_filename)
-                shutil.copy2(input_path, temp_input)
-                logger.info(f"Copied input file to: {temp_input}")
-
-                # Run LibreOffice conversion in the temporary directory
-                cmd = [
-                    soffice_path,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    temp_input
-                ]
-                logger.info(f"Running command: {' '.join(cmd)}")
-
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    cwd=temp_dir  # Set working directory to temp_dir
-                )
-
-                if result.returncode != 0:
-                    logger.error(f"Conversion failed with return code {result.returncode}")
-                    logger.error(f"stdout: {result.stdout}")
-                    logger.error(f"stderr: {result.stderr}")
-                    raise Exception(f"Conversion failed: {result.stderr}")
-
-                # Wait for file to be fully written
-                time.sleep(2)
-
-                # Get the converted file path
-                converted_file = os.path.join(temp_dir, f"{base_filename}.pdf")
-                logger.info(f"Looking for converted file at: {converted_file}")
-
-                # List all files in temp directory for debugging
-                logger.info(f"Files in temp directory: {os.listdir(temp_dir)}")
-
-                if not os.path.exists(converted_file):
-                    raise Exception(f"Converted file not found at: {converted_file}")
-
-                # Copy the converted file to the desired output location
-                shutil.copy2(converted_file, output_path)
-                logger.info(f"Copied converted file to: {output_path}")
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            office_pool.convert(input_path, output_path)
 
             # Verify the output file exists and has content
             if not os.path.exists(output_path):
@@ -471,7 +271,7 @@ class PDFProcessor:
             if os.path.getsize(output_path) == 0:
                 raise Exception("Output file is empty")
 
-            logger.info("Conversion completed successfully")
+            logger.info(f"Converted {os.path.basename(input_path)} to PDF")
 
         except Exception as e:
             logger.error(f"Error converting Office document to PDF: {str(e)}")
@@ -615,37 +415,27 @@ class PDFProcessor:
         Convert a PDF to a DOCX file.
 
         Strategy:
-        - Use PyMuPDF to extract text per page. If a page has no extractable text,
-          fallback to OCR (pytesseract) using the existing extract_text method.
+        - Use PyMuPDF to extract text per page. Image-only pages are OCR'd
+          in parallel by the OCR engine (same path as extract_pages).
         - Write plain text to DOCX, insert page breaks between pages.
 
         This preserves content but not layout. Suitable as a fast baseline.
         """
         try:
             docx = DocxDocument()
-            with fitz.open(file_path) as pdf_doc:
-                for page_index in range(len(pdf_doc)):
-                    page = pdf_doc.load_page(page_index)
-                    page_text = page.get_text()
-                    if not page_text or not page_text.strip():
-                        # Fallback to OCR for image-only pages
-                        # Reuse existing OCR logic via extract_text on a single-page temporary PDF
-                        # Simpler: render page to image and OCR that image
-                        pix = page.get_pixmap()
-                        img = Image.open(io.BytesIO(pix.tobytes()))
-                        page_text = pytesseract.image_to_string(img)
-
-                    if page_index == 0:
-                        # Ensure default style is readable
-                        style = docx.styles['Normal']
-                        style.font.name = 'Calibri'
-                        style.font.size = Pt(11)
-
-                    for line in page_text.splitlines():
-                        docx.add_paragraph(line)
-
-                    if page_index != len(pdf_doc) - 1:
-                        docx.add_page_break()
+            pages = OCREngine().extract_pages(file_path)
+            for page_index, page in enumerate(pages):
+                if page_index == 0:
+                    # Ensure default style is readable
+                    style = docx.styles['Normal']
+                    style.font.name = 'Calibri'
+                    style.font.size = Pt(11)
+
+                for line in page["text"].splitlines():
+                    docx.add_paragraph(line)
+
+                if page_index != len(pages) - 1:
+                    docx.add_page_break()
 
             # Ensure parent directory exists
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
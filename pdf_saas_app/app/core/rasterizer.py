@@ -0,0 +1,259 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.config import settings
+from app.core.merge_engine import parse_page_range
+
+logger = logging.getLogger(__name__)
+
+# Output formats and their file extensions; pdftoppm has no WebP output, so with the
+# Poppler backend WebP pages are rendered as PNG and re-encoded one at a time
+RASTER_FORMATS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+
+# pymupdf renders in-process with MuPDF (the default); poppler runs pdftoppm
+# subprocesses and is kept as an opt-in fallback
+RASTER_BACKENDS = ("pymupdf", "poppler")
+
+COLORSPACES = {"rgb": fitz.csRGB, "gray": fitz.csGRAY}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_rasterize_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the shared rendering process pool, creating it on first use (None if processes are unavailable)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = settings.RASTERIZE_MAX_WORKERS or os.cpu_count() or 1
+            try:
+                # MuPDF rendering holds the GIL, so pages are rendered in parallel by processes;
+                # spawn, as for the other pools: no forked copies of PyMuPDF state or server threads
+                _pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started rasterize process pool with {max_workers} workers")
+            except Exception as e:
+                logger.warning(f"Could not start rasterize process pool, rendering in-process: {str(e)}")
+                return None
+        return _pool
+
+def reset_rasterize_pool() -> None:
+    """Discard the shared pool (e.g. after a worker crash) so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def render_page(page: fitz.Page, dpi: float = 72, colorspace: str = "rgb", alpha: bool = False,
+                clip: Optional[fitz.Rect] = None) -> fitz.Pixmap:
+    """
+    Rasterize a page in-process
+    Args:
+        colorspace: Key of COLORSPACES
+        alpha: Keep transparency instead of rendering on white
+        clip: Area to render, in page coordinates (the whole page when None)
+    """
+    if colorspace not in COLORSPACES:
+        raise ValueError(f"Unknown colorspace '{colorspace}', expected one of {', '.join(COLORSPACES)}")
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=COLORSPACES[colorspace], alpha=alpha, clip=clip)
+    pix.set_dpi(round(dpi), round(dpi))
+    return pix
+
+def save_pixmap(pix: fitz.Pixmap, path: str, fmt: str, quality: int = 95) -> None:
+    """Write a pixmap as a RASTER_FORMATS image (WebP goes through Pillow, MuPDF cannot write it)"""
+    if fmt == "jpeg":
+        if pix.alpha:
+            raise ValueError("JPEG cannot keep transparency; use png or webp")
+        pix.save(path, output="jpeg", jpg_quality=quality)
+    elif fmt == "png":
+        pix.save(path, output="png")
+    else:
+        mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[pix.n]
+        Image.frombytes(mode, (pix.width, pix.height), pix.samples).save(path, "WEBP", quality=quality)
+
+def find_poppler_path() -> Optional[str]:
+    """
+    Poppler bin directory on Windows (None elsewhere: pdf2image finds it in PATH)
+    Raises:
+        FileNotFoundError: Poppler is not installed
+    """
+    if os.name != 'nt':
+        return None
+    poppler_paths = [
+        r"C:\Program Files\poppler\bin",
+        r"C:\Program Files (x86)\poppler\bin",
+        os.path.expanduser("~\\AppData\\Local\\Programs\\poppler\\bin"),
+        r"C:\Program Files\poppler\Release-24.08.0-0\poppler-24.08.0\Library\bin",
+        r"C:\Program Files\poppler\Release-24.08.0-0\Library\bin",
+        r"C:\Program Files\poppler\Library\bin"
+    ]
+    for path in poppler_paths:
+        if os.path.exists(path):
+            logger.info(f"Found Poppler at: {path}")
+            return path
+    # Try to find pdfinfo in PATH
+    try:
+        pdfinfo_path = subprocess.check_output(['where', 'pdfinfo'], text=True).strip()
+        if pdfinfo_path:
+            logger.info(f"Found Poppler via PATH at: {os.path.dirname(pdfinfo_path)}")
+            return os.path.dirname(pdfinfo_path)
+    except Exception as e:
+        logger.error(f"Error finding pdfinfo in PATH: {str(e)}")
+    raise FileNotFoundError("Poppler not found. Please install Poppler and add its bin directory to PATH.")
+
+def _render_chunk_pymupdf(file_path: str, output_dir: str, first_page: int, last_page: int, dpi: int,
+                          quality: int, fmt: str = "jpeg", colorspace: str = "rgb",
+                          alpha: bool = False) -> List[Tuple[int, str]]:
+    """Render pages first_page..last_page (1-based) to image files with one document open"""
+    pages = []
+    with fitz.open(file_path) as doc:
+        for page_number in range(first_page, last_page + 1):
+            target = os.path.join(output_dir, f"page_{page_number}{RASTER_FORMATS[fmt]}")
+            save_pixmap(render_page(doc[page_number - 1], dpi, colorspace, alpha), target, fmt, quality)
+            pages.append((page_number, target))
+    return pages
+
+def _render_chunk_poppler(file_path: str, output_dir: str, first_page: int, last_page: int, dpi: int,
+                          quality: int, fmt: str, poppler_path: Optional[str]) -> List[Tuple[int, str]]:
+    """Render pages first_page..last_page (1-based) straight to image files with one pdftoppm process"""
+    from pdf2image import convert_from_path
+    chunk_dir = tempfile.mkdtemp(dir=output_dir)
+    try:
+        # paths_only: pdftoppm writes the files and no page bitmap is loaded into this process
+        paths = convert_from_path(
+            file_path, dpi=dpi, output_folder=chunk_dir, first_page=first_page, last_page=last_page,
+            fmt="jpeg" if fmt == "jpeg" else "png", jpegopt={"quality": quality, "optimize": True},
+            output_file="page", paths_only=True, poppler_path=poppler_path
+        )
+        # pdftoppm zero-pads page numbers, so name order is page order
+        pages = []
+        for page_number, path in zip(range(first_page, last_page + 1), sorted(paths)):
+            target = os.path.join(output_dir, f"page_{page_number}{RASTER_FORMATS[fmt]}")
+            if fmt == "webp":
+                with Image.open(path) as image:
+                    image.save(target, "WEBP", quality=quality)
+                os.remove(path)
+            else:
+                os.replace(path, target)
+            pages.append((page_number, target))
+        return pages
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+
+def select_pages(page_range: Optional[str], page_count: int) -> List[int]:
+    """Sorted, distinct 1-based page numbers of a parse_page_range selection (all pages when None)"""
+    pages = set()
+    for start, end in parse_page_range(page_range, page_count):
+        pages.update(range(min(start, end) + 1, max(start, end) + 2))
+    return sorted(pages)
+
+def _chunks(pages: List[int], chunk_pages: int) -> List[Tuple[int, int]]:
+    """Split sorted page numbers into contiguous (first, last) runs of at most chunk_pages"""
+    chunks = []
+    for page in pages:
+        if chunks and page == chunks[-1][1] + 1 and page - chunks[-1][0] < chunk_pages:
+            chunks[-1] = (chunks[-1][0], page)
+        else:
+            chunks.append((page, page))
+    return chunks
+
+def _run_chunks(executor: Executor, in_flight: int, chunks: List[Tuple[int, int]],
+                render: Callable[..., List[Tuple[int, str]]], file_path: str, output_dir: str,
+                *options: Any) -> Iterator[Tuple[int, str]]:
+    """
+    Render chunks on an executor, keeping at most in_flight of them submitted
+    Chunks are popped from the list as they are submitted; if the pool breaks, the
+    ones whose pages were not yielded are put back before the error is raised.
+    """
+    pending = {}
+    try:
+        while chunks or pending:
+            while chunks and len(pending) < in_flight:
+                first, last = chunks.pop(0)
+                pending[executor.submit(render, file_path, output_dir, first, last, *options)] = (first, last)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pages = future.result()
+                del pending[future]
+                yield from pages
+    except BrokenProcessPool:
+        chunks[:0] = sorted(pending.values())
+        raise
+    finally:
+        # The consumer stopped early (or a chunk failed): drop chunks that have not started
+        for future in pending:
+            future.cancel()
+
+def rasterize_pages(file_path: str, output_dir: str, dpi: int = 200, quality: int = 95,
+                    max_workers: Optional[int] = None, fmt: str = "jpeg",
+                    page_range: Optional[str] = None, backend: Optional[str] = None,
+                    colorspace: str = "rgb", alpha: bool = False) -> Iterator[Tuple[int, str]]:
+    """
+    Render pages of a PDF to output_dir/page_<n>.<ext>, yielding (page number, path) as pages are done
+    Pages are rendered in chunks of RASTERIZE_CHUNK_PAGES: by the shared process pool with
+    the pymupdf backend (in-process for a single chunk), by parallel pdftoppm processes
+    with the poppler backend. At most two chunks per worker are in flight, so a slow
+    consumer (e.g. uploading and deleting each page) bounds disk use as well as memory.
+    Order is by completion; page numbers are 1-based.
+    Args:
+        fmt: Key of RASTER_FORMATS
+        page_range: parse_page_range selection (all pages when None)
+        backend: Key of RASTER_BACKENDS (RASTERIZE_BACKEND when None)
+        colorspace, alpha: See render_page (pymupdf backend only)
+    Raises:
+        ValueError: Unknown format, backend or colorspace, or invalid page range
+    """
+    backend = backend or settings.RASTERIZE_BACKEND
+    if fmt not in RASTER_FORMATS:
+        raise ValueError(f"Unknown image format '{fmt}', expected one of {', '.join(RASTER_FORMATS)}")
+    if backend not in RASTER_BACKENDS:
+        raise ValueError(f"Unknown rasterize backend '{backend}', expected one of {', '.join(RASTER_BACKENDS)}")
+    if backend == "poppler" and (colorspace != "rgb" or alpha):
+        raise ValueError("colorspace and alpha require the pymupdf backend")
+    if colorspace not in COLORSPACES:
+        raise ValueError(f"Unknown colorspace '{colorspace}', expected one of {', '.join(COLORSPACES)}")
+    if fmt == "jpeg" and alpha:
+        raise ValueError("JPEG cannot keep transparency; use png or webp")
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+    if page_count == 0:
+        return
+    os.makedirs(output_dir, exist_ok=True)
+
+    chunks = _chunks(select_pages(page_range, page_count), max(1, settings.RASTERIZE_CHUNK_PAGES))
+    max_workers = max_workers or settings.RASTERIZE_MAX_WORKERS or os.cpu_count() or 1
+    if backend == "poppler":
+        poppler_path = find_poppler_path()
+        threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rasterize")
+        try:
+            yield from _run_chunks(threads, max_workers * 2, chunks, _render_chunk_poppler,
+                                   file_path, output_dir, dpi, quality, fmt, poppler_path)
+        finally:
+            threads.shutdown(wait=True, cancel_futures=True)
+        return
+
+    options = (dpi, quality, fmt, colorspace, alpha)
+    pool = get_rasterize_pool() if max_workers > 1 and len(chunks) > 1 else None
+    if pool is not None:
+        try:
+            yield from _run_chunks(pool, max_workers * 2, chunks, _render_chunk_pymupdf, file_path, output_dir, *options)
+            return
+        except BrokenProcessPool:
+            logger.error("Rasterize process pool broke, rendering the remaining pages in-process")
+            reset_rasterize_pool()
+    for first, last in chunks:
+        yield from _render_chunk_pymupdf(file_path, output_dir, first, last, *options)
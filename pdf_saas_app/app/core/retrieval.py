@@ -0,0 +1,57 @@
+import io
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+def chunk_pages(pages: List[Dict[str, Any]], chunk_chars: int, overlap: int) -> List[Dict[str, Any]]:
+    """
+    Split page texts into overlapping chunks that keep their page number
+    Args:
+        pages: {"page", "text"} dicts with 1-based page numbers
+    Returns:
+        [{"page", "text"}] in document order; blank pages produce no chunks
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_chars, chunk_overlap=overlap)
+    chunks = []
+    for page in pages:
+        text = (page.get("text") or "").strip()
+        if text:
+            chunks.extend({"page": page["page"], "text": chunk} for chunk in splitter.split_text(text))
+    return chunks
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length, so a dot product is the cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Indices and scores of the k rows most similar to query, best first (rows and query normalized)"""
+    if len(vectors) == 0 or k <= 0:
+        return []
+    scores = vectors @ query
+    k = min(k, len(scores))
+    # argpartition finds the k best in linear time; only those are sorted
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [(int(i), float(scores[i])) for i in best]
+
+def dump_index(model: str, chunks: List[Dict[str, Any]], vectors: np.ndarray) -> bytes:
+    """Serialize an index as .npz bytes (chunks as JSON, so loading needs no pickle)"""
+    buffer = io.BytesIO()
+    np.savez(buffer, vectors=vectors.astype(np.float32), chunks=np.array(json.dumps(chunks)), model=np.array(model))
+    return buffer.getvalue()
+
+def load_index(path: str) -> Dict[str, Any]:
+    """Read an index written by dump_index: {"model", "chunks", "vectors"}"""
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            "model": str(data["model"]),
+            "chunks": json.loads(str(data["chunks"])),
+            "vectors": data["vectors"]
+        }
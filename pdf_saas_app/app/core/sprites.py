@@ -0,0 +1,60 @@
+import logging
+from typing import Any, Dict, List
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+def _matrix(page: fitz.Page, max_size: int) -> fitz.Matrix:
+    """Scale that fits the page's longer side to max_size pixels (same as PDFProcessor.render_thumbnail)"""
+    zoom = max_size / max(page.rect.width, page.rect.height)
+    return fitz.Matrix(zoom, zoom)
+
+def sprite_layout(file_path: str, max_size: int, pages_per_sprite: int) -> Dict[str, Any]:
+    """
+    Layout of the thumbnail sprites of a PDF, computed from page sizes without rendering
+    Each sprite is a vertical strip of up to pages_per_sprite page thumbnails.
+    Returns:
+        {"page_count", "max_size", "pages_per_sprite",
+         "sprites": [{"index", "width", "height", "pages": [{"page", "x", "y", "width", "height"}]}]}
+    """
+    with fitz.open(file_path) as doc:
+        sprites = []
+        for first in range(0, doc.page_count, pages_per_sprite):
+            cells = []
+            y = 0
+            for page_index in range(first, min(first + pages_per_sprite, doc.page_count)):
+                page = doc[page_index]
+                box = (page.rect * _matrix(page, max_size)).irect
+                cells.append({"page": page_index, "x": 0, "y": y, "width": box.width, "height": box.height})
+                y += box.height
+            sprites.append({
+                "index": len(sprites),
+                "width": max(cell["width"] for cell in cells),
+                "height": y,
+                "pages": cells
+            })
+        return {
+            "page_count": doc.page_count,
+            "max_size": max_size,
+            "pages_per_sprite": pages_per_sprite,
+            "sprites": sprites
+        }
+
+def render_sprite(file_path: str, cells: List[Dict[str, Any]], max_size: int, quality: int = 80) -> bytes:
+    """
+    Render the pages of one sprite from sprite_layout into a single JPEG strip
+    Pages are rasterized at thumbnail scale and copied into one pixmap, so a strip
+    costs one document open and one encode however many pages it holds.
+    """
+    width = max(cell["width"] for cell in cells)
+    height = max(cell["y"] + cell["height"] for cell in cells)
+    sprite = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    sprite.clear_with(255)
+    with fitz.open(file_path) as doc:
+        for cell in cells:
+            page = doc[cell["page"]]
+            pix = page.get_pixmap(matrix=_matrix(page, max_size), alpha=False, colorspace=fitz.csRGB)
+            pix.set_origin(cell["x"], cell["y"])
+            sprite.copy(pix, pix.irect)
+    return sprite.tobytes("jpeg", jpg_quality=quality)
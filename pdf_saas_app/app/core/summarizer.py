@@ -0,0 +1,82 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """
+    Token count function for a model's tokenizer
+    tiktoken downloads an encoding on first use; if it cannot be loaded, tokens are
+    estimated at four characters each so summarization still works.
+    """
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logger.warning(f"tiktoken encoding for {model} unavailable, estimating token counts: {str(e)}")
+        return lambda text: (len(text) + 3) // 4
+
+def split_by_tokens(text: str, chunk_tokens: int, overlap_tokens: int,
+                    count_tokens: Callable[[str], int]) -> List[str]:
+    """Split text into chunks of at most chunk_tokens, breaking at paragraphs, lines and words first"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens, chunk_overlap=overlap_tokens, length_function=count_tokens
+    )
+    return splitter.split_text(text)
+
+def group_by_tokens(texts: List[str], budget: int, count_tokens: Callable[[str], int]) -> List[List[str]]:
+    """
+    Group consecutive texts into runs that fit in budget tokens together
+    Every group holds at least two texts (even past the budget), so each reduce pass shrinks the list.
+    """
+    groups: List[List[str]] = []
+    size = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if groups and (size + tokens <= budget or len(groups[-1]) < 2):
+            groups[-1].append(text)
+            size += tokens
+        else:
+            groups.append([text])
+            size = tokens
+    if len(groups) > 1 and len(groups[-1]) == 1:
+        groups[-2].extend(groups.pop())
+    return groups
+
+def map_reduce_summarize(text: str, summarize: Callable[[str, int], str], max_length: int,
+                         count_tokens: Callable[[str], int], chunk_tokens: int, context_tokens: int,
+                         partial_length: int, max_workers: int) -> str:
+    """
+    Summarize text of any length with a concurrent map and a hierarchical reduce
+    Map: the text is split into chunks of chunk_tokens and each one is summarized in at
+    most partial_length characters, max_workers calls at a time. Reduce: while the
+    partial summaries together exceed context_tokens, they are grouped into runs that
+    fit and each run is summarized again, concurrently. A last call writes the final
+    summary of at most max_length characters.
+    Args:
+        summarize: summarize(text, max_length) -> summary, one model call
+    """
+    chunks = split_by_tokens(text, chunk_tokens, chunk_tokens // 10, count_tokens)
+    if not chunks:
+        return ""
+    if len(chunks) == 1:
+        return summarize(chunks[0], max_length)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="summarize") as pool:
+        summaries = list(pool.map(lambda chunk: summarize(chunk, partial_length), chunks))
+        level = 1
+        while len(summaries) > 1 and sum(count_tokens(summary) for summary in summaries) > context_tokens:
+            groups = group_by_tokens(summaries, context_tokens, count_tokens)
+            logger.info(f"Reducing {len(summaries)} summaries in {len(groups)} groups (level {level})")
+            summaries = list(pool.map(lambda group: summarize("\n\n".join(group), partial_length), groups))
+            level += 1
+    return summarize("\n\n".join(summaries), max_length)
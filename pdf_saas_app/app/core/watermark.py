@@ -0,0 +1,132 @@
+import io
+import logging
+from typing import Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from app.core.merge_engine import parse_page_range
+
+logger = logging.getLogger(__name__)
+
+STAMP_FONT = "helv"
+STAMP_FONT_SIZE = 60
+DEFAULT_COLOR = (0.5, 0.5, 0.5)
+
+def parse_color(color: Optional[str]) -> Tuple[float, float, float]:
+    """Parse a "#rrggbb" color into PDF RGB components (gray when None)"""
+    if not color:
+        return DEFAULT_COLOR
+    value = color.lstrip("#")
+    if len(value) != 6:
+        raise ValueError(f"Invalid color '{color}', expected #rrggbb")
+    try:
+        return tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    except ValueError:
+        raise ValueError(f"Invalid color '{color}', expected #rrggbb")
+
+def build_text_stamp(text: str, opacity: float = 0.3, color: Optional[str] = None) -> fitz.Document:
+    """One-page PDF holding the text, cropped to it; drawn once and reused as a Form XObject"""
+    if not text or not text.strip():
+        raise ValueError("Watermark text is empty")
+    width = fitz.get_text_length(text, fontname=STAMP_FONT, fontsize=STAMP_FONT_SIZE)
+    stamp = fitz.open()
+    page = stamp.new_page(width=width + STAMP_FONT_SIZE * 0.2, height=STAMP_FONT_SIZE * 1.2)
+    page.insert_text(
+        (STAMP_FONT_SIZE * 0.1, STAMP_FONT_SIZE * 0.95), text,
+        fontname=STAMP_FONT, fontsize=STAMP_FONT_SIZE,
+        color=parse_color(color), fill_opacity=opacity
+    )
+    return stamp
+
+def build_image_stamp(image_data: bytes, opacity: float = 0.3) -> fitz.Document:
+    """One-page PDF holding the image at the given opacity (applied to its alpha channel)"""
+    try:
+        image = Image.open(io.BytesIO(image_data)).convert("RGBA")
+    except Exception as e:
+        raise ValueError(f"Unsupported watermark image: {str(e)}")
+    if opacity < 1:
+        alpha = image.getchannel("A").point(lambda value: int(value * opacity))
+        image.putalpha(alpha)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    stamp = fitz.open()
+    page = stamp.new_page(width=image.width, height=image.height)
+    page.insert_image(page.rect, stream=buffer.getvalue())
+    return stamp
+
+def _target_rect(page_rect: fitz.Rect, scale: float) -> fitz.Rect:
+    """Centered box covering scale of the page in each direction"""
+    margin_x = page_rect.width * (1 - scale) / 2
+    margin_y = page_rect.height * (1 - scale) / 2
+    return fitz.Rect(page_rect.x0 + margin_x, page_rect.y0 + margin_y,
+                     page_rect.x1 - margin_x, page_rect.y1 - margin_y)
+
+def stamp_pdf(file_path: str, output_path: str, stamp: fitz.Document, rotation: float = 45,
+              scale: float = 0.8, page_range: Optional[str] = None, overlay: bool = True) -> int:
+    """
+    Draw stamp's first page on the selected pages of a PDF
+    The stamp becomes a single Form XObject referenced from every page's content
+    stream, fitted (rotated, keeping proportions) into a centered box of scale
+    times each page's own size.
+    Returns:
+        Number of pages stamped
+    """
+    if not 0 < scale <= 1:
+        raise ValueError("scale must be between 0 and 1")
+    stamped = 0
+    with fitz.open(file_path) as doc:
+        if doc.needs_pass:
+            raise ValueError("Cannot watermark an encrypted PDF")
+        pages = set()
+        for start, end in parse_page_range(page_range, doc.page_count):
+            pages.update(range(min(start, end), max(start, end) + 1))
+        for page_index in sorted(pages):
+            page = doc[page_index]
+            page.show_pdf_page(_target_rect(page.rect, scale), stamp, 0,
+                               rotate=rotation, keep_proportion=True, overlay=overlay)
+            stamped += 1
+        # garbage=1 only drops unreferenced objects; the duplicate search of higher levels
+        # costs far more than stamping on long documents and finds nothing to merge here
+        doc.save(output_path, garbage=1)
+    return stamped
+
+def build_stamp(text: Optional[str] = None, image_data: Optional[bytes] = None,
+                opacity: float = 0.3, color: Optional[str] = None) -> bytes:
+    """
+    Build a text or image stamp once and return it as PDF bytes
+    The bytes can be passed to add_watermark for any number of documents (and pickled
+    to worker processes), so a batch does not rebuild the stamp per document.
+    """
+    if (text is None) == (image_data is None):
+        raise ValueError("Provide either watermark text or a watermark image")
+    if not 0 <= opacity <= 1:
+        raise ValueError("opacity must be between 0 and 1")
+    stamp = build_text_stamp(text, opacity, color) if text is not None else build_image_stamp(image_data, opacity)
+    try:
+        return stamp.tobytes()
+    finally:
+        stamp.close()
+
+def add_watermark(file_path: str, output_path: str, text: Optional[str] = None,
+                  image_data: Optional[bytes] = None, opacity: float = 0.3, rotation: float = 45,
+                  scale: float = 0.8, page_range: Optional[str] = None, color: Optional[str] = None,
+                  stamp: Optional[bytes] = None) -> int:
+    """
+    Watermark a PDF with text or an image
+    Args:
+        opacity: 0 (invisible) to 1 (opaque)
+        rotation: Degrees counter-clockwise
+        scale: Fraction of each page the watermark may cover
+        page_range: 1-based selection such as "1-3,7" (all pages when None)
+        stamp: Prebuilt stamp from build_stamp; text, image_data, opacity and color are then ignored
+    Returns:
+        Number of pages stamped
+    """
+    if stamp is None:
+        stamp = build_stamp(text, image_data, opacity, color)
+    stamp_doc = fitz.open("pdf", stamp)
+    try:
+        return stamp_pdf(file_path, output_path, stamp_doc, rotation, scale, page_range)
+    finally:
+        stamp_doc.close()
@@ -1,5 +1,5 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, BigInteger, String, DateTime, Text, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, object_session
 from datetime import datetime
 import uuid
 from typing import Optional
@@ -27,6 +27,10 @@ class User(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Supports keyset pagination of a user's listing (newest first)
+        Index("idx_documents_owner_email_created_at", "owner_email", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, index=True, default=generate_uuid)
     filename = Column(String, nullable=False)
@@ -47,12 +51,17 @@ class Document(Base):
     chat_history = relationship("ChatHistory", back_populates="document")
     
     def get_text_content(self) -> Optional[str]:
-        """Extract text content on-demand"""
+        """Get text content from the derived-text store, extracting it on first use"""
         try:
+            db = object_session(self)
+            if db is not None:
+                from app.services.text_store_service import text_store_service
+                return text_store_service.get_document_text(db, self)
+
             storage_service = StorageService()
-            local_file_path = storage_service.get_file(self.file_path)
-            pdf_processor = PDFProcessor()
-            return pdf_processor.extract_text(local_file_path)
+            with storage_service.local_file(self.file_path, self.file_hash) as local_file_path:
+                pdf_processor = PDFProcessor()
+                return pdf_processor.extract_text(local_file_path)
         except FileNotFoundError as e:
             logger.error(f"File not found for text extraction: {str(e)}")
             return None
@@ -60,6 +69,75 @@ class Document(Base):
             logger.error(f"Error extracting text content: {str(e)}")
             return None
 
+class DocumentText(Base):
+    """Per-page extracted text, shared by every document with the same file_hash"""
+    __tablename__ = "document_texts"
+    __table_args__ = (
+        UniqueConstraint("file_hash", "extractor_version", "page_number", name="uq_document_texts_page"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_hash = Column(String, nullable=False, index=True)
+    extractor_version = Column(String, nullable=False)
+    page_number = Column(Integer, nullable=False)  # 1-based
+    text = Column(Text)
+    is_ocr = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Blob(Base):
+    """Stored object addressed by content; shared by every document with the same file_hash"""
+    __tablename__ = "blobs"
+    __table_args__ = (
+        # Garbage collection scans for unreferenced blobs
+        Index("idx_blobs_ref_count_updated_at", "ref_count", "updated_at"),
+    )
+    
+    file_hash = Column(String, primary_key=True)  # SHA256 of the contents
+    file_path = Column(String, nullable=False)  # URL or path in storage
+    file_size = Column(BigInteger)
+    ref_count = Column(Integer, nullable=False, default=0)  # Documents pointing at this blob
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class OperationResult(Base):
+    """Cached output of a derived operation, keyed by input hash, operation, parameters and processor version"""
+    __tablename__ = "operation_results"
+    __table_args__ = (
+        # Eviction walks entries least recently used first
+        Index("idx_operation_results_last_used_at", "last_used_at"),
+    )
+    
+    cache_key = Column(String, primary_key=True)  # SHA256 of the normalized key
+    operation = Column(String, nullable=False)
+    source_hash = Column(String, nullable=False, index=True)
+    outputs = Column(Text, nullable=False)  # JSON list of {"file_hash", "filename"}; each holds a blob reference
+    total_size = Column(BigInteger, nullable=False, default=0)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+class UploadSession(Base):
+    """Resumable upload in progress; bytes are staged locally (and as S3 parts) until finalize"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String, primary_key=True, index=True, default=generate_uuid)
+    owner_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    mime_type = Column(String)
+    total_size = Column(BigInteger)  # Declared size, if the client knows it
+    received_bytes = Column(BigInteger, nullable=False, default=0)
+    status = Column(String, nullable=False, default="active")  # active, completed, aborted
+    staging_path = Column(String, nullable=False)
+    storage_upload_id = Column(String)  # S3 multipart upload id
+    storage_parts = Column(Text)  # JSON list of uploaded S3 parts
+    storage_uploaded_bytes = Column(BigInteger, nullable=False, default=0)
+    storage_key = Column(String)  # Object key reserved for the S3 multipart upload
+    document_id = Column(String, ForeignKey("documents.id", ondelete="SET NULL"))  # Cleared when the document is deleted
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
 class ChatHistory(Base):
     __tablename__ = "chat_history"
     
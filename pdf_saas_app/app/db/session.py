@@ -15,4 +15,16 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def run_in_session(func, *args, **kwargs):
+    """
+    Call func(db, *args, **kwargs) on a new session and close it afterwards
+    For work handed to executor threads: a session must not be shared across threads,
+    so the request's session stays on the request.
+    """
+    db = SessionLocal()
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
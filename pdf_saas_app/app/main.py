@@ -2,10 +2,15 @@ from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 import os
-from app.api import auth, documents, ai_chat, auth_google, pdf
-from app.db.session import engine, Base
+import threading
+from app.api import auth, documents, ai_chat, auth_google, pdf, jobs
+from app.db.session import engine, Base, get_db
 from app.config import settings
 from app.services.redis_service import redis_service
+from app.services.executor_service import executor_service
+from app.core.office_pool import office_pool
+from app.core.compression import reset_compression_pool
+from app.core.rasterizer import reset_rasterize_pool
 from starlette.middleware.sessions import SessionMiddleware
 
 # Create database tables if they don't exist (lazy initialization)
@@ -52,6 +57,16 @@ app.add_middleware(
 @app.on_event("startup")
 def startup_event():
     init_database()
+    if settings.OFFICE_POOL_PREWARM:
+        # Start LibreOffice listeners in the background so startup is not blocked
+        threading.Thread(target=office_pool.start, daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    executor_service.shutdown()
+    office_pool.shutdown()
+    reset_compression_pool()
+    reset_rasterize_pool()
 
 # Include routers
 app.include_router(
@@ -85,6 +100,12 @@ app.include_router(
     tags=["pdf-edit"]
 )
 
+app.include_router(
+    jobs.router,
+    prefix=f"{settings.API_V1_STR}/jobs",
+    tags=["jobs"]
+)
+
 @app.get("/")
 async def root():
     return {
@@ -122,7 +143,30 @@ async def health_check():
 async def get_cache_stats():
     """Get cache statistics"""
     from app.utils.cache import CacheManager
-    return CacheManager.get_cache_stats()
+    from app.services.disk_cache_service import disk_cache_service
+    from app.services.thumbnail_service import thumbnail_service
+    from app.services.retrieval_service import retrieval_service
+    stats = CacheManager.get_cache_stats()
+    stats["storage_cache"] = disk_cache_service.get_stats()
+    stats["thumbnail_cache"] = thumbnail_service.get_stats()
+    stats["embedding_index_cache"] = retrieval_service.get_stats()
+    return stats
+
+@app.get("/executor/stats")
+async def get_executor_stats():
+    """Get execution-layer queue depth and throughput per operation"""
+    metrics = executor_service.get_metrics()
+    metrics["office_pool"] = office_pool.get_stats()
+    return metrics
+
+@app.get("/storage/stats")
+def get_storage_stats(db: Session = Depends(get_db)):
+    """Get blob store deduplication and operation cache statistics"""
+    from app.services.blob_store_service import blob_store_service
+    from app.services.operation_cache_service import operation_cache_service
+    stats = blob_store_service.get_stats(db)
+    stats["operation_cache"] = operation_cache_service.get_stats(db)
+    return stats
 
 @app.get("/cache/clear")
 async def clear_cache():
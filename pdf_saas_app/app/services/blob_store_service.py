@@ -0,0 +1,188 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, Dict, Any, List
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import logging
+
+from app.config import settings
+from app.db.models import Blob, Document
+from app.services.storage_service import StorageService
+from app.utils.file_utils import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+class BlobStoreService:
+    """
+    Content-addressed storage on top of StorageService.
+
+    Each distinct SHA-256 is stored once and reference-counted from Document rows,
+    so identical bytes uploaded by many users or produced again by derived
+    operations share one object. Reference changes are flushed, not committed:
+    callers commit them together with the Document rows they belong to.
+    Unreferenced blobs are deleted by collect_garbage after a grace period, during
+    which a new reference revives them.
+    """
+
+    @staticmethod
+    def object_name(file_hash: str, original_filename: str) -> str:
+        """Storage name for a blob (the extension is kept for tools that sniff by name)"""
+        return f"sha256_{file_hash}{os.path.splitext(original_filename)[1].lower()}"
+
+    def acquire(self, db: Session, file_hash: str) -> Optional[Blob]:
+        """Add a reference to a stored blob; None if the content is not stored"""
+        blob = db.query(Blob).filter(Blob.file_hash == file_hash).with_for_update().first()
+        if blob is not None:
+            blob.ref_count += 1
+            db.flush()
+        return blob
+
+    def store_file(self, db: Session, local_path: str, original_filename: str,
+                   file_hash: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Store a local file, reusing the existing object when the content is already stored
+        Adds one reference; commit it with the Document that uses the returned path.
+        Returns:
+            (file_path, file_hash)
+        """
+        file_hash = file_hash or compute_file_hash(local_path)
+        blob = self.acquire(db, file_hash)
+        if blob is not None:
+            logger.info(f"Deduplicated {original_filename} against blob {file_hash[:12]}")
+            return blob.file_path, file_hash
+
+        storage_service = StorageService()
+        file_path = storage_service.upload_file(
+            local_path, original_filename, object_name=self.object_name(file_hash, original_filename)
+        )
+        return self._register(db, file_hash, file_path, os.path.getsize(local_path)), file_hash
+
+    def upload_object(self, local_path: str, original_filename: str,
+                      file_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Upload a file under a unique name without touching the database
+        Lets outputs be uploaded from worker threads as they are produced and registered
+        afterwards in one transaction with adopt_stored, which drops the copy if the
+        content is stored by then. Not the content address: without a locked blob row,
+        collect_garbage could be deleting an object at that name.
+        Returns:
+            {"file_path", "file_hash", "file_size", "filename"}
+        """
+        file_hash = file_hash or compute_file_hash(local_path)
+        file_path = StorageService().upload_file(local_path, original_filename)
+        return {
+            "file_path": file_path,
+            "file_hash": file_hash,
+            "file_size": os.path.getsize(local_path),
+            "filename": original_filename
+        }
+
+    def discard_uploaded(self, db: Session, objects: List[Dict[str, Any]]) -> None:
+        """
+        Delete objects from upload_object that were never adopted
+        For cleanup after a failure; roll back first so uncommitted adopt_stored calls are undone.
+        An object a blob already points at is that blob's and is kept.
+        """
+        storage_service = StorageService()
+        for stored in objects:
+            blob = db.query(Blob).filter(Blob.file_hash == stored["file_hash"]).first()
+            if blob is None or blob.file_path != stored["file_path"]:
+                storage_service.delete_file(stored["file_path"])
+
+    def adopt_stored(self, db: Session, file_hash: str, file_path: str, file_size: int,
+                     redundant: Optional[List[str]] = None) -> str:
+        """
+        Register an object that is already in storage under a non-addressed name (streamed uploads)
+        If the content is already stored the new object is deleted and the existing path returned.
+        Adds one reference; commit it with the Document that uses the returned path.
+        Args:
+            redundant: If given, objects to delete are appended to it instead of deleted here,
+                       for callers that keep storage calls off the request thread
+        """
+        blob = self.acquire(db, file_hash)
+        if blob is None:
+            return self._register(db, file_hash, file_path, file_size, redundant)
+        self._drop_duplicate(blob, file_path, redundant)
+        return blob.file_path
+
+    def _register(self, db: Session, file_hash: str, file_path: str, file_size: int,
+                  redundant: Optional[List[str]] = None) -> str:
+        try:
+            with db.begin_nested():
+                db.add(Blob(file_hash=file_hash, file_path=file_path, file_size=file_size, ref_count=1))
+            return file_path
+        except IntegrityError:
+            # Another request stored the same content concurrently; use theirs
+            blob = self.acquire(db, file_hash)
+            self._drop_duplicate(blob, file_path, redundant)
+            return blob.file_path
+
+    @staticmethod
+    def _drop_duplicate(blob: Blob, file_path: str, redundant: Optional[List[str]]) -> None:
+        if blob.file_path == file_path:
+            return
+        if redundant is None:
+            StorageService().delete_file(file_path)
+        else:
+            redundant.append(file_path)
+
+    def release(self, db: Session, document: Document) -> None:
+        """
+        Drop a document's reference to its stored object (call before deleting the row)
+        Documents created before the blob store own their object and delete it directly.
+        """
+        blob = None
+        if document.file_hash:
+            blob = db.query(Blob).filter(Blob.file_hash == document.file_hash).with_for_update().first()
+        if blob is None or blob.file_path != document.file_path:
+            StorageService().delete_file(document.file_path)
+            return
+        self._decrement(db, blob)
+
+    def release_hash(self, db: Session, file_hash: str) -> None:
+        """Drop a reference taken with acquire or store_file by something other than a document"""
+        blob = db.query(Blob).filter(Blob.file_hash == file_hash).with_for_update().first()
+        if blob is not None:
+            self._decrement(db, blob)
+
+    def _decrement(self, db: Session, blob: Blob) -> None:
+        blob.ref_count = max(0, blob.ref_count - 1)
+        blob.updated_at = datetime.utcnow()
+        db.flush()
+
+    def collect_garbage(self, db: Session, grace_seconds: Optional[int] = None) -> int:
+        """Delete blobs that have had no references for the grace period"""
+        grace_seconds = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        candidates = db.query(Blob).filter(Blob.ref_count <= 0, Blob.updated_at <= cutoff).with_for_update().all()
+        storage_service = StorageService()
+        collected = 0
+        for blob in candidates:
+            if storage_service.delete_file(blob.file_path):
+                db.delete(blob)
+                collected += 1
+            else:
+                logger.warning(f"Could not delete blob {blob.file_hash[:12]} from storage, will retry")
+        db.commit()
+        if collected:
+            logger.info(f"Collected {collected} unreferenced blobs")
+        return collected
+
+    def get_stats(self, db: Session) -> Dict[str, Any]:
+        """Physical vs logical bytes, i.e. what deduplication saves"""
+        blob_count, physical_bytes = db.query(func.count(Blob.file_hash), func.coalesce(func.sum(Blob.file_size), 0)).one()
+        logical_bytes = db.query(func.coalesce(func.sum(Document.file_size), 0)).filter(
+            Document.file_hash.in_(db.query(Blob.file_hash))
+        ).scalar()
+        unreferenced = db.query(func.count(Blob.file_hash)).filter(Blob.ref_count <= 0).scalar()
+        return {
+            "blobs": blob_count,
+            "unreferenced_blobs": unreferenced,
+            "physical_bytes": int(physical_bytes),
+            "logical_bytes": int(logical_bytes),
+            "saved_bytes": max(0, int(logical_bytes) - int(physical_bytes))
+        }
+
+# Global blob store instance
+blob_store_service = BlobStoreService()
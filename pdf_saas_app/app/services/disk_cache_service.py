@@ -0,0 +1,293 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, but an open file cannot be deleted there, so a lease's
+    # open descriptor is enough to keep its entry from eviction
+    fcntl = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class DiskCacheService:
+    """
+    Local read-through cache for objects fetched from S3/Azure.
+
+    Entries are content-addressed (file hash when known, otherwise a hash of the
+    immutable storage identifier) and written atomically: a download goes to a
+    unique temporary name and is renamed into place, so readers only ever see
+    complete files. Concurrent misses for the same key share one download through
+    a per-key lock.
+
+    Total size is capped with LRU eviction. The LRU order and sizes are kept in
+    memory (loaded from one directory scan on first use), so a miss costs no
+    directory walk; file mtimes are still refreshed on hits so the order survives
+    restarts. Entries added by another process sharing the directory join the
+    index when this process first hits them.
+
+    Callers that hold a path for long (OCR, page streams, jobs) take a lease with
+    acquire/release or pinned: the entry is locked with a shared flock, and
+    eviction, in any process, skips entries it cannot lock exclusively (on
+    Windows, entries it cannot delete because a lease has them open). Paths
+    from get_or_fetch are only protected for STORAGE_CACHE_MIN_AGE_SECONDS.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = os.path.abspath(root or settings.STORAGE_CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.STORAGE_CACHE_MAX_BYTES
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        # path -> (size, last used), least recently used first; None until first use
+        self._index: Optional["OrderedDict[str, Tuple[int, float]]"] = None
+        self._bytes = 0
+        self._index_lock = threading.Lock()
+        # path -> descriptors holding a shared flock, one per lease
+        self._leases: Dict[str, List[int]] = {}
+        self._leases_guard = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+    @staticmethod
+    def key_for(file_identifier: str, file_hash: Optional[str] = None) -> str:
+        """Cache key for a stored object"""
+        return file_hash or hashlib.sha256(file_identifier.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str, extension: str = "") -> str:
+        # Keep the extension: LibreOffice and some converters pick the import filter from it
+        return os.path.join(self.root, key[:2], f"{key}{extension}")
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def lookup(self, key: str, extension: str = "") -> Optional[str]:
+        """Cached path for key, or None on a miss (a hit refreshes the entry's LRU position)"""
+        path = self.path_for(key, extension)
+        if self._touch(path):
+            self._stats["hits"] += 1
+            return path
+        return None
+
+    def get_or_fetch(self, key: str, extension: str, fetch: Callable[[str], None]) -> str:
+        """
+        Return the cached path for key, calling fetch(temp_path) to populate it on a miss
+        Args:
+            key: Cache key (see key_for)
+            extension: File extension to keep on the cached file
+            fetch: Writes the object to the given path
+        """
+        path = self.path_for(key, extension)
+        if self._touch(path):
+            self._stats["hits"] += 1
+            return path
+
+        with self._lock_for(key):
+            # Another thread may have filled it while we waited
+            if self._touch(path):
+                self._stats["hits"] += 1
+                return path
+
+            self._stats["misses"] += 1
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex}.part"
+            try:
+                fetch(temp_path)
+                os.replace(temp_path, path)
+            except Exception:
+                self._stats["errors"] += 1
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._record(path)
+
+        self.evict()
+        return path
+
+    def acquire(self, key: str, extension: str, fetch: Callable[[str], None]) -> str:
+        """
+        Like get_or_fetch, but the entry cannot be evicted until release(path) is called
+        Every acquire needs its own release.
+        """
+        while True:
+            path = self.get_or_fetch(key, extension, fetch)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            if fcntl is not None:
+                # Blocks only while an eviction of this entry is in progress
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                # Evicted between the fetch and the lock: the name is gone or was refetched
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    with self._leases_guard:
+                        self._leases.setdefault(path, []).append(fd)
+                    return path
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def release(self, path: str) -> None:
+        """Drop a lease taken with acquire"""
+        with self._leases_guard:
+            fds = self._leases.get(path)
+            if not fds:
+                logger.warning(f"Released a cache entry that was not acquired: {path}")
+                return
+            fd = fds.pop()
+            if not fds:
+                del self._leases[path]
+        os.close(fd)
+
+    @contextmanager
+    def pinned(self, key: str, extension: str, fetch: Callable[[str], None]) -> Iterator[str]:
+        """Cached path for key, kept from eviction for the duration of the block"""
+        path = self.acquire(key, extension, fetch)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self._record(path)
+        return True
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".part"):
+                    continue
+                entry_path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+                yield entry_path, stat.st_size, stat.st_mtime
+
+    def _load_index(self) -> "OrderedDict[str, Tuple[int, float]]":
+        # Called with _index_lock held
+        if self._index is None:
+            entries = sorted(self._scan(), key=lambda entry: entry[2])
+            self._index = OrderedDict((path, (size, mtime)) for path, size, mtime in entries)
+            self._bytes = sum(size for _, size, _ in entries)
+        return self._index
+
+    def _record(self, path: str) -> None:
+        """Mark path as just used, adding it to the index if it is new"""
+        with self._index_lock:
+            index = self._load_index()
+            entry = index.get(path)
+            if entry is None:
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    return
+                self._bytes += size
+            else:
+                size = entry[0]
+            index[path] = (size, time.time())
+            index.move_to_end(path)
+
+    def _remove_unpinned(self, path: str) -> bool:
+        """Delete an entry unless a lease (in any process) holds it"""
+        if fcntl is None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # Open elsewhere, i.e. leased
+                return False
+            return True
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        finally:
+            os.close(fd)
+        return True
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._index_lock:
+            index = self._load_index()
+            if self._bytes <= self.max_bytes:
+                return 0
+            # Entries used very recently may have just been handed to a caller; leave them
+            cutoff = time.time() - settings.STORAGE_CACHE_MIN_AGE_SECONDS
+            evicted = 0
+            for entry_path in list(index):
+                if self._bytes <= self.max_bytes:
+                    break
+                size, last_used = index[entry_path]
+                if last_used > cutoff:
+                    break
+                try:
+                    # Another process sharing the directory may have used it since
+                    mtime = os.stat(entry_path).st_mtime
+                except FileNotFoundError:
+                    mtime = 0
+                if mtime > cutoff:
+                    index[entry_path] = (size, mtime)
+                    index.move_to_end(entry_path)
+                elif self._remove_unpinned(entry_path):
+                    del index[entry_path]
+                    self._bytes -= size
+                    evicted += 1
+                else:
+                    # In use; treat it as recently used so later passes do not retry it first
+                    index[entry_path] = (size, time.time())
+                    index.move_to_end(entry_path)
+            if evicted:
+                self._stats["evictions"] += evicted
+                logger.info(f"Evicted {evicted} entries from {self.root}")
+            return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._index_lock:
+            entries = len(self._load_index())
+            size = self._bytes
+        with self._leases_guard:
+            pinned = len(self._leases)
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "enabled": settings.STORAGE_CACHE_ENABLED,
+            "hits": self._stats["hits"],
+            "misses": self._stats["misses"],
+            "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            "evictions": self._stats["evictions"],
+            "errors": self._stats["errors"],
+            "entries": entries,
+            "bytes": size,
+            "pinned": pinned,
+            "max_bytes": self.max_bytes
+        }
+
+# Global storage cache instance
+disk_cache_service = DiskCacheService()
@@ -0,0 +1,148 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class ExecutorService:
+    """
+    Execution layer for blocking work called from async endpoints.
+
+    CPU-bound PDF work runs in a bounded process pool, subprocess/IO-bound work in a
+    bounded thread pool, so the event loop (and /health) stays responsive. Each
+    operation name has its own concurrency limit; callers over the limit wait on a
+    semaphore and are counted as queued.
+    """
+
+    def __init__(self):
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=settings.EXECUTOR_THREAD_WORKERS,
+                    thread_name_prefix="blocking"
+                )
+            return self._thread_pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._process_pool is None:
+                max_workers = settings.EXECUTOR_PROCESS_WORKERS or os.cpu_count() or 1
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._process_pool
+
+    def get_limit(self, operation: str) -> int:
+        """Concurrency limit for an operation"""
+        return settings.EXECUTOR_OPERATION_LIMITS.get(operation, settings.EXECUTOR_DEFAULT_OPERATION_LIMIT)
+
+    def _get_semaphore(self, operation: str) -> asyncio.Semaphore:
+        if operation not in self._semaphores:
+            self._semaphores[operation] = asyncio.Semaphore(self.get_limit(operation))
+            self._stats[operation] = {
+                "waiting": 0,
+                "running": 0,
+                "completed": 0,
+                "failed": 0,
+                "total_wait_ms": 0.0,
+                "total_run_ms": 0.0
+            }
+        return self._semaphores[operation]
+
+    async def _run(self, executor, operation: str, func: Callable, *args, **kwargs) -> Any:
+        semaphore = self._get_semaphore(operation)
+        stats = self._stats[operation]
+
+        queued_at = time.perf_counter()
+        stats["waiting"] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            stats["waiting"] -= 1
+
+        started = time.perf_counter()
+        stats["total_wait_ms"] += (started - queued_at) * 1000
+        stats["running"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+            stats["completed"] += 1
+            return result
+        except Exception:
+            stats["failed"] += 1
+            raise
+        finally:
+            stats["running"] -= 1
+            stats["total_run_ms"] += (time.perf_counter() - started) * 1000
+            semaphore.release()
+
+    async def run_in_thread(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run blocking IO/subprocess work in the thread pool
+        Args:
+            operation: Operation name used for the concurrency limit and metrics
+            func: Callable to run; args/kwargs are passed through
+        """
+        return await self._run(self.thread_pool, operation, func, *args, **kwargs)
+
+    async def run_in_process(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run CPU-bound work in the process pool (func and arguments must be picklable)
+        Args:
+            operation: Operation name used for the concurrency limit and metrics
+            func: Callable to run; args/kwargs are passed through
+        """
+        return await self._run(self.process_pool, operation, func, *args, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth and throughput per operation"""
+        operations = {}
+        for operation, stats in self._stats.items():
+            finished = stats["completed"] + stats["failed"]
+            operations[operation] = {
+                "limit": self.get_limit(operation),
+                "waiting": stats["waiting"],
+                "running": stats["running"],
+                "completed": stats["completed"],
+                "failed": stats["failed"],
+                "avg_wait_ms": round(stats["total_wait_ms"] / finished, 2) if finished else 0.0,
+                "avg_run_ms": round(stats["total_run_ms"] / finished, 2) if finished else 0.0
+            }
+        return {
+            "thread_workers": settings.EXECUTOR_THREAD_WORKERS,
+            "process_workers": settings.EXECUTOR_PROCESS_WORKERS or os.cpu_count() or 1,
+            "total_waiting": sum(op["waiting"] for op in operations.values()),
+            "total_running": sum(op["running"] for op in operations.values()),
+            "operations": operations
+        }
+
+    def shutdown(self) -> None:
+        """Shut down both pools (called on application shutdown)"""
+        with self._pool_lock:
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown(wait=False, cancel_futures=True)
+                self._thread_pool = None
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
+
+# Global executor service instance
+executor_service = ExecutorService()
@@ -0,0 +1,248 @@
+import os
+import shutil
+import hashlib
+import mimetypes
+import tempfile
+from typing import BinaryIO, Optional, Dict, Any
+import logging
+
+from app.config import settings
+from app.services.disk_cache_service import disk_cache_service
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+# Document file type by extension
+FILE_TYPE_MAPPING = {
+    '.pdf': 'pdf',
+    '.doc': 'doc',
+    '.docx': 'docx',
+    '.xls': 'xls',
+    '.xlsx': 'xlsx',
+    '.ppt': 'ppt',
+    '.pptx': 'pptx',
+    '.txt': 'txt',
+    '.rtf': 'rtf',
+    '.odt': 'odt',
+    '.ods': 'ods',
+    '.odp': 'odp',
+    '.csv': 'csv',
+    '.jpg': 'jpg',
+    '.jpeg': 'jpg',
+    '.png': 'png',
+    '.gif': 'gif',
+    '.bmp': 'bmp',
+    '.tiff': 'tiff',
+    '.tif': 'tiff'
+}
+
+# Leading bytes -> MIME type; containers (zip, OLE) are narrowed by extension
+MAGIC_NUMBERS = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"{\\rtf", "application/rtf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+)
+
+# Signature (MIME type from MAGIC_NUMBERS) the content of each file type must have;
+# plain-text types have none and are not checked
+FILE_TYPE_SIGNATURES = {
+    'pdf': "application/pdf",
+    'jpg': "image/jpeg",
+    'png': "image/png",
+    'gif': "image/gif",
+    'bmp': "image/bmp",
+    'tiff': "image/tiff",
+    'rtf': "application/rtf",
+    'docx': "application/zip",
+    'xlsx': "application/zip",
+    'pptx': "application/zip",
+    'odt': "application/zip",
+    'ods': "application/zip",
+    'odp': "application/zip",
+    'doc': "application/x-ole-storage",
+    'xls': "application/x-ole-storage",
+    'ppt': "application/x-ole-storage",
+}
+
+# Readers accept the PDF header anywhere in the first 1024 bytes (scanners and mailers
+# often put bytes in front of it), so that much is sniffed
+PDF_HEADER_WINDOW = 1024
+SNIFF_BYTES = PDF_HEADER_WINDOW
+
+def detect_signature(head: bytes) -> Optional[str]:
+    """MIME type of the magic number the bytes start with (or of a PDF header further in), or None"""
+    for magic, mime_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime_type
+    if b"%PDF-" in head[:PDF_HEADER_WINDOW]:
+        return "application/pdf"
+    return None
+
+def sniff_mime_type(head: bytes, filename: str, declared: Optional[str] = None) -> str:
+    """
+    Detect the MIME type from the first bytes of a file
+    Falls back to the extension, then to the client-declared type.
+    """
+    guessed = mimetypes.guess_type(filename)[0]
+    mime_type = detect_signature(head)
+    if mime_type in ("application/zip", "application/x-ole-storage"):
+        # docx/xlsx/pptx/od* are zips and doc/xls/ppt are OLE files; the extension tells them apart
+        return guessed or mime_type
+    return mime_type or guessed or declared or "application/octet-stream"
+
+def check_file_type(head: bytes, filename: str) -> None:
+    """
+    Reject content that does not match the file type its extension claims
+    Raises:
+        ValueError: e.g. an executable or a ZIP uploaded as .pdf
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    expected = FILE_TYPE_SIGNATURES.get(FILE_TYPE_MAPPING.get(extension, 'unknown'))
+    if expected is not None and detect_signature(head) != expected:
+        raise ValueError(f"File content does not match its {extension} extension")
+
+class IngestPipeline:
+    """
+    Single-pass upload ingest.
+
+    Each chunk is written once to the storage backend (S3 multipart / Azure blocks
+    as it arrives) while the SHA-256, byte count and leading bytes for MIME sniffing
+    are taken from the same buffer. Nothing is written until the leading bytes are
+    in, so content that does not match its extension is rejected before it reaches
+    storage. For remote backends PDFs are also
+    teed to a local file, which becomes the storage cache entry, so text extraction
+    does not download the object again.
+    """
+
+    def __init__(self, filename: str, storage_service: Optional[StorageService] = None):
+        self.filename = filename
+        self.extension = os.path.splitext(filename)[1].lower()
+        self.file_type = FILE_TYPE_MAPPING.get(self.extension, 'unknown')
+        self.storage_service = storage_service or StorageService()
+        self.writer = self.storage_service.open_writer(filename)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        # Data held back until the leading bytes are checked
+        self._unchecked: Optional[bytearray] = bytearray()
+        self._tee = None
+        if self.file_type == 'pdf' and self.storage_service.storage_type != "local":
+            self._tee = tempfile.NamedTemporaryFile(delete=False, suffix=self.extension)
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.hasher.update(data)
+        self.size += len(data)
+        if self._unchecked is not None:
+            self._unchecked += data
+            if len(self._unchecked) < SNIFF_BYTES:
+                return
+            data = self._check()
+        self.writer.write(data)
+        if self._tee is not None:
+            self._tee.write(data)
+
+    def _check(self) -> bytes:
+        """Check the leading bytes and return the data held back until then"""
+        data = bytes(self._unchecked)
+        self.head = data[:SNIFF_BYTES]
+        check_file_type(self.head, self.filename)
+        self._unchecked = None
+        return data
+
+    def finish(self, declared_mime_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Commit the stored object and return its metadata (see build_ingest_result)
+        Raises:
+            ValueError: The content does not match the extension (the caller aborts the pipeline)
+        """
+        if self._unchecked is not None:
+            # Files shorter than the sniffed prefix are checked here
+            data = self._check()
+            if data:
+                self.writer.write(data)
+                if self._tee is not None:
+                    self._tee.write(data)
+        file_path = self.writer.close()
+        if self._tee is not None:
+            self._tee.close()
+        return build_ingest_result(
+            self.storage_service, file_path, self.hasher.hexdigest(), self.size, self.head,
+            self.filename, declared_mime_type, self._tee.name if self._tee is not None else None
+        )
+
+    def abort(self) -> None:
+        """Discard a partially written upload"""
+        try:
+            self.writer.abort()
+        except Exception as e:
+            logger.warning(f"Could not abort upload of {self.filename}: {str(e)}")
+        if self._tee is not None:
+            self._tee.close()
+            if os.path.exists(self._tee.name):
+                os.remove(self._tee.name)
+
+def build_ingest_result(storage_service: StorageService, file_path: str, file_hash: str, file_size: int,
+                        head: bytes, filename: str, declared_mime_type: Optional[str] = None,
+                        local_copy: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Describe a freshly stored upload
+    Args:
+        local_copy: Local file with the same content for remote backends (ownership passes here;
+            PDFs are adopted into the storage cache, anything else is deleted)
+    Returns a dict with file_path, file_hash, file_size, mime_type, file_type
+    and local_path (a local copy usable for extraction, or None;
+    the caller must hand it to storage_service.release_file when done)
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    file_type = FILE_TYPE_MAPPING.get(extension, 'unknown')
+
+    local_path = None
+    if storage_service.storage_type == "local":
+        local_path = storage_service.get_file(file_path)
+    elif local_copy is not None:
+        if file_type != 'pdf':
+            os.remove(local_copy)
+        elif not settings.STORAGE_CACHE_ENABLED:
+            # release_file deletes it
+            local_path = local_copy
+        else:
+            # Leased until release_file, so text extraction cannot lose it to eviction
+            local_path = disk_cache_service.acquire(
+                disk_cache_service.key_for(file_path, file_hash),
+                extension,
+                lambda temp_path: shutil.move(local_copy, temp_path)
+            )
+            if os.path.exists(local_copy):
+                # Content was already cached
+                os.remove(local_copy)
+
+    return {
+        "file_path": file_path,
+        "file_hash": file_hash,
+        "file_size": file_size,
+        "mime_type": sniff_mime_type(head, filename, declared_mime_type),
+        "file_type": file_type,
+        "local_path": local_path
+    }
+
+def ingest_file_object(file_object: BinaryIO, filename: str, declared_mime_type: Optional[str] = None,
+                       storage_service: Optional[StorageService] = None) -> Dict[str, Any]:
+    """Run a file-like object through the ingest pipeline (blocking)"""
+    pipeline = IngestPipeline(filename, storage_service)
+    try:
+        for chunk in iter(lambda: file_object.read(settings.INGEST_CHUNK_SIZE), b""):
+            pipeline.write(chunk)
+        return pipeline.finish(declared_mime_type)
+    except Exception:
+        pipeline.abort()
+        raise
@@ -0,0 +1,237 @@
+import json
+import time
+import uuid
+from typing import Optional, Any, Dict, Tuple, Union
+import logging
+
+from app.config import settings
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+# Operations the worker knows how to run (see app/worker.py)
+JOB_OPERATIONS = ("compress", "ocr", "office_to_pdf", "to_epub", "to_jpg", "thumbnails")
+
+# Low-priority jobs (e.g. thumbnail pre-generation) only run when no normal job is waiting
+JOB_PRIORITY_NORMAL = "normal"
+JOB_PRIORITY_LOW = "low"
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_RETRYING = "retrying"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+
+class JobService:
+    """
+    Service for background document jobs backed by Redis.
+
+    Job state lives in a hash per job; job ids travel through the queue built on
+    RedisService.add_to_queue. Workers reserve tasks into a processing list with a
+    lease (visibility timeout); tasks whose lease expires are put back on the queue,
+    failed tasks are retried with exponential backoff through a delayed set.
+    Low-priority jobs have their own queue, which workers only take from when the
+    normal queue is empty.
+    """
+
+    def __init__(self):
+        self.queue_name = settings.JOB_QUEUE_NAME
+        self.processing_name = f"{settings.JOB_QUEUE_NAME}:processing"
+        self.delayed_name = f"{settings.JOB_QUEUE_NAME}:delayed"
+        self.low_queue_name = f"{settings.JOB_QUEUE_NAME}:low"
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def is_available(self) -> bool:
+        return redis_service.is_available()
+
+    def _queue_for(self, priority: Optional[str]) -> str:
+        return self.low_queue_name if priority == JOB_PRIORITY_LOW else self.queue_name
+
+    def _save(self, job_id: str, fields: Dict[str, Any]) -> None:
+        fields = dict(fields, updated_at=time.time())
+        encoded = {k: json.dumps(v) for k, v in fields.items()}
+        redis_service.redis_client.hset(self._job_key(job_id), mapping=encoded)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's full state"""
+        if not self.is_available():
+            return None
+        raw = redis_service.redis_client.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        return {
+            (k.decode() if isinstance(k, bytes) else k): json.loads(v)
+            for k, v in raw.items()
+        }
+
+    def create_job(self, operation: str, document_id: str, owner_id: str, params: Optional[Dict[str, Any]] = None,
+                   priority: str = JOB_PRIORITY_NORMAL) -> Dict[str, Any]:
+        """
+        Create a job and put it on the queue for its priority
+        Raises:
+            ValueError: Unknown operation or priority
+            RuntimeError: Redis is not available
+        """
+        if operation not in JOB_OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation}")
+        if priority not in (JOB_PRIORITY_NORMAL, JOB_PRIORITY_LOW):
+            raise ValueError(f"Unknown priority: {priority}")
+        if not self.is_available():
+            raise RuntimeError("Job queue is not available")
+
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        job = {
+            "id": job_id,
+            "operation": operation,
+            "document_id": document_id,
+            "owner_id": owner_id,
+            "params": params or {},
+            "priority": priority,
+            "status": JOB_STATUS_QUEUED,
+            "progress": 0,
+            "message": "Queued",
+            "attempts": 0,
+            "max_attempts": settings.JOB_MAX_ATTEMPTS,
+            "result": None,
+            "error": None,
+            "lease_until": None,
+            "created_at": now
+        }
+        self._save(job_id, job)
+        if not redis_service.add_to_queue(self._queue_for(priority), {"job_id": job_id}):
+            raise RuntimeError("Failed to enqueue job")
+        return self.get_job(job_id)
+
+    # Worker side
+    def reserve(self, timeout: int = 5) -> Optional[Tuple[Union[str, bytes], Dict[str, Any]]]:
+        """
+        Reserve the next job for this worker
+        Returns (raw task, job) or None; the job is marked running with a fresh lease.
+        Normal jobs are taken first, then low-priority ones; when both queues are empty
+        this blocks on the normal queue only, so an idle worker picks up new low-priority
+        jobs after at most timeout seconds.
+        """
+        for queue_name in (self.queue_name, self.low_queue_name):
+            reserved = redis_service.reserve_from_queue(queue_name, self.processing_name, block=False)
+            if reserved:
+                break
+        else:
+            reserved = redis_service.reserve_from_queue(self.queue_name, self.processing_name, timeout)
+        if not reserved:
+            return None
+        raw_task, task = reserved
+        job_id = task["data"]["job_id"]
+        job = self.get_job(job_id)
+        if job is None:
+            # Job state expired or was removed; drop the orphaned task
+            redis_service.ack_from_processing(self.processing_name, raw_task)
+            return None
+
+        attempts = job["attempts"] + 1
+        self._save(job_id, {
+            "status": JOB_STATUS_RUNNING,
+            "attempts": attempts,
+            "lease_until": time.time() + settings.JOB_VISIBILITY_TIMEOUT,
+            "message": f"Running (attempt {attempts}/{job['max_attempts']})"
+        })
+        job.update(status=JOB_STATUS_RUNNING, attempts=attempts)
+        return raw_task, job
+
+    def update_progress(self, job_id: str, progress: int, message: Optional[str] = None) -> None:
+        """Record progress and extend the job's lease (acts as a heartbeat)"""
+        fields = {
+            "progress": max(0, min(100, int(progress))),
+            "lease_until": time.time() + settings.JOB_VISIBILITY_TIMEOUT
+        }
+        if message:
+            fields["message"] = message
+        self._save(job_id, fields)
+
+    def complete(self, raw_task: Union[str, bytes], job_id: str, result: Dict[str, Any]) -> None:
+        """Mark a job succeeded and release its task"""
+        self._save(job_id, {
+            "status": JOB_STATUS_SUCCEEDED,
+            "progress": 100,
+            "message": "Completed",
+            "result": result,
+            "error": None,
+            "lease_until": None
+        })
+        redis_service.redis_client.expire(self._job_key(job_id), settings.JOB_RESULT_TTL)
+        redis_service.ack_from_processing(self.processing_name, raw_task)
+
+    def fail(self, raw_task: Union[str, bytes], job: Dict[str, Any], error: str) -> None:
+        """Retry a failed job with exponential backoff, or mark it failed once attempts are used up"""
+        job_id = job["id"]
+        if job["attempts"] < job["max_attempts"]:
+            delay = settings.JOB_RETRY_BACKOFF_SECONDS * (2 ** (job["attempts"] - 1))
+            self._save(job_id, {
+                "status": JOB_STATUS_RETRYING,
+                "message": f"Retrying in {delay}s",
+                "error": error,
+                "lease_until": None
+            })
+            redis_service.redis_client.zadd(self.delayed_name, {job_id: time.time() + delay})
+        else:
+            self._save(job_id, {
+                "status": JOB_STATUS_FAILED,
+                "message": "Failed",
+                "error": error,
+                "lease_until": None
+            })
+            redis_service.redis_client.expire(self._job_key(job_id), settings.JOB_RESULT_TTL)
+        redis_service.ack_from_processing(self.processing_name, raw_task)
+
+    def promote_delayed(self) -> int:
+        """Move retries whose backoff has elapsed back onto the queue"""
+        due = redis_service.redis_client.zrangebyscore(self.delayed_name, 0, time.time())
+        promoted = 0
+        for job_id in due:
+            # zrem guards against two workers promoting the same retry
+            if redis_service.redis_client.zrem(self.delayed_name, job_id):
+                job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+                job = self.get_job(job_id) or {}
+                self._save(job_id, {"status": JOB_STATUS_QUEUED, "message": "Queued for retry"})
+                redis_service.add_to_queue(self._queue_for(job.get("priority")), {"job_id": job_id})
+                promoted += 1
+        return promoted
+
+    def requeue_expired(self) -> int:
+        """Put back tasks whose worker stopped heartbeating (visibility timeout expired)"""
+        requeued = 0
+        now = time.time()
+        for raw_task in redis_service.redis_client.lrange(self.processing_name, 0, -1):
+            try:
+                job_id = json.loads(raw_task)["data"]["job_id"]
+            except Exception:
+                redis_service.ack_from_processing(self.processing_name, raw_task)
+                continue
+            job = self.get_job(job_id)
+            if job is None:
+                redis_service.ack_from_processing(self.processing_name, raw_task)
+                continue
+            # A task reserved by a worker that died before recording its lease falls back to updated_at
+            lease_until = job.get("lease_until") or job["updated_at"] + settings.JOB_VISIBILITY_TIMEOUT
+            if lease_until < now:
+                logger.warning(f"Job {job_id} lease expired, treating worker as crashed")
+                self.fail(raw_task, job, "Worker stopped responding (visibility timeout expired)")
+                requeued += 1
+        return requeued
+
+    def get_queue_stats(self) -> Dict[str, int]:
+        """Queue depth metrics"""
+        if not self.is_available():
+            return {"queued": 0, "queued_low": 0, "processing": 0, "delayed": 0}
+        return {
+            "queued": redis_service.redis_client.llen(self.queue_name),
+            "queued_low": redis_service.redis_client.llen(self.low_queue_name),
+            "processing": redis_service.redis_client.llen(self.processing_name),
+            "delayed": redis_service.redis_client.zcard(self.delayed_name)
+        }
+
+# Global job service instance
+job_service = JobService()
@@ -1,26 +1,63 @@
 import openai
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any
 import json
+import random
+import threading
+import time
+import logging
 
 from app.config import settings
 from app.core.pdf_operations import PDFProcessor
+from app.core import summarizer
+
+logger = logging.getLogger(__name__)
+
+# Caps OpenAI calls in flight across all AIService instances and threads
+_request_slots = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENT_REQUESTS)
+
+def _retry_delay(error: openai.RateLimitError, attempt: int) -> float:
+    try:
+        return min(60.0, float(error.response.headers["retry-after"]))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return min(60.0, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt * (0.5 + random.random()))
+
+def request_with_retries(create: Callable[..., Any], **kwargs: Any) -> Any:
+    """
+    Make an OpenAI request (create(**kwargs)) within the process-wide request cap
+    Rate-limited (429) calls are retried LLM_MAX_RETRIES times with exponential backoff
+    and jitter, honouring Retry-After when the API sends it.
+    """
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        try:
+            with _request_slots:
+                return create(**kwargs)
+        except openai.RateLimitError as e:
+            if attempt == settings.LLM_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"OpenAI rate limit hit, retrying in {delay:.1f}s ({attempt + 1}/{settings.LLM_MAX_RETRIES})")
+            time.sleep(delay)
 
 class AIService:
     """Service for AI operations including chat, summarization, and grammar checking"""
     
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    def __init__(self, client: Optional[Any] = None):
+        # Any object with the OpenAI client interface can be passed in (e.g. a stub in tests)
+        self.client = client or openai.OpenAI(api_key=settings.OPENAI_API_KEY)
         self.pdf_processor = PDFProcessor()
     
+    def _complete(self, **kwargs: Any) -> Any:
+        """chat.completions.create with request_with_retries"""
+        return request_with_retries(self.client.chat.completions.create, **kwargs)
+    
     def generate_chat_response(self, user_query: str, context: Optional[str] = None) -> str:
         """
         Generate an AI response to a user query about a PDF
         
         Args:
             user_query: The user's question
-            context: Optional text context from the PDF
+            context: Optional passages from the PDF (see RetrievalService.get_context)
         
         Returns:
             The AI response
@@ -33,12 +70,16 @@ class AIService:
             # Include PDF context if available
             messages.append({
                 "role": "system", 
-                "content": f"Here is the relevant content from the PDF document: {context}"
+                "content": (
+                    "Here are the passages of the PDF document most relevant to the question, "
+                    "tagged with their page numbers. Answer from them and cite the pages you use.\n\n"
+                    f"{context}"
+                )
             })
         
         messages.append({"role": "user", "content": user_query})
         
-        response = self.client.chat.completions.create(
+        response = self._complete(
             model="gpt-4",
             messages=messages
         )
@@ -47,7 +88,11 @@ class AIService:
     
     def summarize_document(self, text_content: str, max_length: int = 1000) -> str:
         """
-        Summarize document content using direct OpenAI API with chunking
+        Summarize document content of any length (see summarizer.map_reduce_summarize)
+        
+        The text is split into SUMMARY_CHUNK_TOKENS chunks counted with the model's
+        tokenizer; chunk summaries are requested SUMMARY_CONCURRENCY at a time and
+        reduced hierarchically until they fit in SUMMARY_CONTEXT_TOKENS.
         
         Args:
             text_content: The text content to summarize
@@ -55,36 +100,23 @@ class AIService:
         
         Returns:
             The summarized text
+        
+        Raises:
+            openai.RateLimitError: Still rate limited after LLM_MAX_RETRIES retries
         """
-        # Create text chunks for processing
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, 
-            chunk_overlap=100
+        return summarizer.map_reduce_summarize(
+            text_content,
+            self._summarize_chunk,
+            max_length,
+            count_tokens=summarizer.get_token_counter(settings.SUMMARY_MODEL),
+            chunk_tokens=settings.SUMMARY_CHUNK_TOKENS,
+            context_tokens=settings.SUMMARY_CONTEXT_TOKENS,
+            partial_length=settings.SUMMARY_PARTIAL_CHARS,
+            max_workers=settings.SUMMARY_CONCURRENCY
         )
-        texts = text_splitter.split_text(text_content)
-        
-        # If we have multiple chunks, summarize each chunk first
-        if len(texts) > 1:
-            chunk_summaries = []
-            for chunk in texts:
-                chunk_summary = self._summarize_chunk(chunk, max_length // len(texts))
-                chunk_summaries.append(chunk_summary)
-            
-            # Combine chunk summaries and summarize again
-            combined_text = " ".join(chunk_summaries)
-            final_summary = self._summarize_chunk(combined_text, max_length)
-        else:
-            # Single chunk, summarize directly
-            final_summary = self._summarize_chunk(texts[0], max_length)
-        
-        return final_summary
     
     def _summarize_chunk(self, text: str, max_length: int) -> str:
-        """Helper method to summarize a single chunk of text"""
-        # Truncate text if it's too long for the API
-        if len(text) > 12000:  # Leave room for prompt
-            text = text[:12000]
-        
+        """Helper method to summarize a single chunk of text (one model call)"""
         prompt = f"""
         Please summarize the following text in a clear and concise manner. 
         The summary should be no more than {max_length} characters.
@@ -95,27 +127,23 @@ class AIService:
         Summary:
         """
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that creates clear and concise summaries."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.3
-            )
-            
-            summary = response.choices[0].message.content.strip()
-            
-            # If summary is still too long, truncate it
-            if len(summary) > max_length:
-                summary = summary[:max_length] + "..."
-            
-            return summary
-            
-        except Exception as e:
-            return f"Error generating summary: {str(e)}"
+        response = self._complete(
+            model=settings.SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that creates clear and concise summaries."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,
+            temperature=0.3
+        )
+        
+        summary = response.choices[0].message.content.strip()
+        
+        # If summary is still too long, truncate it
+        if len(summary) > max_length:
+            summary = summary[:max_length] + "..."
+        
+        return summary
     
     def check_grammar(self, text: str) -> Dict[str, Any]:
         """
@@ -140,7 +168,7 @@ class AIService:
         }
         """
         
-        response = self.client.chat.completions.create(
+        response = self._complete(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -0,0 +1,170 @@
+import json
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import logging
+
+from app.config import settings
+from app.core.pdf_operations import PROCESSOR_VERSION
+from app.db.models import OperationResult
+from app.services.blob_store_service import blob_store_service
+
+logger = logging.getLogger(__name__)
+
+class OperationCacheService:
+    """
+    Memoizes derived operations (compress, watermark, conversions, page edits).
+
+    Entries are keyed by the source file_hash, the operation name, its normalized
+    parameters and PROCESSOR_VERSION, and point at the output blobs. Each entry holds
+    its own blob references, so outputs survive their documents being deleted; a hit
+    only adds references for the new documents and never re-runs the processor.
+    Entries expire after OPERATION_CACHE_TTL_HOURS and are evicted least recently
+    used first beyond OPERATION_CACHE_MAX_ENTRIES / OPERATION_CACHE_MAX_BYTES.
+    Like the blob store, changes are flushed and committed by the caller.
+    """
+
+    @staticmethod
+    def cache_key(source_hash: str, operation: str, params: Optional[Dict[str, Any]] = None) -> str:
+        normalized = json.dumps({
+            "source": source_hash,
+            "operation": operation,
+            "params": params or {},
+            "version": PROCESSOR_VERSION
+        }, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def get(self, db: Session, source_hash: Optional[str], operation: str,
+            params: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Look up a cached result and add one blob reference per output for the caller's documents
+        Returns:
+            List of {"file_hash", "file_path", "file_size", "filename"}, or None on a miss
+        """
+        if not settings.OPERATION_CACHE_ENABLED or not source_hash:
+            return None
+        entry = db.query(OperationResult).filter(
+            OperationResult.cache_key == self.cache_key(source_hash, operation, params)
+        ).with_for_update().first()
+        if entry is None:
+            return None
+        if entry.expires_at <= datetime.utcnow():
+            self._drop(db, entry)
+            return None
+
+        outputs = []
+        for output in json.loads(entry.outputs):
+            blob = blob_store_service.acquire(db, output["file_hash"])
+            if blob is None:
+                # Should not happen while the entry holds a reference; treat as a miss
+                logger.warning(f"Cached {operation} output {output['file_hash'][:12]} is no longer stored")
+                for acquired in outputs:
+                    blob_store_service.release_hash(db, acquired["file_hash"])
+                self._drop(db, entry)
+                return None
+            outputs.append({
+                "file_hash": blob.file_hash,
+                "file_path": blob.file_path,
+                "file_size": blob.file_size,
+                "filename": output["filename"]
+            })
+
+        entry.last_used_at = datetime.utcnow()
+        entry.hit_count += 1
+        db.flush()
+        logger.info(f"Operation cache hit for {operation} on {source_hash[:12]}")
+        return outputs
+
+    def put(self, db: Session, source_hash: Optional[str], operation: str,
+            params: Optional[Dict[str, Any]], outputs: List[Tuple[str, str]]) -> None:
+        """
+        Cache the outputs of an operation, given as (file_hash, filename) of stored blobs
+        The entry takes its own reference on each blob.
+        """
+        if not settings.OPERATION_CACHE_ENABLED or not source_hash or not outputs:
+            return
+        cache_key = self.cache_key(source_hash, operation, params)
+        if db.query(OperationResult.cache_key).filter(OperationResult.cache_key == cache_key).first():
+            return
+
+        acquired = []
+        for file_hash, filename in outputs:
+            blob = blob_store_service.acquire(db, file_hash)
+            if blob is None:
+                for acquired_blob in acquired:
+                    blob_store_service.release_hash(db, acquired_blob.file_hash)
+                return
+            acquired.append(blob)
+
+        now = datetime.utcnow()
+        try:
+            with db.begin_nested():
+                db.add(OperationResult(
+                    cache_key=cache_key,
+                    operation=operation,
+                    source_hash=source_hash,
+                    outputs=json.dumps([{"file_hash": h, "filename": name} for h, name in outputs]),
+                    total_size=sum(blob.file_size or 0 for blob in acquired),
+                    hit_count=0,
+                    created_at=now,
+                    last_used_at=now,
+                    expires_at=now + timedelta(hours=settings.OPERATION_CACHE_TTL_HOURS)
+                ))
+        except IntegrityError:
+            # Cached concurrently by another request
+            for blob in acquired:
+                blob_store_service.release_hash(db, blob.file_hash)
+            return
+        self.evict(db)
+
+    def evict(self, db: Session) -> int:
+        """Drop expired entries, then least recently used ones beyond the entry and size limits"""
+        evicted = 0
+        for entry in db.query(OperationResult).filter(OperationResult.expires_at <= datetime.utcnow()).all():
+            self._drop(db, entry)
+            evicted += 1
+
+        count, total_size = db.query(func.count(OperationResult.cache_key),
+                                     func.coalesce(func.sum(OperationResult.total_size), 0)).one()
+        while count > settings.OPERATION_CACHE_MAX_ENTRIES or total_size > settings.OPERATION_CACHE_MAX_BYTES:
+            oldest = db.query(OperationResult).order_by(OperationResult.last_used_at.asc()).limit(100).all()
+            if not oldest:
+                break
+            for entry in oldest:
+                if count <= settings.OPERATION_CACHE_MAX_ENTRIES and total_size <= settings.OPERATION_CACHE_MAX_BYTES:
+                    break
+                count -= 1
+                total_size -= entry.total_size
+                self._drop(db, entry)
+                evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} operation cache entries")
+        return evicted
+
+    def _drop(self, db: Session, entry: OperationResult) -> None:
+        for output in json.loads(entry.outputs):
+            blob_store_service.release_hash(db, output["file_hash"])
+        db.delete(entry)
+        db.flush()
+
+    def get_stats(self, db: Session) -> Dict[str, Any]:
+        count, total_size, hits = db.query(
+            func.count(OperationResult.cache_key),
+            func.coalesce(func.sum(OperationResult.total_size), 0),
+            func.coalesce(func.sum(OperationResult.hit_count), 0)
+        ).one()
+        return {
+            "enabled": settings.OPERATION_CACHE_ENABLED,
+            "entries": count,
+            "total_bytes": int(total_size),
+            "hits": int(hits),
+            "max_entries": settings.OPERATION_CACHE_MAX_ENTRIES,
+            "max_bytes": settings.OPERATION_CACHE_MAX_BYTES,
+            "processor_version": PROCESSOR_VERSION
+        }
+
+# Global operation cache instance
+operation_cache_service = OperationCacheService()
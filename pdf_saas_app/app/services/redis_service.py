@@ -1,7 +1,7 @@
 import redis
 import json
 import time
-from typing import Optional, Any, Dict, List
+from typing import Optional, Any, Dict, List, Tuple, Union
 from app.config import settings
 import logging
 
@@ -230,6 +230,45 @@ class RedisService:
             logger.error(f"Error getting from queue {queue_name}: {str(e)}")
             return None
     
+    def reserve_from_queue(self, queue_name: str, processing_name: str, timeout: int = 5,
+                           block: bool = True) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Atomically move the next task from a queue into a processing list (blocking up to timeout)
+        The task stays in the processing list until acknowledged, so a crashed consumer does not lose it.
+        Args:
+            queue_name: Name of the queue
+            processing_name: Name of the processing list
+            timeout: Seconds to block waiting for a task
+            block: False to return immediately when the queue is empty
+        Returns:
+            (raw task, decoded task) or None if the queue stayed empty
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            if block:
+                raw_task = self.redis_client.blmove(queue_name, processing_name, timeout, "RIGHT", "LEFT")
+            else:
+                raw_task = self.redis_client.lmove(queue_name, processing_name, "RIGHT", "LEFT")
+            if raw_task:
+                return raw_task, json.loads(raw_task)
+            return None
+        except Exception as e:
+            logger.error(f"Error reserving from queue {queue_name}: {str(e)}")
+            return None
+    
+    def ack_from_processing(self, processing_name: str, raw_task: Union[str, bytes]) -> bool:
+        """Remove a reserved task from its processing list once handled"""
+        if not self.is_available():
+            return False
+        
+        try:
+            return bool(self.redis_client.lrem(processing_name, 1, raw_task))
+        except Exception as e:
+            logger.error(f"Error acknowledging task in {processing_name}: {str(e)}")
+            return False
+    
     # Health check
     def health_check(self) -> Dict[str, Any]:
         """Check Redis health"""
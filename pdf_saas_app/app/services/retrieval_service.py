@@ -0,0 +1,133 @@
+import hashlib
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+import openai
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core import retrieval
+from app.core.pdf_operations import TEXT_EXTRACTOR_VERSION
+from app.db.models import Document
+from app.services.disk_cache_service import DiskCacheService
+from app.services.llm_service import request_with_retries
+from app.services.text_store_service import text_store_service
+
+logger = logging.getLogger(__name__)
+
+class RetrievalService:
+    """
+    Embedding retrieval for document chat.
+
+    A document's stored page text is split into page-tagged chunks and embedded
+    once, in batches of EMBEDDING_BATCH_SIZE. The vectors are kept as a NumPy
+    matrix in a disk cache keyed by content hash, so every document with the
+    same content shares one index and unused indexes age out with LRU eviction.
+    A question then costs one embedding call and a matrix product, and only the
+    RETRIEVAL_TOP_K best chunks are sent to the model.
+    """
+
+    def __init__(self, client: Optional[Any] = None):
+        self._client = client
+        self.cache = DiskCacheService(settings.EMBEDDING_INDEX_DIR, settings.EMBEDDING_INDEX_MAX_BYTES)
+
+    @property
+    def client(self) -> Any:
+        # Created on first use; anything with the embeddings.create interface can be passed instead
+        if self._client is None:
+            self._client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._client
+
+    @staticmethod
+    def cache_key(file_hash: str) -> str:
+        key_data = (f"{file_hash}:{TEXT_EXTRACTOR_VERSION}:{settings.EMBEDDING_MODEL}:"
+                    f"{settings.RETRIEVAL_CHUNK_CHARS}:{settings.RETRIEVAL_CHUNK_OVERLAP}")
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Normalized embeddings of texts, one row each, requested EMBEDDING_BATCH_SIZE at a time
+        Requests share the chat calls' concurrency cap and 429 retries (see request_with_retries).
+        """
+        if not texts:
+            # Nothing to embed (blank or whitespace-only text): an empty index
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = []
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        for start in range(0, len(texts), batch_size):
+            response = request_with_retries(
+                self.client.embeddings.create, model=settings.EMBEDDING_MODEL, input=texts[start:start + batch_size]
+            )
+            # Items carry the position of their input; do not rely on response order
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return retrieval.normalize(np.array(vectors, dtype=np.float32).reshape(len(vectors), -1))
+
+    def build_index(self, pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chunk and embed page texts: {"model", "chunks": [{"page", "text"}], "vectors"}"""
+        chunks = retrieval.chunk_pages(pages, settings.RETRIEVAL_CHUNK_CHARS, settings.RETRIEVAL_CHUNK_OVERLAP)
+        vectors = self.embed([chunk["text"] for chunk in chunks])
+        logger.info(f"Embedded {len(chunks)} chunks from {len(pages)} pages")
+        return {"model": settings.EMBEDDING_MODEL, "chunks": chunks, "vectors": vectors}
+
+    def _load_pages(self, db: Session, document: Document, text: Optional[str] = None) -> List[Dict[str, Any]]:
+        stored = text_store_service.get_pages(db, document.file_hash)
+        if stored is None:
+            # Extracts and stores the pages on first use, unless the caller already did
+            if text is None:
+                text = text_store_service.get_document_text(db, document)
+            stored = text_store_service.get_pages(db, document.file_hash)
+            if stored is None:
+                # No content hash, so nothing was stored: use the text as a single page
+                return [{"page": 1, "text": text or ""}]
+        return [{"page": page.page_number, "text": page.text} for page in stored]
+
+    def get_index(self, db: Session, document: Document, text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Vector index of a document, built and cached on a miss
+        Concurrent misses for the same content share one build.
+        Args:
+            text: The document's text, if the caller has already extracted it
+        Raises:
+            FileNotFoundError: The text is not stored yet and the file is gone from storage
+        """
+        if not document.file_hash:
+            return self.build_index(self._load_pages(db, document, text))
+
+        def build(path: str) -> None:
+            index = self.build_index(self._load_pages(db, document, text))
+            with open(path, "wb") as f:
+                f.write(retrieval.dump_index(index["model"], index["chunks"], index["vectors"]))
+        return retrieval.load_index(self.cache.get_or_fetch(self.cache_key(document.file_hash), ".npz", build))
+
+    def search(self, index: Dict[str, Any], query: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Chunks most similar to query, best first: [{"chunk", "page", "text", "score"}]"""
+        if not index["chunks"]:
+            return []
+        query_vector = self.embed([query])[0]
+        return [
+            dict(index["chunks"][i], chunk=i, score=round(score, 4))
+            for i, score in retrieval.top_k(index["vectors"], query_vector, k or settings.RETRIEVAL_TOP_K)
+        ]
+
+    def get_context(self, db: Session, document: Document, query: str, k: Optional[int] = None,
+                    text: Optional[str] = None) -> Optional[str]:
+        """
+        The passages of a document most relevant to query, in reading order, as prompt context
+        Pass text when it was already extracted, so building the index never runs extraction.
+        Returns None if the document has no text.
+        """
+        matches = self.search(self.get_index(db, document, text), query, k)
+        if not matches:
+            return None
+        matches.sort(key=lambda match: match["chunk"])
+        return "\n\n".join(f"[Page {match['page']}]\n{match['text']}" for match in matches)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        stats["enabled"] = True
+        stats["model"] = settings.EMBEDDING_MODEL
+        return stats
+
+# Global retrieval instance
+retrieval_service = RetrievalService()
@@ -1,10 +1,121 @@
 import os
+import base64
 import shutil
 import uuid
-from typing import BinaryIO, Optional
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
 import boto3
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, BlobBlock
 from app.config import settings
+from app.services.disk_cache_service import disk_cache_service
+
+class LocalStorageWriter:
+    """Incremental writer for local storage; the file appears under its final name only on close"""
+
+    def __init__(self, unique_filename: str):
+        os.makedirs(settings.LOCAL_STORAGE_PATH, exist_ok=True)
+        self.relative_path = unique_filename
+        self.destination_path = os.path.join(settings.LOCAL_STORAGE_PATH, unique_filename)
+        self.part_path = f"{self.destination_path}.part"
+        self._file = open(self.part_path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def close(self) -> str:
+        self._file.close()
+        os.replace(self.part_path, self.destination_path)
+        return self.relative_path.replace("\\", "/")
+
+    def abort(self) -> None:
+        self._file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+class S3StorageWriter:
+    """
+    Incremental writer for S3 using a multipart upload.
+    Parts are sent as soon as S3_MULTIPART_PART_SIZE bytes are buffered, so the
+    upload to S3 overlaps with receiving the file. Small files use a single PUT.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, key: str):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.upload_id: Optional[str] = None
+        self.parts = []
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= settings.S3_MULTIPART_PART_SIZE:
+            part = bytes(self._buffer[:settings.S3_MULTIPART_PART_SIZE])
+            del self._buffer[:settings.S3_MULTIPART_PART_SIZE]
+            self._upload_part(part)
+
+    def _upload_part(self, data: bytes) -> None:
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=self.key)["UploadId"]
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def close(self) -> str:
+        if self.upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=self.key, Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                # The last part may be smaller than the minimum part size
+                self._upload_part(bytes(self._buffer))
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts}
+            )
+        self._buffer = bytearray()
+        return f"https://{self.bucket_name}.s3.amazonaws.com/{self.key}"
+
+    def abort(self) -> None:
+        self._buffer = bytearray()
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id)
+
+class AzureStorageWriter:
+    """Incremental writer for Azure Blob Storage using staged blocks committed on close"""
+
+    def __init__(self, blob_client):
+        self.blob_client = blob_client
+        self.block_ids = []
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        if len(self._buffer) >= settings.AZURE_BLOCK_SIZE:
+            self._stage_block()
+
+    def _stage_block(self) -> None:
+        block_id = base64.b64encode(f"{len(self.block_ids):08d}".encode()).decode()
+        self.blob_client.stage_block(block_id=block_id, data=bytes(self._buffer))
+        self.block_ids.append(block_id)
+        self._buffer = bytearray()
+
+    def close(self) -> str:
+        if self._buffer or not self.block_ids:
+            self._stage_block()
+        self.blob_client.commit_block_list([BlobBlock(block_id=block_id) for block_id in self.block_ids])
+        return self.blob_client.url
+
+    def abort(self) -> None:
+        # Uncommitted blocks are garbage collected by Azure
+        self._buffer = bytearray()
 
 class StorageService:
     """Service for handling file storage operations"""
@@ -32,15 +143,17 @@ class StorageService:
         filename, extension = os.path.splitext(original_filename)
         return f"{filename}_{str(uuid.uuid4())}{extension}"
     
-    def upload_file(self, file_path: str, original_filename: str) -> str:
+    def upload_file(self, file_path: str, original_filename: str, object_name: Optional[str] = None) -> str:
         """
         Upload a file to the configured storage
+        Args:
+            object_name: Exact name to store under (e.g. a content address) instead of a unique name
         Returns: URL or path of the uploaded file
         """
-        unique_filename = self._get_unique_filename(original_filename)
+        unique_filename = object_name or self._get_unique_filename(original_filename)
         
         print(f"Storage service - storage_type: {self.storage_type}")
-        print(f"Storage service - bucket_name: {self.bucket_name}")
+        print(f"Storage service - bucket_name: {getattr(self, 'bucket_name', None)}")
         print(f"Storage service - uploading file: {file_path} as {unique_filename}")
         
         if self.storage_type == "s3":
@@ -83,6 +196,58 @@ class StorageService:
             relative_path = os.path.relpath(destination_path, settings.LOCAL_STORAGE_PATH)
             return relative_path.replace("\\", "/")
     
+    def open_writer(self, original_filename: str):
+        """
+        Open an incremental writer for a new object
+        The writer exposes write(bytes), close() -> URL or path of the stored file, and abort().
+        """
+        unique_filename = self._get_unique_filename(original_filename)
+        if self.storage_type == "s3":
+            return S3StorageWriter(self.s3_client, self.bucket_name, unique_filename)
+        elif self.storage_type == "azure":
+            return AzureStorageWriter(self.blob_service_client.get_blob_client(
+                container=self.container_name,
+                blob=unique_filename
+            ))
+        return LocalStorageWriter(unique_filename)
+    
+    def store_local_file(self, file_path: str, original_filename: str) -> str:
+        """
+        Store a local file, moving it into place when storage is local
+        For S3/Azure the file is uploaded and left where it is.
+        Returns: URL or path of the stored file
+        """
+        if self.storage_type != "local":
+            return self.upload_file(file_path, original_filename)
+        unique_filename = self._get_unique_filename(original_filename)
+        os.makedirs(settings.LOCAL_STORAGE_PATH, exist_ok=True)
+        shutil.move(file_path, os.path.join(settings.LOCAL_STORAGE_PATH, unique_filename))
+        return unique_filename
+    
+    # S3 multipart primitives for uploads that span several requests
+    def create_multipart_upload(self, original_filename: str) -> Tuple[str, str]:
+        """Start an S3 multipart upload; returns (key, upload id)"""
+        key = self._get_unique_filename(original_filename)
+        upload_id = self.s3_client.create_multipart_upload(Bucket=self.bucket_name, Key=key)["UploadId"]
+        return key, upload_id
+    
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Upload one part; returns its ETag"""
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+        )
+        return response["ETag"]
+    
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]]) -> str:
+        """Complete a multipart upload; returns the object URL"""
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+        return f"https://{self.bucket_name}.s3.amazonaws.com/{key}"
+    
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+    
     def upload_file_object(self, file_object: BinaryIO, original_filename: str) -> str:
         """
         Upload a file-like object to the configured storage
@@ -126,77 +291,178 @@ class StorageService:
             # Return the normalized path with forward slashes
             return destination_path.replace("\\", "/")
     
-    def get_file(self, file_identifier: str) -> str:
+    def _local_path(self, file_identifier: str) -> str:
+        """Resolve a local storage identifier to an absolute, normalized path"""
+        # Convert to absolute path if it's relative
+        if not os.path.isabs(file_identifier):
+            file_identifier = os.path.join(settings.LOCAL_STORAGE_PATH, file_identifier)
+        return str(os.path.normpath(file_identifier))
+
+    def _s3_key(self, file_identifier: str) -> str:
+        # Parse the S3 URL to get the key
+        return file_identifier.split(f"https://{self.bucket_name}.s3.amazonaws.com/")[1]
+
+    def _blob_client(self, file_identifier: str):
+        # Get blob name from URL
+        return self.blob_service_client.get_blob_client(
+            container=self.container_name,
+            blob=os.path.basename(file_identifier)
+        )
+
+    def get_file(self, file_identifier: str, file_hash: Optional[str] = None) -> str:
         """
         Get a file from storage
         For local storage: returns the path
-        For S3/Azure: downloads to a temp location and returns that path
+        For S3/Azure: returns a path in the local read-through cache, downloading on a miss.
+        Pass the document's file_hash when known so identical content shares one cache entry.
+        The returned path is shared; callers must not modify or delete it. A cached copy is only
+        kept from eviction for STORAGE_CACHE_MIN_AGE_SECONDS; use acquire_file or local_file
+        to hold it for longer.
         """
         if self.storage_type == "local":
             # For local storage, file_identifier is the path
-            # Convert to absolute path if it's relative
-            if not os.path.isabs(file_identifier):
-                file_identifier = os.path.join(settings.LOCAL_STORAGE_PATH, file_identifier)
-            
-            # Normalize the path
-            file_identifier = os.path.normpath(file_identifier)
+            file_identifier = self._local_path(file_identifier)
             
             if os.path.exists(file_identifier):
-                # Ensure we return a string path, not a Path object
-                return str(file_identifier)
+                return file_identifier
             else:
                 raise FileNotFoundError(f"File not found: {file_identifier}")
         
-        # For S3 and Azure, we need to download the file
-        temp_dir = os.path.join(os.getcwd(), "temp")
-        os.makedirs(temp_dir, exist_ok=True)
+        extension = os.path.splitext(file_identifier)[1]
+        if not settings.STORAGE_CACHE_ENABLED:
+            # Unique name so concurrent downloads never overwrite each other
+            temp_dir = os.path.join(os.getcwd(), "temp")
+            os.makedirs(temp_dir, exist_ok=True)
+            temp_path = os.path.join(temp_dir, f"{uuid.uuid4()}{extension}")
+            self._download(file_identifier, temp_path)
+            return temp_path
+        
+        key = disk_cache_service.key_for(file_identifier, file_hash)
+        return disk_cache_service.get_or_fetch(
+            key, extension, lambda temp_path: self._download(file_identifier, temp_path)
+        )
+    
+    def acquire_file(self, file_identifier: str, file_hash: Optional[str] = None) -> str:
+        """
+        Get a local copy of a stored file that stays available until release_file(path)
+        Like get_file, but a cached S3/Azure copy is leased so eviction cannot remove it
+        while it is in use. Every acquire_file needs its own release_file.
+        """
+        if self.storage_type == "local" or not settings.STORAGE_CACHE_ENABLED:
+            return self.get_file(file_identifier, file_hash)
+        key = disk_cache_service.key_for(file_identifier, file_hash)
+        return disk_cache_service.acquire(
+            key, os.path.splitext(file_identifier)[1], lambda temp_path: self._download(file_identifier, temp_path)
+        )
+    
+    def release_file(self, local_path: str) -> None:
+        """Release a path returned by acquire_file"""
+        if self.storage_type == "local":
+            return
+        if settings.STORAGE_CACHE_ENABLED:
+            disk_cache_service.release(local_path)
+        elif os.path.exists(local_path):
+            # Private download made because the cache is off
+            os.remove(local_path)
+    
+    @contextmanager
+    def local_file(self, file_identifier: str, file_hash: Optional[str] = None) -> Iterator[str]:
+        """Local copy of a stored file for the duration of the block (see acquire_file)"""
+        local_path = self.acquire_file(file_identifier, file_hash)
+        try:
+            yield local_path
+        finally:
+            self.release_file(local_path)
+    
+    def _download(self, file_identifier: str, destination_path: str) -> None:
+        """Download an S3/Azure object to a local path"""
+        if self.storage_type == "s3":
+            self.s3_client.download_file(self.bucket_name, self._s3_key(file_identifier), destination_path)
+        
+        elif self.storage_type == "azure":
+            with open(destination_path, "wb") as file:
+                # Write chunk by chunk instead of holding the whole blob in memory
+                for chunk in self._blob_client(file_identifier).download_blob().chunks():
+                    file.write(chunk)
+    
+    def get_file_size(self, file_identifier: str) -> int:
+        """
+        Get the size of a stored file in bytes without downloading it
+        Raises FileNotFoundError if the file does not exist.
+        """
+        if self.storage_type == "s3":
+            try:
+                head = self.s3_client.head_object(Bucket=self.bucket_name, Key=self._s3_key(file_identifier))
+            except self.s3_client.exceptions.ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    raise FileNotFoundError(f"File not found: {file_identifier}")
+                raise
+            return head["ContentLength"]
+        
+        elif self.storage_type == "azure":
+            from azure.core.exceptions import ResourceNotFoundError
+            try:
+                return self._blob_client(file_identifier).get_blob_properties().size
+            except ResourceNotFoundError:
+                raise FileNotFoundError(f"File not found: {file_identifier}")
         
-        filename = os.path.basename(file_identifier)
-        temp_path = os.path.join(temp_dir, filename)
+        path = self._local_path(file_identifier)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File not found: {path}")
+        return os.path.getsize(path)
+    
+    def iter_file(self, file_identifier: str, start: int = 0, end: Optional[int] = None,
+                  chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Stream a stored file (or the inclusive byte range start-end of it) in chunks
+        S3 and Azure bodies are piped through as they arrive; nothing is written to disk.
+        """
+        chunk_size = chunk_size or settings.DOWNLOAD_CHUNK_SIZE
         
         if self.storage_type == "s3":
-            # Parse the S3 URL to get the key
-            key = file_identifier.split(f"https://{self.bucket_name}.s3.amazonaws.com/")[1]
-            self.s3_client.download_file(self.bucket_name, key, temp_path)
+            byte_range = f"bytes={start}-{end if end is not None else ''}"
+            body = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=self._s3_key(file_identifier),
+                Range=byte_range
+            )["Body"]
+            try:
+                yield from body.iter_chunks(chunk_size)
+            finally:
+                body.close()
         
         elif self.storage_type == "azure":
-            # Get blob name from URL
-            blob_name = os.path.basename(file_identifier)
-            blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name, 
-                blob=blob_name
-            )
-            
-            with open(temp_path, "wb") as file:
-                download_stream = blob_client.download_blob()
-                file.write(download_stream.readall())
+            length = end - start + 1 if end is not None else None
+            yield from self._blob_client(file_identifier).download_blob(offset=start, length=length).chunks()
         
-        # Ensure we return a string path
-        return str(temp_path)
+        else:
+            with open(self._local_path(file_identifier), "rb") as file:
+                file.seek(start)
+                remaining = end - start + 1 if end is not None else None
+                while remaining is None or remaining > 0:
+                    chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
     
     def delete_file(self, file_identifier: str) -> bool:
         """Delete a file from storage"""
         try:
             if self.storage_type == "local":
-                if os.path.exists(file_identifier):
-                    os.remove(file_identifier)
-                    return True
-                return False
+                # A file that is already gone counts as deleted, as it does for S3
+                local_path = self._local_path(file_identifier)
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                return True
             
             elif self.storage_type == "s3":
-                # Parse the S3 URL to get the key
-                key = file_identifier.split(f"https://{self.bucket_name}.s3.amazonaws.com/")[1]
-                self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+                self.s3_client.delete_object(Bucket=self.bucket_name, Key=self._s3_key(file_identifier))
                 return True
             
             elif self.storage_type == "azure":
-                # Get blob name from URL
-                blob_name = os.path.basename(file_identifier)
-                blob_client = self.blob_service_client.get_blob_client(
-                    container=self.container_name, 
-                    blob=blob_name
-                )
-                blob_client.delete_blob()
+                self._blob_client(file_identifier).delete_blob()
                 return True
             
             return False
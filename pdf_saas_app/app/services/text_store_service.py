@@ -0,0 +1,188 @@
+import uuid
+from typing import Optional, List, Dict, Any
+from sqlalchemy.orm import Session
+import logging
+
+from app.db.models import Document, DocumentText
+from app.db.session import run_in_session
+from app.core.pdf_operations import PDFProcessor, TEXT_EXTRACTOR_VERSION
+from app.services.storage_service import StorageService
+from app.services.executor_service import executor_service
+
+logger = logging.getLogger(__name__)
+
+# Marks the version tag of pages whose extraction is still running (see begin_pages)
+PARTIAL_TAG = "+partial-"
+
+class TextStoreService:
+    """
+    Service for the derived-text store.
+
+    Extracted page text is persisted once per (file_hash, extractor version) and
+    shared by every document with the same content, so reads never re-run
+    extraction or OCR.
+    """
+
+    def __init__(self):
+        self.pdf_processor = PDFProcessor()
+        self.extractor_version = TEXT_EXTRACTOR_VERSION
+
+    def _query(self, db: Session, file_hash: str):
+        return db.query(DocumentText).filter(
+            DocumentText.file_hash == file_hash,
+            DocumentText.extractor_version == self.extractor_version
+        )
+
+    def has_text(self, db: Session, file_hash: Optional[str]) -> bool:
+        """Check whether text for this content hash is already stored"""
+        if not file_hash:
+            return False
+        return db.query(self._query(db, file_hash).exists()).scalar()
+
+    def get_pages(self, db: Session, file_hash: Optional[str]) -> Optional[List[DocumentText]]:
+        """
+        Get stored pages for a content hash, ordered by page number
+        Returns None if nothing is stored for the current extractor version
+        """
+        if not file_hash:
+            return None
+        pages = self._query(db, file_hash).order_by(DocumentText.page_number).all()
+        return pages or None
+
+    def get_text(self, db: Session, file_hash: Optional[str]) -> Optional[str]:
+        """Get the full stored text for a content hash"""
+        pages = self.get_pages(db, file_hash)
+        if pages is None:
+            return None
+        return "".join(page.text or "" for page in pages)
+
+    def store_pages(self, db: Session, file_hash: str, pages: List[Dict[str, Any]]) -> None:
+        """
+        Persist extracted pages for a content hash
+        Args:
+            file_hash: SHA256 of the source file
+            pages: List of {"page", "text", "ocr"} dicts as returned by PDFProcessor.extract_pages
+        """
+        # Replace anything stored for this hash, including rows from older extractor versions
+        self._published(db, file_hash).delete(synchronize_session=False)
+        db.add_all(self._rows(file_hash, pages, self.extractor_version))
+        db.commit()
+
+    def _published(self, db: Session, file_hash: str):
+        # Every row of the hash except the batches of extractions still running
+        return db.query(DocumentText).filter(
+            DocumentText.file_hash == file_hash,
+            ~DocumentText.extractor_version.contains(PARTIAL_TAG)
+        )
+
+    def _rows(self, file_hash: str, pages: List[Dict[str, Any]], version: str) -> List[DocumentText]:
+        return [
+            DocumentText(
+                file_hash=file_hash,
+                extractor_version=version,
+                page_number=page["page"],
+                text=page["text"],
+                is_ocr=page.get("ocr", False)
+            )
+            for page in pages
+        ]
+
+    def begin_pages(self) -> str:
+        """
+        Start persisting an extraction in batches: begin_pages, append_pages per batch, then
+        finish_pages (or abort_pages). Returns the run's version tag, which the other calls take.
+        Pages are hidden from reads until finish_pages. Each run writes under a tag of its own,
+        so concurrent extractions of the same content never touch each other's pages.
+        """
+        return f"{self.extractor_version}{PARTIAL_TAG}{uuid.uuid4().hex}"
+
+    def append_pages(self, db: Session, file_hash: str, run: str, pages: List[Dict[str, Any]]) -> None:
+        """Persist a batch of pages of the run started with begin_pages"""
+        if pages:
+            db.add_all(self._rows(file_hash, pages, run))
+            db.commit()
+
+    def finish_pages(self, db: Session, file_hash: str, run: str) -> None:
+        """Publish the pages of a run, replacing anything stored before"""
+        self._published(db, file_hash).delete(synchronize_session=False)
+        db.query(DocumentText).filter(
+            DocumentText.file_hash == file_hash,
+            DocumentText.extractor_version == run
+        ).update({DocumentText.extractor_version: self.extractor_version}, synchronize_session=False)
+        db.commit()
+
+    def abort_pages(self, db: Session, file_hash: str, run: str) -> None:
+        """Drop the pages of a run that will not finish"""
+        db.query(DocumentText).filter(
+            DocumentText.file_hash == file_hash,
+            DocumentText.extractor_version == run
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    def extract_and_store(self, db: Session, file_hash: Optional[str], local_file_path: str) -> str:
+        """
+        Get text for a local file, reading from the store when possible
+        Extracts and persists the pages on a miss.
+        """
+        text = self.get_text(db, file_hash)
+        if text is not None:
+            return text
+
+        pages = self.pdf_processor.extract_pages(local_file_path)
+        if file_hash:
+            try:
+                self.store_pages(db, file_hash, pages)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Could not persist extracted text for {file_hash}: {str(e)}")
+        return "".join(page["text"] for page in pages)
+
+    def get_document_text(self, db: Session, document: Document) -> Optional[str]:
+        """Read-through text lookup for a document"""
+        return self.get_file_text(db, document.file_path, document.file_hash)
+
+    def get_file_text(self, db: Session, file_path: str, file_hash: Optional[str]) -> Optional[str]:
+        """Read-through text lookup for a stored file"""
+        text = self.get_text(db, file_hash)
+        if text is not None:
+            return text
+
+        # OCR reopens the file for every page, so keep the local copy leased throughout
+        with StorageService().local_file(file_path, file_hash) as local_file_path:
+            return self.extract_and_store(db, file_hash, local_file_path)
+
+    async def load_document_text(self, document: Document) -> Optional[str]:
+        """
+        get_document_text for async endpoints
+        The stored-text read runs as a "text" operation, so it never queues behind OCR;
+        only a miss takes an "ocr" slot. Both run on sessions of their own.
+        Raises:
+            FileNotFoundError: The text is not stored and the file is gone from storage
+        """
+        file_path, file_hash = document.file_path, document.file_hash
+        text = await executor_service.run_in_thread("text", run_in_session, self.get_text, file_hash)
+        if text is not None:
+            return text
+        return await executor_service.run_in_thread("ocr", run_in_session, self.get_file_text, file_path, file_hash)
+
+    def invalidate(self, db: Session, file_hash: Optional[str]) -> int:
+        """Delete all stored text for a content hash"""
+        if not file_hash:
+            return 0
+        deleted = db.query(DocumentText).filter(DocumentText.file_hash == file_hash).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    def release(self, db: Session, file_hash: Optional[str]) -> None:
+        """Drop stored text once no document references the content hash anymore"""
+        if not file_hash:
+            return
+        still_referenced = db.query(
+            db.query(Document).filter(Document.file_hash == file_hash).exists()
+        ).scalar()
+        if not still_referenced:
+            deleted = self.invalidate(db, file_hash)
+            logger.info(f"Released {deleted} stored text pages for {file_hash}")
+
+# Global text store instance
+text_store_service = TextStoreService()
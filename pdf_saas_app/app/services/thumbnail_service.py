@@ -0,0 +1,182 @@
+import hashlib
+import json
+from typing import Optional, Dict, Any, Callable
+import logging
+
+from app.config import settings
+from app.core import sprites
+from app.core.pdf_operations import PDFProcessor, PROCESSOR_VERSION
+from app.db.models import Document
+from app.services.disk_cache_service import DiskCacheService
+from app.services.executor_service import executor_service
+from app.services.job_service import job_service, JOB_PRIORITY_LOW
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+class ThumbnailService:
+    """
+    Page thumbnails at the standard THUMBNAIL_SIZES, rendered on first request.
+
+    Thumbnails are cached on disk by (content, page, size), so a page grid or a
+    document shared by many users renders each page once. The cache key doubles
+    as the ETag: it only changes when the content, the size or the renderer does.
+
+    For page strips, thumbnails are also packed into sprites: vertical JPEG strips
+    of THUMBNAIL_SPRITE_PAGES pages described by a JSON manifest. Uploads queue a
+    low-priority job that renders all of them ahead of time, so opening a
+    document's strip is a cache read; missing sprites are rendered on demand.
+    """
+
+    def __init__(self):
+        self.pdf_processor = PDFProcessor()
+        self.cache = DiskCacheService(settings.THUMBNAIL_CACHE_DIR, settings.THUMBNAIL_CACHE_MAX_BYTES)
+
+    @staticmethod
+    def get_pixels(size: str) -> int:
+        """Longer side in pixels of a named size"""
+        if size not in settings.THUMBNAIL_SIZES:
+            raise ValueError(f"Unknown thumbnail size '{size}', expected one of {', '.join(settings.THUMBNAIL_SIZES)}")
+        return settings.THUMBNAIL_SIZES[size]
+
+    def cache_key(self, document: Document, page_number: int, size: str) -> str:
+        source = DiskCacheService.key_for(document.file_path, document.file_hash)
+        key_data = f"{source}:{page_number}:{self.get_pixels(size)}:{settings.THUMBNAIL_JPEG_QUALITY}:{PROCESSOR_VERSION}"
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def sprite_cache_key(self, document: Document, size: str, sprite: str) -> str:
+        """Cache key of a sprite ("manifest" or its index) at a size"""
+        return self.cache_key(document, -1, size) + f"-sprite-{settings.THUMBNAIL_SPRITE_PAGES}-{sprite}"
+
+    def _read(self, key: str, extension: str) -> Optional[bytes]:
+        path = self.cache.lookup(key, extension)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted between the lookup and the read
+            return None
+
+    def _write(self, key: str, extension: str, content: bytes) -> None:
+        def write(path: str) -> None:
+            with open(path, "wb") as f:
+                f.write(content)
+        self.cache.get_or_fetch(key, extension, write)
+
+    def get_cached(self, document: Document, page_number: int, size: str) -> Optional[bytes]:
+        return self._read(self.cache_key(document, page_number, size), ".jpg")
+
+    async def get_thumbnail(self, document: Document, page_number: int, size: str) -> bytes:
+        """
+        JPEG thumbnail of a page, rendered and cached on a miss
+        Args:
+            page_number: 0-based page index
+            size: Name from THUMBNAIL_SIZES
+        Raises:
+            ValueError: Unknown size or page out of range
+            FileNotFoundError: The document's file is gone from storage
+        """
+        cached = self.get_cached(document, page_number, size)
+        if cached is not None:
+            return cached
+
+        storage_service = StorageService()
+        local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+        try:
+            thumbnail = await executor_service.run_in_process(
+                "preview", self.pdf_processor.render_thumbnail, local_file_path,
+                page_number, self.get_pixels(size), settings.THUMBNAIL_JPEG_QUALITY
+            )
+        finally:
+            storage_service.release_file(local_file_path)
+        await executor_service.run_in_thread("storage", self._write, self.cache_key(document, page_number, size), ".jpg", thumbnail)
+        return thumbnail
+
+    async def get_sprite_manifest(self, document: Document, size: str) -> Dict[str, Any]:
+        """Sprite layout of a document at a size (see sprites.sprite_layout), cached like the sprites"""
+        key = self.sprite_cache_key(document, size, "manifest")
+        cached = self._read(key, ".json")
+        if cached is not None:
+            return json.loads(cached)
+
+        storage_service = StorageService()
+        local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+        try:
+            manifest = await executor_service.run_in_thread(
+                "preview", sprites.sprite_layout, local_file_path, self.get_pixels(size), settings.THUMBNAIL_SPRITE_PAGES
+            )
+        finally:
+            storage_service.release_file(local_file_path)
+        await executor_service.run_in_thread("storage", self._write, key, ".json", json.dumps(manifest).encode())
+        return manifest
+
+    async def get_sprite(self, document: Document, index: int, size: str) -> bytes:
+        """
+        JPEG sprite strip, rendered and cached on a miss
+        Raises:
+            ValueError: Unknown size or sprite index out of range
+            FileNotFoundError: The document's file is gone from storage
+        """
+        key = self.sprite_cache_key(document, size, str(index))
+        cached = self._read(key, ".jpg")
+        if cached is not None:
+            return cached
+
+        manifest = await self.get_sprite_manifest(document, size)
+        if not 0 <= index < len(manifest["sprites"]):
+            raise ValueError(f"Sprite {index} is outside 0-{len(manifest['sprites']) - 1}")
+        storage_service = StorageService()
+        local_file_path = await executor_service.run_in_thread("storage", storage_service.acquire_file, document.file_path, document.file_hash)
+        try:
+            sprite = await executor_service.run_in_process(
+                "preview", sprites.render_sprite, local_file_path, manifest["sprites"][index]["pages"],
+                self.get_pixels(size), settings.THUMBNAIL_JPEG_QUALITY
+            )
+        finally:
+            storage_service.release_file(local_file_path)
+        await executor_service.run_in_thread("storage", self._write, key, ".jpg", sprite)
+        return sprite
+
+    def generate_sprites(self, document: Document, local_file_path: str, size: str,
+                         progress: Optional[Callable[[int, str], None]] = None) -> Dict[str, Any]:
+        """Render the manifest and every missing sprite of a document into the cache (worker side)"""
+        max_size = self.get_pixels(size)
+        manifest = sprites.sprite_layout(local_file_path, max_size, settings.THUMBNAIL_SPRITE_PAGES)
+        self._write(self.sprite_cache_key(document, size, "manifest"), ".json", json.dumps(manifest).encode())
+        rendered = 0
+        for sprite in manifest["sprites"]:
+            key = self.sprite_cache_key(document, size, str(sprite["index"]))
+            if self.cache.lookup(key, ".jpg") is None:
+                self._write(key, ".jpg", sprites.render_sprite(
+                    local_file_path, sprite["pages"], max_size, settings.THUMBNAIL_JPEG_QUALITY
+                ))
+                rendered += 1
+            if progress:
+                progress(int(100 * (sprite["index"] + 1) / len(manifest["sprites"])),
+                         f"Sprite {sprite['index'] + 1}/{len(manifest['sprites'])}")
+        return {"size": size, "page_count": manifest["page_count"], "sprites": len(manifest["sprites"]), "rendered": rendered}
+
+    def schedule_sprites(self, document: Document) -> Optional[str]:
+        """Queue low-priority sprite generation for a newly uploaded PDF; returns the job id, if queued"""
+        if not settings.THUMBNAIL_PREGENERATE or not job_service.is_available():
+            return None
+        try:
+            job = job_service.create_job(
+                "thumbnails", document.id, document.owner_id,
+                {"size": settings.THUMBNAIL_PREGENERATE_SIZE}, priority=JOB_PRIORITY_LOW
+            )
+            return job["id"]
+        except Exception as e:
+            logger.warning(f"Could not queue thumbnail generation for {document.id}: {str(e)}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        stats["enabled"] = True
+        stats["sizes"] = settings.THUMBNAIL_SIZES
+        return stats
+
+# Global thumbnail instance
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,239 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+import logging
+
+from app.config import settings
+from app.db.models import UploadSession
+from app.services.ingest_service import SNIFF_BYTES, build_ingest_result, check_file_type
+from app.services.storage_service import StorageService
+from app.utils.file_utils import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_STATUS_ACTIVE = "active"
+UPLOAD_STATUS_COMPLETED = "completed"
+UPLOAD_STATUS_ABORTED = "aborted"
+
+class UploadOffsetError(ValueError):
+    """Chunk does not start where the session currently ends"""
+
+    def __init__(self, expected_offset: int):
+        super().__init__(f"Chunk must start at offset {expected_offset}")
+        self.expected_offset = expected_offset
+
+class UploadSessionService:
+    """
+    Service for resumable chunked uploads.
+
+    Chunks are appended in order to a staging file; the client resumes from the
+    session's received_bytes after a dropped connection. The SHA-256 is updated as
+    bytes arrive, so finalize can dedup without reading the file again (it is only
+    re-read if the session moved to another process). With S3 storage every full
+    S3_MULTIPART_PART_SIZE of staged data is pushed as a multipart part straight away,
+    so finalize only sends the tail.
+    """
+
+    def __init__(self):
+        self.staging_dir = os.path.abspath(settings.UPLOAD_STAGING_DIR)
+        # session id -> (hasher, bytes hashed); process-local
+        self._hashers: Dict[str, Tuple[Any, int]] = {}
+        self._hashers_lock = threading.Lock()
+        self._write_locks: Dict[str, threading.Lock] = {}
+
+    def create_session(self, db: Session, owner_id: str, filename: str,
+                       total_size: Optional[int] = None, mime_type: Optional[str] = None) -> UploadSession:
+        """Start a new upload session"""
+        if total_size is not None and total_size > settings.UPLOAD_MAX_SIZE:
+            raise ValueError(f"File exceeds the maximum upload size of {settings.UPLOAD_MAX_SIZE} bytes")
+        self.cleanup_expired(db)
+
+        os.makedirs(self.staging_dir, exist_ok=True)
+        upload = UploadSession(
+            owner_id=owner_id,
+            filename=os.path.basename(filename),
+            mime_type=mime_type,
+            total_size=total_size,
+            received_bytes=0,
+            status=UPLOAD_STATUS_ACTIVE,
+            staging_path="",
+            storage_uploaded_bytes=0,
+            expires_at=datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+        )
+        db.add(upload)
+        db.flush()
+        upload.staging_path = os.path.join(self.staging_dir, f"{upload.id}.part")
+        open(upload.staging_path, "wb").close()
+        with self._hashers_lock:
+            self._hashers[upload.id] = (hashlib.sha256(), 0)
+        db.commit()
+        db.refresh(upload)
+        return upload
+
+    def get_session(self, db: Session, upload_id: str, owner_id: str) -> Optional[UploadSession]:
+        return db.query(UploadSession).filter(
+            UploadSession.id == upload_id,
+            UploadSession.owner_id == owner_id
+        ).first()
+
+    def write_lock(self, upload_id: str) -> threading.Lock:
+        """Lock held while a chunk is being written, so two requests in this process cannot interleave"""
+        with self._hashers_lock:
+            return self._write_locks.setdefault(upload_id, threading.Lock())
+
+    def lock_row(self, db: Session, upload: UploadSession) -> bool:
+        """
+        Lock the session's row until db commits, so requests in other processes cannot interleave
+        Reloads the session, so check_offset sees the latest received_bytes.
+        Returns False, without waiting, if another transaction holds the row.
+        """
+        try:
+            db.query(UploadSession).filter(UploadSession.id == upload.id).with_for_update(nowait=True).populate_existing().one()
+        except OperationalError:
+            db.rollback()
+            return False
+        return True
+
+    def check_offset(self, upload: UploadSession, offset: int) -> None:
+        """
+        Validate that a chunk may be written at offset
+        Raises:
+            ValueError: The session is no longer accepting data
+            UploadOffsetError: offset is not where the staged data ends
+        """
+        if upload.status != UPLOAD_STATUS_ACTIVE:
+            raise ValueError(f"Upload session is {upload.status}")
+        if offset != upload.received_bytes:
+            raise UploadOffsetError(upload.received_bytes)
+
+    def append(self, upload: UploadSession, data: bytes) -> None:
+        """
+        Append data at the end of the staged file (blocking; caller commits the session)
+        Raises ValueError if the declared or maximum size would be exceeded.
+        """
+        new_size = upload.received_bytes + len(data)
+        limit = upload.total_size if upload.total_size is not None else settings.UPLOAD_MAX_SIZE
+        if new_size > limit:
+            raise ValueError(f"Upload exceeds {limit} bytes")
+
+        with open(upload.staging_path, "r+b") as staging:
+            # Drop anything past the acknowledged offset (e.g. from a chunk cut off mid-write)
+            staging.seek(upload.received_bytes)
+            staging.truncate()
+            staging.write(data)
+
+        with self._hashers_lock:
+            hasher, hashed = self._hashers.get(upload.id, (None, -1))
+            if hasher is not None and hashed == upload.received_bytes:
+                hasher.update(data)
+                self._hashers[upload.id] = (hasher, new_size)
+            else:
+                # Session handled by another process before; finalize re-hashes the staged file
+                self._hashers.pop(upload.id, None)
+        upload.received_bytes = new_size
+        upload.updated_at = datetime.utcnow()
+
+        if settings.STORAGE_TYPE == "s3":
+            self._push_s3_parts(upload)
+
+    def _push_s3_parts(self, upload: UploadSession, final: bool = False) -> None:
+        """Upload complete parts (or, on finalize, the tail) of the staged file to S3"""
+        storage_service = StorageService()
+        part_size = settings.S3_MULTIPART_PART_SIZE
+        parts = json.loads(upload.storage_parts or "[]")
+        while True:
+            pending = upload.received_bytes - upload.storage_uploaded_bytes
+            if pending <= 0 or (pending < part_size and not final):
+                break
+            if upload.storage_upload_id is None:
+                upload.storage_key, upload.storage_upload_id = storage_service.create_multipart_upload(upload.filename)
+            length = min(part_size, pending)
+            with open(upload.staging_path, "rb") as staging:
+                staging.seek(upload.storage_uploaded_bytes)
+                data = staging.read(length)
+            part_number = len(parts) + 1
+            etag = storage_service.upload_part(upload.storage_key, upload.storage_upload_id, part_number, data)
+            parts.append({"ETag": etag, "PartNumber": part_number})
+            upload.storage_uploaded_bytes += length
+        upload.storage_parts = json.dumps(parts)
+
+    def finalize(self, db: Session, upload: UploadSession) -> Dict[str, Any]:
+        """
+        Complete an upload: hash (incremental, or re-read as fallback), store and describe it
+        Returns the ingest result dict (see build_ingest_result); the session is marked completed.
+        Raises ValueError if the session is not active, empty or its content does not match the extension.
+        """
+        if upload.status != UPLOAD_STATUS_ACTIVE:
+            raise ValueError(f"Upload session is {upload.status}")
+        if upload.received_bytes == 0:
+            raise ValueError("No data uploaded")
+        if upload.total_size is not None and upload.received_bytes != upload.total_size:
+            raise UploadOffsetError(upload.received_bytes)
+
+        with self._hashers_lock:
+            hasher, hashed = self._hashers.pop(upload.id, (None, -1))
+            self._write_locks.pop(upload.id, None)
+        if hasher is not None and hashed == upload.received_bytes:
+            file_hash = hasher.hexdigest()
+        else:
+            logger.info(f"Re-hashing staged upload {upload.id} (hash state not in this process)")
+            file_hash = compute_file_hash(upload.staging_path)
+
+        with open(upload.staging_path, "rb") as staging:
+            head = staging.read(SNIFF_BYTES)
+        check_file_type(head, upload.filename)
+
+        storage_service = StorageService()
+        local_copy = None
+        if storage_service.storage_type == "s3" and upload.storage_upload_id is not None:
+            self._push_s3_parts(upload, final=True)
+            file_path = storage_service.complete_multipart_upload(
+                upload.storage_key, upload.storage_upload_id, json.loads(upload.storage_parts)
+            )
+            local_copy = upload.staging_path
+        else:
+            file_path = storage_service.store_local_file(upload.staging_path, upload.filename)
+            if storage_service.storage_type != "local":
+                local_copy = upload.staging_path
+
+        upload.status = UPLOAD_STATUS_COMPLETED
+        db.commit()
+        return build_ingest_result(
+            storage_service, file_path, file_hash, upload.received_bytes, head,
+            upload.filename, upload.mime_type, local_copy
+        )
+
+    def abort(self, db: Session, upload: UploadSession) -> None:
+        """Discard a session and everything staged for it"""
+        if upload.storage_upload_id is not None:
+            try:
+                StorageService().abort_multipart_upload(upload.storage_key, upload.storage_upload_id)
+            except Exception as e:
+                logger.warning(f"Could not abort multipart upload for session {upload.id}: {str(e)}")
+        if upload.staging_path and os.path.exists(upload.staging_path):
+            os.remove(upload.staging_path)
+        with self._hashers_lock:
+            self._hashers.pop(upload.id, None)
+            self._write_locks.pop(upload.id, None)
+        upload.status = UPLOAD_STATUS_ABORTED
+        db.commit()
+
+    def cleanup_expired(self, db: Session) -> int:
+        """Abort active sessions past their expiry"""
+        expired = db.query(UploadSession).filter(
+            UploadSession.status == UPLOAD_STATUS_ACTIVE,
+            UploadSession.expires_at < datetime.utcnow()
+        ).all()
+        for upload in expired:
+            self.abort(db, upload)
+        if expired:
+            logger.info(f"Aborted {len(expired)} expired upload sessions")
+        return len(expired)
+
+# Global upload session service instance
+upload_session_service = UploadSessionService()
@@ -0,0 +1,9 @@
+import hashlib
+
+def compute_file_hash(file_path: str) -> str:
+    """Compute the SHA256 hash of a file's contents (used for deduplication and derived-data keys)"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,171 @@
+import io
+import os
+import time
+import zipfile
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.db.models import Document
+from app.services.executor_service import executor_service
+from app.services.storage_service import StorageService
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=...` header into an inclusive (start, end)
+    Returns None when there is no usable range (serve the whole file); multi-range
+    requests are answered with the whole file too.
+    Raises:
+        ValueError: The range cannot be satisfied for a file of this size (416)
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split("-", 1))
+    try:
+        first_byte = int(first) if first else None
+        last_byte = int(last) if last else None
+    except ValueError:
+        # Malformed ranges are ignored, not rejected
+        return None
+
+    if first_byte is None:
+        # Suffix range: the last N bytes
+        if last_byte is None:
+            return None
+        if last_byte == 0:
+            raise ValueError(f"Empty suffix range {range_header}")
+        start, end = max(0, size - last_byte), size - 1
+    else:
+        start, end = first_byte, last_byte if last_byte is not None else size - 1
+        if last_byte is not None and last_byte < first_byte:
+            return None
+
+    if start >= size:
+        raise ValueError(f"Range {range_header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+def document_etag(document: Document) -> Optional[str]:
+    """Strong ETag from the content hash (None for legacy rows without one)"""
+    return f'"{document.file_hash}"' if document.file_hash else None
+
+def etag_matches(header: Optional[str], etag: Optional[str]) -> bool:
+    """Weak comparison as used by If-None-Match"""
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def content_disposition(filename: str, inline: bool = False) -> str:
+    disposition = "inline" if inline else "attachment"
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+async def stream_document(request: Request, document: Document, media_type: Optional[str] = None,
+                          inline: bool = False, storage_service: Optional[StorageService] = None) -> Response:
+    """
+    Stream a stored document to the client without staging it on disk or in memory.
+    Honours Range (206/416), If-None-Match (304) and If-Range; the ETag is the file hash.
+    Raises FileNotFoundError if the stored file is missing.
+    """
+    storage_service = storage_service or StorageService()
+    etag = document_etag(document)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache"
+    }
+    if etag:
+        headers["ETag"] = etag
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = await executor_service.run_in_thread("storage", storage_service.get_file_size, document.file_path)
+    headers["Content-Disposition"] = content_disposition(document.filename, inline)
+    media_type = media_type or document.mime_type or "application/octet-stream"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag:
+        # The client's partial copy is stale; send the whole current file
+        range_header = None
+
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            storage_service.iter_file(document.file_path),
+            media_type=media_type,
+            headers=headers
+        )
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        storage_service.iter_file(document.file_path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable target for zipfile; collects output until it is taken"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def stream_zip(entries: Iterable[Tuple[str, str]], remove_files: bool = False,
+               chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    Build a ZIP archive of (name in archive, local path) entries, yielding it as it is written
+    Entries are stored uncompressed (the intended inputs, images, are already compressed)
+    with zip64 records, so archives over 4 GB work. Entries are read as the iterable
+    produces them; with remove_files each local file is deleted once archived.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in entries:
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(os.path.getmtime(path))[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = os.path.getsize(path)
+            with open(path, "rb") as source, archive.open(info, "w", force_zip64=True) as target:
+                while True:
+                    block = source.read(chunk_size)
+                    if not block:
+                        break
+                    target.write(block)
+                    yield sink.take()
+            if remove_files:
+                os.remove(path)
+            data = sink.take()
+            if data:
+                yield data
+    # Central directory, written when the archive closes
+    yield sink.take()
@@ -0,0 +1,335 @@
+"""
+Background worker for long-running document jobs.
+
+Run with:
+    python -m app.worker
+"""
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.compression import DEFAULT_PROFILE, get_profile as get_compression_profile
+from app.core.pdf_operations import PDFProcessor
+from app.core.rasterizer import select_pages
+from app.db.models import Document
+from app.db.session import SessionLocal
+from app.services.blob_store_service import blob_store_service
+from app.services.job_service import job_service
+from app.services.operation_cache_service import operation_cache_service
+from app.services.redis_service import redis_service
+from app.services.storage_service import StorageService
+from app.services.text_store_service import text_store_service
+from app.services.thumbnail_service import thumbnail_service
+
+logger = logging.getLogger(__name__)
+
+pdf_processor = PDFProcessor()
+
+ProgressCallback = Callable[[int, str], None]
+
+class JobError(Exception):
+    """Raised by job handlers for failures that should be reported on the job"""
+
+def _load_document(db: Session, job: Dict[str, Any]) -> Document:
+    document = db.query(Document).filter(
+        Document.id == job["document_id"],
+        Document.owner_id == job["owner_id"]
+    ).first()
+    if not document:
+        raise JobError("Document not found")
+    return document
+
+def _store_output(db: Session, source: Document, output_path: str, filename: str,
+                  mime_type: str, file_type: str, conversion_type: str) -> Document:
+    """Store a job's output file in the blob store and record it as a new document"""
+    file_path, file_hash = blob_store_service.store_file(db, output_path, filename)
+    return _record_output(db, source, {
+        "file_path": file_path,
+        "file_hash": file_hash,
+        "file_size": os.path.getsize(output_path),
+        "filename": filename
+    }, mime_type, file_type, conversion_type)
+
+def _record_output(db: Session, source: Document, output: Dict[str, Any],
+                   mime_type: str, file_type: str, conversion_type: str, commit: bool = True) -> Document:
+    """
+    Record a stored output (file_path, file_hash, file_size, filename) as a new document
+    With commit=False the row is only flushed, so many outputs can share one transaction.
+    """
+    document = Document(
+        filename=output["filename"],
+        original_filename=output["filename"],
+        file_path=output["file_path"],
+        file_size=output["file_size"],
+        mime_type=mime_type,
+        file_type=file_type,
+        conversion_type=conversion_type,
+        owner_id=source.owner_id,
+        owner_email=source.owner_email,
+        file_hash=output["file_hash"]
+    )
+    db.add(document)
+    if commit:
+        db.commit()
+        db.refresh(document)
+    else:
+        db.flush()
+    return document
+
+def _document_result(document: Document) -> Dict[str, Any]:
+    return {
+        "document_id": document.id,
+        "filename": document.filename,
+        "download_url": f"/documents/{document.id}/download"
+    }
+
+def handle_compress(db: Session, job: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    source = _load_document(db, job)
+    filename = f"compressed_{source.filename}"
+    params = {"profile": job["params"].get("profile", DEFAULT_PROFILE), "quality": job["params"].get("quality")}
+    try:
+        get_compression_profile(params["profile"], params["quality"])
+    except ValueError as e:
+        raise JobError(str(e))
+    cached = operation_cache_service.get(db, source.file_hash, "compress", params)
+    if cached:
+        return _document_result(_record_output(db, source, {**cached[0], "filename": filename},
+                                               "application/pdf", "pdf", "compress"))
+    progress(10, "Compressing")
+    output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf').name
+    try:
+        with StorageService().local_file(source.file_path, source.file_hash) as local_file_path:
+            pdf_processor.compress_pdf(local_file_path, output_path, params["profile"], params["quality"])
+        progress(80, "Storing result")
+        document = _store_output(db, source, output_path, filename, "application/pdf", "pdf", "compress")
+        operation_cache_service.put(db, source.file_hash, "compress", params, [(document.file_hash, filename)])
+        db.commit()
+        return _document_result(document)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+def handle_ocr(db: Session, job: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    source = _load_document(db, job)
+    if text_store_service.has_text(db, source.file_hash):
+        return {"document_id": source.id, "page_count": len(text_store_service.get_pages(db, source.file_hash))}
+
+    pages = []
+    # OCR reopens the file for every page, so keep the local copy leased throughout
+    with StorageService().local_file(source.file_path, source.file_hash) as local_file_path:
+        page_count = pdf_processor.count_pages(local_file_path) or 1
+        for page in pdf_processor.iter_pages(local_file_path):
+            pages.append(page)
+            progress(int(90 * len(pages) / page_count), f"Extracted page {len(pages)}/{page_count}")
+    if source.file_hash:
+        text_store_service.store_pages(db, source.file_hash, pages)
+    return {
+        "document_id": source.id,
+        "page_count": len(pages),
+        "ocr_pages": sum(1 for page in pages if page["ocr"])
+    }
+
+def handle_office_to_pdf(db: Session, job: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    source = _load_document(db, job)
+    progress(10, "Converting with LibreOffice")
+    output_dir = tempfile.mkdtemp()
+    try:
+        output_path = os.path.join(output_dir, "converted.pdf")
+        with StorageService().local_file(source.file_path, source.file_hash) as local_file_path:
+            pdf_processor.convert_office_to_pdf(local_file_path, output_path)
+        progress(80, "Storing result")
+        filename = f"{os.path.splitext(source.filename)[0]}.pdf"
+        document = _store_output(db, source, output_path, filename, "application/pdf", "pdf",
+                                 f"{source.file_type or 'office'}_to_pdf")
+        return _document_result(document)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+def handle_to_epub(db: Session, job: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    source = _load_document(db, job)
+    filename = source.filename.rsplit(".", 1)[0] + ".epub"
+    cached = operation_cache_service.get(db, source.file_hash, "to_epub")
+    if cached:
+        return _document_result(_record_output(db, source, {**cached[0], "filename": filename},
+                                               "application/epub+zip", "epub", "pdf_to_epub"))
+    progress(10, "Converting to EPUB")
+    output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.epub').name
+    try:
+        with StorageService().local_file(source.file_path, source.file_hash) as local_file_path:
+            pdf_processor.pdf_to_epub(local_file_path, output_path)
+        progress(80, "Storing result")
+        document = _store_output(db, source, output_path, filename, "application/epub+zip", "epub", "pdf_to_epub")
+        operation_cache_service.put(db, source.file_hash, "to_epub", None, [(document.file_hash, filename)])
+        db.commit()
+        return _document_result(document)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+def handle_to_jpg(db: Session, job: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    source = _load_document(db, job)
+    params = {"dpi": job["params"].get("dpi", 200), "pages": job["params"].get("pages")}
+    cached = operation_cache_service.get(db, source.file_hash, "to_jpg", params)
+    # Objects uploaded so far, deleted again if the job fails before its records are committed
+    uploaded = []
+    try:
+        if cached:
+            images = cached
+        else:
+            storage_service = StorageService()
+            local_file_path = storage_service.acquire_file(source.file_path, source.file_hash)
+            output_dir = tempfile.mkdtemp()
+            try:
+                try:
+                    page_count = len(select_pages(params["pages"], pdf_processor.count_pages(local_file_path)))
+                except ValueError as e:
+                    raise JobError(str(e))
+                progress(10, "Rendering pages")
+                # Upload each page as soon as it is rendered; the records are written together below
+                pages = pdf_processor.iter_image_pages(local_file_path, output_dir, params["dpi"], page_range=params["pages"])
+                for page_number, img_path in pages:
+                    uploaded.append((page_number, blob_store_service.upload_object(img_path, os.path.basename(img_path))))
+                    os.remove(img_path)
+                    progress(10 + int(85 * len(uploaded) / max(page_count, 1)), f"Stored page {len(uploaded)}/{page_count}")
+            finally:
+                storage_service.release_file(local_file_path)
+                shutil.rmtree(output_dir, ignore_errors=True)
+            if not uploaded:
+                raise JobError("No images were generated from the PDF")
+            images = [image for _, image in sorted(uploaded, key=lambda item: item[0])]
+            for image in images:
+                image["file_path"] = blob_store_service.adopt_stored(db, image["file_hash"], image["file_path"], image["file_size"])
+            operation_cache_service.put(db, source.file_hash, "to_jpg", params,
+                                        [(image["file_hash"], image["filename"]) for image in images])
+
+        documents = [_record_output(db, source, image, "image/jpeg", "jpg", "pdf_to_jpg", commit=False) for image in images]
+        results = [_document_result(document) for document in documents]
+        db.commit()
+    except Exception:
+        if uploaded:
+            db.rollback()
+            try:
+                blob_store_service.discard_uploaded(db, [image for _, image in uploaded])
+            except Exception as e:
+                logger.warning(f"Could not clean up page images of job {job['id']}: {str(e)}")
+        raise
+    return {
+        "documents": results,
+        "page_count": len(documents)
+    }
+
+def handle_thumbnails(db: Session, job: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    source = _load_document(db, job)
+    size = job["params"].get("size", settings.THUMBNAIL_PREGENERATE_SIZE)
+    try:
+        thumbnail_service.get_pixels(size)
+    except ValueError as e:
+        raise JobError(str(e))
+    with StorageService().local_file(source.file_path, source.file_hash) as local_file_path:
+        return thumbnail_service.generate_sprites(source, local_file_path, size, progress)
+
+JOB_HANDLERS: Dict[str, Callable[[Session, Dict[str, Any], ProgressCallback], Dict[str, Any]]] = {
+    "compress": handle_compress,
+    "ocr": handle_ocr,
+    "office_to_pdf": handle_office_to_pdf,
+    "to_epub": handle_to_epub,
+    "to_jpg": handle_to_jpg,
+    "thumbnails": handle_thumbnails,
+}
+
+def process_job(raw_task, job: Dict[str, Any]) -> None:
+    """Run one reserved job, keeping its lease alive until the handler returns"""
+    job_id = job["id"]
+    handler = JOB_HANDLERS.get(job["operation"])
+    if handler is None:
+        job_service.fail(raw_task, dict(job, attempts=job["max_attempts"]), f"Unknown operation: {job['operation']}")
+        return
+
+    # Heartbeat so long single-step operations are not mistaken for a crashed worker
+    stop_heartbeat = threading.Event()
+    def heartbeat():
+        while not stop_heartbeat.wait(max(1, settings.JOB_VISIBILITY_TIMEOUT // 3)):
+            current = job_service.get_job(job_id) or {}
+            job_service.update_progress(job_id, current.get("progress", 0))
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    def stop_heartbeat_thread():
+        # Joined before the final state is written, so a late heartbeat cannot overwrite it
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+
+    db = SessionLocal()
+    try:
+        logger.info(f"Running job {job_id} ({job['operation']}) attempt {job['attempts']}")
+        try:
+            result = handler(db, job, lambda pct, message: job_service.update_progress(job_id, pct, message))
+        finally:
+            stop_heartbeat_thread()
+        job_service.complete(raw_task, job_id, result)
+        if settings.CACHE_ENABLED:
+            redis_service.clear_cache_pattern("doc_list:*")
+        logger.info(f"Job {job_id} completed")
+    except JobError as e:
+        # Not retryable (e.g. the document is gone)
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        job_service.fail(raw_task, dict(job, attempts=job["max_attempts"]), str(e))
+    except Exception as e:
+        logger.error(f"Job {job_id} attempt {job['attempts']} failed: {str(e)}")
+        db.rollback()
+        job_service.fail(raw_task, job, str(e))
+    finally:
+        stop_heartbeat_thread()
+        db.close()
+
+def collect_blob_garbage() -> int:
+    """Delete stored blobs that no document has referenced for the grace period"""
+    db = SessionLocal()
+    try:
+        return blob_store_service.collect_garbage(db)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Blob garbage collection failed: {str(e)}")
+        return 0
+    finally:
+        db.close()
+
+def run_worker(poll_timeout: int = 5) -> None:
+    """Consume the Redis job queue until SIGINT/SIGTERM"""
+    stopping = threading.Event()
+    def request_stop(signum, frame):
+        logger.info("Worker shutting down after the current job")
+        stopping.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    logger.info(f"Worker started, consuming queue '{settings.JOB_QUEUE_NAME}'")
+    next_blob_gc = time.monotonic()
+    while not stopping.is_set():
+        if time.monotonic() >= next_blob_gc:
+            next_blob_gc = time.monotonic() + settings.BLOB_GC_INTERVAL_SECONDS
+            collect_blob_garbage()
+
+        if not job_service.is_available():
+            logger.warning("Redis not available, retrying in 5s")
+            time.sleep(5)
+            continue
+
+        job_service.promote_delayed()
+        job_service.requeue_expired()
+
+        reserved = job_service.reserve(timeout=poll_timeout)
+        if reserved:
+            process_job(*reserved)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    run_worker()
@@ -0,0 +1,75 @@
+"""
+Compression scaling benchmark: one document compressed with 1, 2, 4, ... worker processes.
+
+Run from pdf_saas_app/:
+    python -m benchmarks.bench_compress [--pages 1000] [--profile screen]
+
+Each worker count runs in a fresh process with COMPRESS_MAX_WORKERS set, so the
+pool is sized accordingly.
+"""
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+def make_input(path: str, pages: int) -> None:
+    doc = fitz.open()
+    for i in range(pages):
+        buffer = io.BytesIO()
+        Image.effect_noise((1200, 900), 20 + i % 80).convert("RGB").save(buffer, format="JPEG", quality=95)
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}", fontsize=18)
+        page.insert_image(fitz.Rect(72, 100, 372, 325), stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+def run_once(input_path: str, output_path: str, profile: str) -> None:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.core import compression
+    started = time.perf_counter()
+    stats = compression.compress_pdf(input_path, output_path, profile)
+    print(f"{time.perf_counter() - started:.2f} {stats['shards']} {stats['recompressed']}")
+    compression.reset_compression_pool()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--profile", default="screen")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_once(args.run[0], args.run[1], args.profile)
+        return
+
+    directory = tempfile.mkdtemp(prefix="bench_compress_")
+    try:
+        input_path = os.path.join(directory, "input.pdf")
+        make_input(input_path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(input_path) / 2**20:.1f} MB, profile '{args.profile}'")
+        print(f"{'workers':>8}{'shards':>8}{'seconds':>10}{'speedup':>10}")
+        baseline = None
+        workers = 1
+        while workers <= args.max_workers:
+            env = dict(os.environ, COMPRESS_MAX_WORKERS=str(workers))
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_compress", "--profile", args.profile,
+                 "--run", input_path, os.path.join(directory, f"output_{workers}.pdf")],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout.split()
+            seconds, shards = float(output[0]), int(output[1])
+            baseline = baseline or seconds
+            print(f"{workers:>8}{shards:>8}{seconds:>10.2f}{baseline / seconds:>9.1f}x")
+            workers *= 2
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
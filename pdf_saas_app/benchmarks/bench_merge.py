@@ -0,0 +1,87 @@
+"""
+Merge benchmark: PyMuPDF insert_pdf engine vs the previous PyPDF2 page-copy merge.
+
+Run from pdf_saas_app/:
+    python -m benchmarks.bench_merge [--inputs 10] [--pages 100]
+
+Each implementation runs in a fresh process so peak RSS is comparable.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_inputs(directory: str, inputs: int, pages: int) -> list:
+    paths = []
+    for n in range(inputs):
+        doc = fitz.open()
+        for i in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Input {n + 1}, page {i + 1}", fontsize=18)
+            page.insert_textbox(fitz.Rect(72, 100, 540, 760), "Lorem ipsum dolor sit amet. " * 60, fontsize=10)
+        doc.set_toc([[1, f"Input {n + 1}", 1], [2, "Second half", pages // 2 + 1]])
+        path = os.path.join(directory, f"input_{n + 1}.pdf")
+        doc.save(path, deflate=True)
+        doc.close()
+        paths.append(path)
+    return paths
+
+def merge_pypdf2(paths: list, output_path: str) -> None:
+    """The implementation PDFProcessor.merge_pdfs used before the PyMuPDF engine"""
+    from PyPDF2 import PdfReader, PdfWriter
+    writer = PdfWriter()
+    for pdf_path in paths:
+        reader = PdfReader(pdf_path)
+        for page in reader.pages:
+            writer.add_page(page)
+    with open(output_path, "wb") as output_file:
+        writer.write(output_file)
+
+def merge_pymupdf(paths: list, output_path: str) -> None:
+    from app.core.merge_engine import merge_pdfs
+    merge_pdfs([(path, None) for path in paths], output_path)
+
+def _run(name: str, paths: list, output_path: str, results) -> None:
+    started = time.perf_counter()
+    {"pypdf2": merge_pypdf2, "pymupdf": merge_pymupdf}[name](paths, output_path)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, peak * (1 if sys.platform == "darwin" else 1024)))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=100)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_merge_")
+    try:
+        paths = make_inputs(directory, args.inputs, args.pages)
+        print(f"{args.inputs} inputs x {args.pages} pages")
+        print(f"{'engine':<10}{'seconds':>10}{'peak RSS MB':>14}{'output MB':>12}{'outlines':>10}")
+        context = multiprocessing.get_context("spawn")
+        for name in ("pypdf2", "pymupdf"):
+            output_path = os.path.join(directory, f"merged_{name}.pdf")
+            results = context.Queue()
+            process = context.Process(target=_run, args=(name, paths, output_path, results))
+            process.start()
+            elapsed, peak = results.get()
+            process.join()
+            with fitz.open(output_path) as merged:
+                outlines = len(merged.get_toc())
+            print(f"{name:<10}{elapsed:>10.2f}{peak / 2**20:>14.1f}"
+                  f"{os.path.getsize(output_path) / 2**20:>12.2f}{outlines:>10}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
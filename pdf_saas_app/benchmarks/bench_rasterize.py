@@ -0,0 +1,73 @@
+"""
+Rasterization benchmark: PyMuPDF (in-process MuPDF) against Poppler (pdftoppm subprocesses).
+
+Run from pdf_saas_app/:
+    python -m benchmarks.bench_rasterize [--pages 200] [--dpi 150] [--format jpeg]
+
+Each backend renders the same document with the same chunking and worker count.
+The Poppler row is skipped when pdftoppm is not installed. The PyMuPDF process
+pool is started before timing, as it is in a running server.
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_input(path: str, pages: int) -> None:
+    doc = fitz.open()
+    for i in range(pages):
+        buffer = io.BytesIO()
+        Image.effect_noise((800, 600), 20 + i % 80).convert("RGB").save(buffer, format="JPEG", quality=90)
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}", fontsize=18)
+        page.insert_textbox(fitz.Rect(72, 100, 540, 400), "Lorem ipsum dolor sit amet. " * 40, fontsize=10)
+        page.insert_image(fitz.Rect(72, 420, 372, 645), stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+def run(input_path: str, output_dir: str, backend: str, dpi: int, fmt: str, workers: int) -> float:
+    from app.core.rasterizer import rasterize_pages
+    started = time.perf_counter()
+    for _, path in rasterize_pages(input_path, output_dir, dpi=dpi, fmt=fmt, max_workers=workers, backend=backend):
+        os.remove(path)
+    return time.perf_counter() - started
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--format", default="jpeg")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    from app.core.rasterizer import rasterize_pages, reset_rasterize_pool
+    directory = tempfile.mkdtemp(prefix="bench_rasterize_")
+    try:
+        input_path = os.path.join(directory, "input.pdf")
+        make_input(input_path, args.pages)
+        # Warm up the process pool (two chunks, so it is used)
+        warmup = os.path.join(directory, "warmup")
+        list(rasterize_pages(input_path, warmup, dpi=36, max_workers=args.max_workers, page_range="1-16"))
+
+        backends = ["pymupdf"] + (["poppler"] if shutil.which("pdftoppm") else [])
+        print(f"{args.pages} pages at {args.dpi} dpi, {args.format}, {args.max_workers} workers")
+        print(f"{'backend':>10}{'seconds':>10}{'pages/s':>10}{'ms/page':>10}")
+        for backend in backends:
+            seconds = run(input_path, os.path.join(directory, backend), backend, args.dpi, args.format, args.max_workers)
+            print(f"{backend:>10}{seconds:>10.2f}{args.pages / seconds:>10.1f}{1000 * seconds / args.pages:>10.1f}")
+        if "poppler" not in backends:
+            print("pdftoppm not found, Poppler not measured")
+    finally:
+        reset_rasterize_pool()
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,7 @@ def test_upload_list_delete_pdf():
     # List documents
     list_response = client.get("/api/v1/documents/list", headers=headers)
     assert list_response.status_code == 200
-    docs = list_response.json()
+    docs = list_response.json()["documents"]
     assert any(doc["id"] == doc_id for doc in docs)
     # Delete document
     delete_response = client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
@@ -39,7 +39,262 @@ def test_upload_list_delete_pdf():
     assert delete_response.json()["message"] == "Document deleted successfully"
     # Clean up test PDF
     if os.path.exists(sample_pdf_path):
-        os.remove(sample_pdf_path) 
+        os.remove(sample_pdf_path)
+
+def test_download_range_and_etag():
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    sample_pdf_path = "sample.pdf"
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(sample_pdf_path)
+    c.drawString(100, 750, "Range me")
+    c.save()
+    with open(sample_pdf_path, "rb") as f:
+        content = f.read()
+    files = {"file": ("sample.pdf", content, "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+    url = f"/api/v1/documents/{doc_id}/download"
+
+    full = client.get(url, headers=headers)
+    assert full.status_code == 200
+    assert full.content == content
+    assert full.headers["accept-ranges"] == "bytes"
+    etag = full.headers["etag"]
+
+    partial = client.get(url, headers={**headers, "Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == content[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(content)}"
+
+    suffix = client.get(url, headers={**headers, "Range": "bytes=-8"})
+    assert suffix.content == content[-8:]
+
+    unsatisfiable = client.get(url, headers={**headers, "Range": f"bytes={len(content)}-"})
+    assert unsatisfiable.status_code == 416
+
+    not_modified = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+    os.remove(sample_pdf_path)
+
+def test_resumable_upload():
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    import fitz
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Resumable upload")
+    content = doc.tobytes()
+
+    session = client.post("/api/v1/documents/uploads", json={"filename": "resumable.pdf", "total_size": len(content)}, headers=headers)
+    assert session.status_code == 201
+    url = f"/api/v1/documents/uploads/{session.json()['id']}"
+
+    assert client.put(url, params={"offset": 0}, content=content[:200], headers=headers).json()["offset"] == 200
+    # Resending from a stale offset is rejected with the offset to resume from
+    stale = client.put(url, params={"offset": 0}, content=content[200:], headers=headers)
+    assert stale.status_code == 409
+    assert stale.headers["upload-offset"] == "200"
+    assert client.get(url, headers=headers).json()["offset"] == 200
+    assert client.put(url, params={"offset": 200}, content=content[200:], headers=headers).json()["offset"] == len(content)
+
+    finalized = client.post(f"{url}/finalize", headers=headers)
+    assert finalized.status_code == 200
+    doc_id = finalized.json()["id"]
+    assert client.get(f"/api/v1/documents/{doc_id}/download", headers=headers).content == content
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+
+def test_upload_chunk_refused_while_another_worker_holds_the_session(monkeypatch):
+    import fitz
+    from app.services.upload_session_service import upload_session_service
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Locked upload")
+    content = doc.tobytes()
+    session = client.post("/api/v1/documents/uploads", json={"filename": "locked.pdf"}, headers=headers)
+    url = f"/api/v1/documents/uploads/{session.json()['id']}"
+
+    # Another process holds the session row: no thread lock here would notice
+    monkeypatch.setattr(upload_session_service, "lock_row", lambda db, upload: False)
+    assert client.put(url, params={"offset": 0}, content=content, headers=headers).status_code == 409
+    assert client.post(f"{url}/finalize", headers=headers).status_code == 409
+    assert client.get(url, headers=headers).json()["offset"] == 0
+
+    monkeypatch.undo()
+    assert client.put(url, params={"offset": 0}, content=content, headers=headers).json()["offset"] == len(content)
+    client.delete(url, headers=headers)
+
+def test_finalized_upload_document_can_be_deleted():
+    import uuid
+    import fitz
+    from sqlalchemy import event
+    from app.db.session import SessionLocal, engine
+    from app.db.models import Document, UploadSession
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), f"Finalized then deleted {uuid.uuid4()}")
+    content = doc.tobytes()
+
+    def enforce_foreign_keys(connection, record):
+        if engine.dialect.name == "sqlite":
+            connection.execute("PRAGMA foreign_keys=ON")
+
+    # SQLite only checks foreign keys when asked to; Postgres always does
+    event.listen(engine, "connect", enforce_foreign_keys)
+    engine.dispose()
+    try:
+        session = client.post("/api/v1/documents/uploads", json={"filename": "finalized.pdf"}, headers=headers)
+        url = f"/api/v1/documents/uploads/{session.json()['id']}"
+        client.put(url, params={"offset": 0}, content=content, headers=headers)
+        doc_id = client.post(f"{url}/finalize", headers=headers).json()["id"]
+
+        assert client.delete(f"/api/v1/documents/{doc_id}", headers=headers).status_code == 200
+        db = SessionLocal()
+        try:
+            assert db.get(Document, doc_id) is None
+            assert db.get(UploadSession, session.json()["id"]).document_id is None
+        finally:
+            db.close()
+    finally:
+        event.remove(engine, "connect", enforce_foreign_keys)
+        engine.dispose()
+
+def test_stream_upload_rejects_content_not_matching_extension():
+    import fitz
+    from app.config import settings
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Streamed upload")
+    content = doc.tobytes()
+    resp = client.put("/api/v1/documents/upload/stream", params={"filename": "streamed.pdf"}, content=content, headers=headers)
+    assert resp.status_code == 200
+    doc_id = resp.json()["id"]
+    assert client.get(f"/api/v1/documents/{doc_id}/download", headers=headers).content == content
+
+    # A ZIP named .pdf is refused and nothing is left in storage
+    before = set(os.listdir(settings.LOCAL_STORAGE_PATH))
+    resp = client.put("/api/v1/documents/upload/stream", params={"filename": "fake.pdf"},
+                      content=b"PK\x03\x04" + b"\x00" * 200, headers=headers)
+    assert resp.status_code == 400
+    assert "extension" in resp.json()["detail"]
+    assert set(os.listdir(settings.LOCAL_STORAGE_PATH)) == before
+    files = {"file": ("tiny.png", b"GIF89a", "image/png")}
+    assert client.post("/api/v1/documents/upload", files=files, headers=headers).status_code == 400
+
+    # Bytes in front of the PDF header, as scanners and mailers write them, are accepted
+    files = {"file": ("scanned.pdf", b"\r\n" + b"\x00" * 300 + content, "application/pdf")}
+    resp = client.post("/api/v1/documents/upload", files=files, headers=headers)
+    assert resp.status_code == 200
+    client.delete(f"/api/v1/documents/{resp.json()['id']}", headers=headers)
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+
+def test_ingest_pipeline_holds_data_until_the_type_is_checked():
+    import pytest
+    from app.services.ingest_service import IngestPipeline, SNIFF_BYTES
+    from app.services.storage_service import StorageService
+
+    class RecordingWriter:
+        def __init__(self):
+            self.data = b""
+            self.aborted = False
+
+        def write(self, data):
+            self.data += data
+
+        def close(self):
+            return "stored.pdf"
+
+        def abort(self):
+            self.aborted = True
+    storage = StorageService.__new__(StorageService)
+    storage.storage_type = "local"
+    writers = []
+    storage.open_writer = lambda filename: writers.append(RecordingWriter()) or writers[-1]
+    storage.get_file = lambda file_path: file_path
+
+    pipeline = IngestPipeline("fake.pdf", storage)
+    pipeline.write(b"PK\x03\x04")
+    assert writers[0].data == b""
+    with pytest.raises(ValueError):
+        pipeline.write(b"\x00" * SNIFF_BYTES)
+    assert writers[0].data == b""
+
+    # Short files are checked, then written, when the pipeline finishes
+    pipeline = IngestPipeline("short.pdf", storage)
+    pipeline.write(b"%PDF-1.4\n")
+    pipeline.write(b"%%EOF\n")
+    assert writers[1].data == b""
+    assert pipeline.finish()["mime_type"] == "application/pdf"
+    assert writers[1].data == b"%PDF-1.4\n%%EOF\n"
+
+def test_ingest_pipeline_s3_parts_and_azure_blocks(tmp_path, monkeypatch):
+    import hashlib
+    from unittest.mock import MagicMock
+    import fitz
+    import pytest
+    from app.config import settings
+    from app.services import ingest_service, storage_service as storage_module
+    from app.services.disk_cache_service import DiskCacheService
+    from app.services.ingest_service import IngestPipeline
+    from app.services.storage_service import StorageService
+    monkeypatch.setattr(settings, "S3_MULTIPART_PART_SIZE", 200)
+    monkeypatch.setattr(settings, "AZURE_BLOCK_SIZE", 200)
+    monkeypatch.setattr(settings, "STORAGE_CACHE_ENABLED", True)
+    cache = DiskCacheService(str(tmp_path / "cache"), max_bytes=10 ** 9)
+    monkeypatch.setattr(ingest_service, "disk_cache_service", cache)
+    monkeypatch.setattr(storage_module, "disk_cache_service", cache)
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Remote upload " * 20)
+    content = doc.tobytes()
+
+    def ingest(storage, filename, data):
+        pipeline = IngestPipeline(filename, storage)
+        try:
+            for start in range(0, len(data), 150):
+                pipeline.write(data[start:start + 150])
+            return pipeline.finish("application/pdf")
+        except Exception:
+            pipeline.abort()
+            raise
+
+    s3 = StorageService.__new__(StorageService)
+    s3.storage_type, s3.bucket_name, s3.s3_client = "s3", "bucket", MagicMock()
+    s3.s3_client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    s3.s3_client.upload_part.side_effect = lambda **kwargs: {"ETag": f"etag-{kwargs['PartNumber']}"}
+    result = ingest(s3, "remote.pdf", content)
+    bodies = [call.kwargs["Body"] for call in s3.s3_client.upload_part.call_args_list]
+    assert b"".join(bodies) == content and len(bodies) > 2 and all(len(body) == 200 for body in bodies[:-1])
+    parts = s3.s3_client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+    assert [part["PartNumber"] for part in parts] == list(range(1, len(bodies) + 1))
+    assert result["file_path"].startswith("https://bucket.s3.amazonaws.com/remote_")
+    assert result["file_hash"] == hashlib.sha256(content).hexdigest()
+    assert result["mime_type"] == "application/pdf" and "page_count" not in result
+    # The teed copy became the leased cache entry, so extraction needs no download
+    assert result["local_path"].startswith(cache.root) and open(result["local_path"], "rb").read() == content
+    assert cache.get_stats()["pinned"] == 1
+    s3.release_file(result["local_path"])
+    assert cache.get_stats()["pinned"] == 0
+
+    # Rejected from the leading bytes, before anything is sent
+    s3.s3_client.reset_mock()
+    with pytest.raises(ValueError):
+        ingest(s3, "fake.pdf", b"PK\x03\x04" + b"\x00" * 3000)
+    assert not s3.s3_client.create_multipart_upload.called and not s3.s3_client.put_object.called
+
+    azure = StorageService.__new__(StorageService)
+    azure.storage_type, azure.container_name, azure.blob_service_client = "azure", "container", MagicMock()
+    blob_client = azure.blob_service_client.get_blob_client.return_value
+    blob_client.url = "https://account.blob.core.windows.net/container/remote.pdf"
+    result = ingest(azure, "remote.pdf", content)
+    staged = [(call.kwargs["block_id"], call.kwargs["data"]) for call in blob_client.stage_block.call_args_list]
+    assert b"".join(data for _, data in staged) == content
+    committed = blob_client.commit_block_list.call_args.args[0]
+    assert [block.id for block in committed] == [block_id for block_id, _ in staged]
+    assert result["file_path"] == blob_client.url
+    azure.release_file(result["local_path"])
 
 def test_edit_text_on_page():
     token = get_token()
@@ -161,4 +416,1081 @@ def test_reorder_pages():
     # Reorder pages (swap page 0 and 1)
     resp = client.post(f"/pdfs/{pdf_id}/reorder_pages", json={"new_order": [1, 0]}, headers=headers)
     assert resp.status_code == 200
-    assert "output_path" in resp.json() 
\ No newline at end of file
+    assert "output_path" in resp.json()
+
+def test_extract_pages_ocr_only_image_pages(tmp_path, monkeypatch):
+    import fitz
+    from app.core import ocr_engine
+    from app.core.pdf_operations import PDFProcessor
+
+    pdf_path = str(tmp_path / "mixed.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "First page")
+    doc.new_page()  # image-only / blank page, needs OCR
+    doc.new_page().insert_text((72, 72), "Third page")
+    doc.save(pdf_path)
+    doc.close()
+
+    ocr_calls = []
+    def fake_ocr_page(file_path, page_index, dpi):
+        ocr_calls.append(page_index)
+        return {"page": page_index + 1, "text": "ocr text", "ocr": True, "ms": 0.0}
+    monkeypatch.setattr(ocr_engine, "get_ocr_pool", lambda: None)
+    monkeypatch.setattr(ocr_engine, "ocr_page", fake_ocr_page)
+
+    pages = PDFProcessor().extract_pages(pdf_path)
+    assert [p["page"] for p in pages] == [1, 2, 3]
+    assert [p["ocr"] for p in pages] == [False, True, False]
+    assert ocr_calls == [1]
+    assert "First page" in pages[0]["text"]
+    assert all("ms" in p for p in pages)
+
+def test_ocr_iter_pages_cancels_pending_pages_when_closed(tmp_path, monkeypatch):
+    import fitz
+    from concurrent.futures import Future
+    from app.core import ocr_engine
+
+    pdf_path = str(tmp_path / "scanned.pdf")
+    doc = fitz.open()
+    for _ in range(4):
+        doc.new_page()  # image-only pages, all need OCR
+    doc.save(pdf_path)
+    doc.close()
+
+    class FakePool:
+        def __init__(self):
+            self.futures = []
+
+        def submit(self, func, file_path, page_index, dpi):
+            self.futures.append(Future())
+            if page_index == 3:
+                # The first page finishes once every page is queued
+                self.futures[0].set_result({"page": 1, "text": "ocr text", "ocr": True, "ms": 0.0})
+            return self.futures[-1]
+    pool = FakePool()
+    monkeypatch.setattr(ocr_engine, "get_ocr_pool", lambda: pool)
+    pages = ocr_engine.OCREngine().iter_pages(pdf_path)
+    assert next(pages)["page"] == 1
+    pages.close()
+    assert len(pool.futures) == 4
+    assert all(future.cancelled() for future in pool.futures[1:])
+
+    # A pool that cannot start is asked for once per call; pages are OCR'd in-process
+    attempts = []
+    monkeypatch.setattr(ocr_engine, "get_ocr_pool", lambda: attempts.append(1))
+    monkeypatch.setattr(ocr_engine, "ocr_page", lambda file_path, page_index, dpi: {"page": page_index + 1, "text": "", "ocr": True, "ms": 0.0})
+    assert [page["page"] for page in ocr_engine.OCREngine().extract_pages(pdf_path)] == [1, 2, 3, 4]
+    assert len(attempts) == 1
+
+def test_blob_store_dedups_across_users():
+    from app.db.session import SessionLocal
+    from app.db.models import Blob, Document
+    import fitz
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Shared content")
+    content = doc.tobytes()
+
+    doc_ids = []
+    for email in ("blob-a@example.com", "blob-b@example.com"):
+        client.post("/api/v1/auth/register", json={"email": email, "password": "blobpassword"})
+        token = client.post("/api/v1/auth/token", data={"username": email, "password": "blobpassword"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        files = {"file": ("shared.pdf", content, "application/pdf")}
+        doc_ids.append((client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"], headers))
+
+    db = SessionLocal()
+    try:
+        paths = {db.get(Document, doc_id).file_path for doc_id, _ in doc_ids}
+        assert len(paths) == 1
+        blob = db.query(Blob).filter(Blob.file_path == paths.pop()).one()
+        assert blob.ref_count == 2
+
+        client.delete(f"/api/v1/documents/{doc_ids[0][0]}", headers=doc_ids[0][1])
+        db.refresh(blob)
+        assert blob.ref_count == 1
+        assert client.get(f"/api/v1/documents/{doc_ids[1][0]}/download", headers=doc_ids[1][1]).content == content
+        client.delete(f"/api/v1/documents/{doc_ids[1][0]}", headers=doc_ids[1][1])
+        db.refresh(blob)
+        assert blob.ref_count == 0
+    finally:
+        db.close()
+
+def test_text_store_shared_by_hash_and_released_with_last_document(monkeypatch):
+    import uuid
+    import fitz
+    from app.db.session import SessionLocal
+    from app.db.models import Document, DocumentText
+    from app.services.text_store_service import text_store_service
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "First page")
+    doc.new_page().insert_text((72, 72), f"Second page {uuid.uuid4()}")
+    content = doc.tobytes()
+
+    extracted = []
+    extract_pages = text_store_service.pdf_processor.extract_pages
+
+    def counting_extract(path):
+        extracted.append(path)
+        return extract_pages(path)
+
+    monkeypatch.setattr(text_store_service.pdf_processor, "extract_pages", counting_extract)
+    doc_ids = []
+    for email in ("text-a@example.com", "text-b@example.com"):
+        client.post("/api/v1/auth/register", json={"email": email, "password": "textpassword"})
+        token = client.post("/api/v1/auth/token", data={"username": email, "password": "textpassword"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        files = {"file": ("shared.pdf", content, "application/pdf")}
+        response = client.post("/api/v1/documents/upload", files=files, headers=headers)
+        assert "Second page" in response.json()["text_content"]
+        doc_ids.append((response.json()["id"], headers))
+    # Extracted once at the first upload; the second document reads the stored pages
+    assert len(extracted) == 1
+
+    db = SessionLocal()
+    try:
+        file_hash = db.get(Document, doc_ids[0][0]).file_hash
+        rows = db.query(DocumentText).filter(DocumentText.file_hash == file_hash).order_by(DocumentText.page_number).all()
+        assert [row.page_number for row in rows] == [1, 2]
+        assert {row.extractor_version for row in rows} == {text_store_service.extractor_version}
+        assert text_store_service.get_text(db, file_hash) == "".join(row.text for row in rows)
+
+        resp = client.get(f"/api/v1/documents/{doc_ids[1][0]}/extract-text", headers=doc_ids[1][1])
+        assert "First page" in resp.json()["text"]
+        assert len(extracted) == 1
+
+        # The text stays while any document has the content, and goes with the last one
+        client.delete(f"/api/v1/documents/{doc_ids[0][0]}", headers=doc_ids[0][1])
+        assert text_store_service.has_text(db, file_hash)
+        client.delete(f"/api/v1/documents/{doc_ids[1][0]}", headers=doc_ids[1][1])
+        assert not text_store_service.has_text(db, file_hash)
+        assert db.query(DocumentText).filter(DocumentText.file_hash == file_hash).count() == 0
+    finally:
+        db.close()
+
+def test_uploaded_objects_survive_collecting_a_blob_with_the_same_content(tmp_path):
+    import os
+    import uuid
+    from app.db.session import SessionLocal
+    from app.services.blob_store_service import blob_store_service
+    from app.services.storage_service import StorageService
+    path = str(tmp_path / "page_1.jpg")
+    with open(path, "wb") as f:
+        f.write(f"page image {uuid.uuid4()}".encode())
+
+    db = SessionLocal()
+    try:
+        old_path, file_hash = blob_store_service.store_file(db, path, "page_1.jpg")
+        db.commit()
+        blob_store_service.release_hash(db, file_hash)
+        db.commit()
+        # Uploaded while the unreferenced blob is collected: the new object has a name of its own
+        stored = blob_store_service.upload_object(path, "page_1.jpg")
+        assert stored["file_path"] != old_path
+        assert blob_store_service.collect_garbage(db, grace_seconds=0) >= 1
+        file_path = blob_store_service.adopt_stored(db, stored["file_hash"], stored["file_path"], stored["file_size"])
+        db.commit()
+        assert file_path == stored["file_path"]
+        assert os.path.exists(StorageService().get_file(file_path))
+        blob_store_service.release_hash(db, file_hash)
+        db.commit()
+        blob_store_service.collect_garbage(db, grace_seconds=0)
+    finally:
+        db.close()
+
+def test_orphan_cleanup_releases_blob_and_gc_keeps_undeleted(monkeypatch):
+    import uuid
+    import fitz
+    from app.db.session import SessionLocal
+    from app.db.models import Blob, Document
+    from app.services.blob_store_service import blob_store_service
+    from app.services.storage_service import StorageService
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), f"Orphan {uuid.uuid4()}")
+    files = {"file": ("orphan.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+
+    db = SessionLocal()
+    try:
+        document = db.get(Document, doc_id)
+        file_hash, file_path = document.file_hash, document.file_path
+        os.remove(StorageService()._local_path(file_path))
+        # The file is gone, so the record is cleaned up and its blob reference dropped
+        assert client.get(f"/api/v1/documents/{doc_id}/download", headers=headers).status_code == 404
+        db.expire_all()
+        assert db.get(Document, doc_id) is None
+        assert db.query(Blob).filter(Blob.file_hash == file_hash).one().ref_count == 0
+
+        # A blob whose storage delete fails is kept for the next pass
+        monkeypatch.setattr(StorageService, "delete_file", lambda self, path: False)
+        blob_store_service.collect_garbage(db, grace_seconds=0)
+        db.expire_all()
+        assert db.query(Blob).filter(Blob.file_hash == file_hash).count() == 1
+        monkeypatch.undo()
+        blob_store_service.collect_garbage(db, grace_seconds=0)
+        db.expire_all()
+        assert db.query(Blob).filter(Blob.file_hash == file_hash).count() == 0
+    finally:
+        db.close()
+
+def test_disk_cache_lru_index_and_leases(tmp_path, monkeypatch):
+    import os
+    from app.config import settings
+    from app.services.disk_cache_service import DiskCacheService
+    monkeypatch.setattr(settings, "STORAGE_CACHE_MIN_AGE_SECONDS", 0)
+    cache = DiskCacheService(str(tmp_path), max_bytes=250)
+    scans = []
+    scan = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or scan())
+
+    def fill(data):
+        return lambda path: open(path, "wb").write(data)
+    a = cache.get_or_fetch("aa01", ".pdf", fill(b"a" * 100))
+    b = cache.get_or_fetch("bb02", ".pdf", fill(b"b" * 100))
+    assert cache.lookup("aa01", ".pdf") == a
+    c = cache.get_or_fetch("cc03", ".pdf", fill(b"c" * 100))
+    # b was least recently used; the size index is kept in memory, not rescanned
+    assert os.path.exists(a) and not os.path.exists(b) and os.path.exists(c)
+    assert len(scans) == 1
+    assert cache.get_stats()["entries"] == 2 and cache.get_stats()["bytes"] == 200
+
+    # A lease held through another instance (as another process would) keeps a from eviction
+    other = DiskCacheService(str(tmp_path), max_bytes=250)
+    leased = other.acquire("aa01", ".pdf", fill(b"x"))
+    assert leased == a and other.get_stats()["pinned"] == 1
+    cache.get_or_fetch("dd04", ".pdf", fill(b"d" * 100))
+    assert os.path.exists(a) and not os.path.exists(c)
+    other.release(leased)
+    # Skipped while leased, so a now counts as just used: d goes first, then a
+    cache.get_or_fetch("ee05", ".pdf", fill(b"e" * 100))
+    assert os.path.exists(a) and not os.path.exists(cache.path_for("dd04", ".pdf"))
+    cache.get_or_fetch("ff06", ".pdf", fill(b"f" * 100))
+    assert not os.path.exists(a)
+    with cache.pinned("aa01", ".pdf", fill(b"a" * 100)) as path:
+        assert open(path, "rb").read() == b"a" * 100
+    assert cache.get_stats()["pinned"] == 0
+
+def test_disk_cache_leases_without_flock(tmp_path, monkeypatch):
+    import os
+    from app.config import settings
+    from app.services import disk_cache_service as disk_cache_module
+    from app.services.disk_cache_service import DiskCacheService
+    # As on Windows: no fcntl, and deleting a file that is open fails
+    monkeypatch.setattr(disk_cache_module, "fcntl", None)
+    monkeypatch.setattr(settings, "STORAGE_CACHE_MIN_AGE_SECONDS", 0)
+    cache = DiskCacheService(str(tmp_path), max_bytes=150)
+    leased = set()
+    remove = os.remove
+
+    def remove_unless_open(path):
+        if path in leased:
+            raise PermissionError(path)
+        remove(path)
+    monkeypatch.setattr(disk_cache_module.os, "remove", remove_unless_open)
+
+    def fill(data):
+        return lambda path: open(path, "wb").write(data)
+    a = cache.acquire("aa01", ".pdf", fill(b"a" * 100))
+    leased.add(a)
+    b = cache.get_or_fetch("bb02", ".pdf", fill(b"b" * 100))
+    assert os.path.exists(a) and not os.path.exists(b)
+    cache.release(a)
+    leased.clear()
+    cache.get_or_fetch("cc03", ".pdf", fill(b"c" * 100))
+    assert not os.path.exists(a)
+
+def test_pdf_edits_write_to_temp_files(monkeypatch):
+    import tempfile
+    from app.api import pdf as pdf_api
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    import fitz
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Edit me")
+    files = {"file": ("edit.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+    outputs = []
+    edit = pdf_api.PDFProcessor.edit_text_on_page
+    monkeypatch.setattr(pdf_api.PDFProcessor, "edit_text_on_page",
+                        lambda self, source, output, *args: outputs.append((source, output)) or edit(self, source, output, *args))
+
+    resp = client.post(f"/api/v1/pdfs/{doc_id}/edit_text",
+                       params={"page_number": 0, "old_text": "Edit", "new_text": "Done"}, headers=headers)
+    assert resp.status_code == 200
+    source, output = outputs[0]
+    # The output went to a private temp file, not next to the stored or cached source, and is gone
+    assert os.path.dirname(output) == tempfile.gettempdir()
+    assert os.path.dirname(output) != os.path.dirname(source)
+    assert not os.path.exists(output)
+
+def test_text_stream_persists_pages_in_batches(monkeypatch):
+    import json
+    import uuid
+    import fitz
+    from app.config import settings
+    from app.db.session import SessionLocal
+    from app.db.models import Document
+    from app.services.text_store_service import text_store_service
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    marker = uuid.uuid4()
+    for i in range(5):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1} {marker}")
+    files = {"file": ("pages.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+
+    db = SessionLocal()
+    try:
+        file_hash = db.get(Document, doc_id).file_hash
+        # Text is stored at upload; drop it so the stream extracts again
+        text_store_service.invalidate(db, file_hash)
+        monkeypatch.setattr(settings, "TEXT_STREAM_BATCH_PAGES", 2)
+        batches = []
+        append = text_store_service.append_pages
+        def spy(store_db, batch_hash, run, pages):
+            append(store_db, batch_hash, run, pages)
+            # Batches are written as they come but stay hidden until the stream completes
+            batches.append((len(pages), text_store_service.has_text(store_db, batch_hash)))
+        monkeypatch.setattr(text_store_service, "append_pages", spy)
+
+        resp = client.get(f"/api/v1/documents/{doc_id}/extract-text/stream", headers=headers)
+        assert resp.status_code == 200
+        pages = [json.loads(line) for line in resp.text.splitlines()]
+        assert [page["page"] for page in pages] == [1, 2, 3, 4, 5]
+        assert batches == [(2, False), (2, False), (1, False)]
+        db.expire_all()
+        stored = text_store_service.get_pages(db, file_hash)
+        assert [page.page_number for page in stored] == [1, 2, 3, 4, 5]
+        assert f"Page 3 {marker}" in stored[2].text
+    finally:
+        db.close()
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+
+def test_concurrent_text_runs_keep_their_own_pages():
+    import uuid
+    from app.db.session import SessionLocal
+    from app.db.models import DocumentText
+    from app.services.text_store_service import text_store_service
+    file_hash = uuid.uuid4().hex
+
+    def pages(label, numbers):
+        return [{"page": n, "text": f"{label} {n}"} for n in numbers]
+    db = SessionLocal()
+    try:
+        first, second = text_store_service.begin_pages(), text_store_service.begin_pages()
+        assert first != second
+        text_store_service.append_pages(db, file_hash, first, pages("first", [1]))
+        text_store_service.append_pages(db, file_hash, second, pages("second", [1, 2]))
+        # An upload-time extraction stores its pages without touching either run
+        text_store_service.store_pages(db, file_hash, pages("upload", [1, 2]))
+        text_store_service.append_pages(db, file_hash, first, pages("first", [2]))
+
+        text_store_service.finish_pages(db, file_hash, first)
+        assert text_store_service.get_text(db, file_hash) == "first 1first 2"
+        text_store_service.finish_pages(db, file_hash, second)
+        assert text_store_service.get_text(db, file_hash) == "second 1second 2"
+
+        aborted = text_store_service.begin_pages()
+        text_store_service.append_pages(db, file_hash, aborted, pages("aborted", [1]))
+        text_store_service.abort_pages(db, file_hash, aborted)
+        assert db.query(DocumentText).filter(DocumentText.file_hash == file_hash).count() == 2
+        assert text_store_service.get_text(db, file_hash) == "second 1second 2"
+        text_store_service.invalidate(db, file_hash)
+    finally:
+        db.close()
+
+def test_to_jpg_failure_discards_uploaded_pages(monkeypatch):
+    import io
+    import tempfile
+    import uuid
+    import fitz
+    from PIL import Image
+    from app.api import documents as documents_api
+    from app.db.session import SessionLocal
+    from app.services.blob_store_service import blob_store_service
+    from app.services.storage_service import StorageService
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), f"Render me {uuid.uuid4()}")
+    files = {"file": ("render.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+
+    def jpeg(color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8), color).save(buffer, format="JPEG")
+        return buffer.getvalue()
+    shared, fresh = jpeg((1, 2, 3)), jpeg((200, 100, 50))
+    # Page 1 renders to content that is already stored as a blob
+    db = SessionLocal()
+    try:
+        shared_path = os.path.join(tempfile.mkdtemp(), "shared.jpg")
+        open(shared_path, "wb").write(shared)
+        shared_file, _ = blob_store_service.store_file(db, shared_path, "shared.jpg")
+        db.commit()
+    finally:
+        db.close()
+
+    uploads = []
+    upload_object = blob_store_service.upload_object
+    monkeypatch.setattr(blob_store_service, "upload_object", lambda *args: uploads.append(upload_object(*args)) or uploads[-1])
+    def failing_render(file_path, output_dir, dpi, page_range=None):
+        for page_number, data in ((1, shared), (2, fresh)):
+            path = os.path.join(output_dir, f"page_{page_number}.jpg")
+            open(path, "wb").write(data)
+            yield page_number, path
+        raise RuntimeError("renderer crashed")
+    monkeypatch.setattr(documents_api.pdf_processor, "iter_image_pages", failing_render)
+
+    resp = client.post(f"/api/v1/documents/{doc_id}/to-jpg", headers=headers)
+    assert resp.status_code == 500
+    local_path = StorageService()._local_path
+    # Both uploaded copies are gone; the object the existing blob holds is kept
+    assert len(uploads) == 2
+    assert uploads[0]["file_path"] != shared_file and os.path.exists(local_path(shared_file))
+    assert not any(os.path.exists(local_path(upload["file_path"])) for upload in uploads)
+
+    # HTTP errors raised inside the endpoint keep their status and detail
+    monkeypatch.setattr(documents_api.pdf_processor, "iter_image_pages", lambda *args, **kwargs: iter(()))
+    resp = client.post(f"/api/v1/documents/{doc_id}/to-jpg", headers=headers)
+    assert resp.status_code == 500
+    assert resp.json()["detail"] == "No images were generated from the PDF"
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+
+def test_executor_limits_metrics_and_thread_sessions(monkeypatch):
+    import asyncio
+    import threading
+    import time
+    import pytest
+    from sqlalchemy import text
+    from app.config import settings
+    from app.db.session import run_in_session
+    from app.services.executor_service import ExecutorService
+
+    monkeypatch.setitem(settings.EXECUTOR_OPERATION_LIMITS, "limited", 2)
+    executor = ExecutorService()
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def work(n):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return n * 2
+
+    def fail():
+        raise ValueError("boom")
+
+    def use_session(db):
+        db.execute(text("SELECT 1"))
+        return db
+
+    async def main():
+        results = await asyncio.gather(*(executor.run_in_thread("limited", work, n) for n in range(6)))
+        with pytest.raises(ValueError):
+            await executor.run_in_thread("limited", fail)
+        sessions = await asyncio.gather(*(executor.run_in_thread("text", run_in_session, use_session) for _ in range(3)))
+        power = await executor.run_in_process("cpu", pow, 3, 4)
+        return results, sessions, power
+
+    try:
+        results, sessions, power = asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert state["peak"] == 2
+    assert power == 81
+    # Every thread call got a session of its own, closed when the call returned
+    assert len({id(session) for session in sessions}) == 3
+    assert not any(session.in_transaction() for session in sessions)
+
+    metrics = executor.get_metrics()
+    limited = metrics["operations"]["limited"]
+    assert (limited["limit"], limited["completed"], limited["failed"]) == (2, 6, 1)
+    assert limited["waiting"] == limited["running"] == 0
+    assert limited["avg_run_ms"] > 0
+    assert metrics["operations"]["text"]["completed"] == 3
+    assert metrics["operations"]["cpu"]["completed"] == 1
+    assert metrics["total_waiting"] == metrics["total_running"] == 0
+
+def test_document_text_and_image_decoding_run_off_the_event_loop(monkeypatch):
+    import io
+    import uuid
+    import fitz
+    from PIL import Image
+    from app.db.session import SessionLocal
+    from app.db.models import Document
+    from app.services.executor_service import executor_service
+    from app.services.text_store_service import text_store_service
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), f"Details page {uuid.uuid4()}")
+    files = {"file": ("details.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        text_store_service.invalidate(db, db.get(Document, doc_id).file_hash)
+    finally:
+        db.close()
+
+    operations = []
+    run_in_thread = executor_service.run_in_thread
+
+    async def record(operation, func, *args, **kwargs):
+        operations.append(operation)
+        return await run_in_thread(operation, func, *args, **kwargs)
+
+    monkeypatch.setattr(executor_service, "run_in_thread", record)
+    resp = client.get(f"/api/v1/documents/{doc_id}", headers=headers)
+    assert "Details page" in resp.json()["text_content"]
+    assert operations == ["text", "ocr"]
+
+    operations.clear()
+    images = []
+    for color in ("red", "blue"):
+        buffer = io.BytesIO()
+        Image.new("RGB", (120, 80), color).save(buffer, format="PNG")
+        images.append(("files", (f"{color}.png", buffer.getvalue(), "image/png")))
+    resp = client.post("/api/v1/documents/image-to-pdf", files=images, headers=headers)
+    assert resp.status_code == 200
+    assert operations[0] == "convert"
+    pdf_id = resp.json()["id"]
+    with fitz.open(stream=client.get(f"/api/v1/documents/{pdf_id}/download", headers=headers).content, filetype="pdf") as pdf:
+        assert pdf.page_count == 2
+    for document_id in (pdf_id, doc_id):
+        client.delete(f"/api/v1/documents/{document_id}", headers=headers)
+
+def test_operation_cache_reuses_compressed_output():
+    from app.db.session import SessionLocal
+    from app.db.models import Document, OperationResult
+    import fitz
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    import uuid
+    doc.new_page().insert_text((72, 72), f"Compress me once {uuid.uuid4()}")
+    files = {"file": ("memo.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+
+    first = client.post(f"/api/v1/documents/{doc_id}/compress", headers=headers)
+    second = client.post(f"/api/v1/documents/{doc_id}/compress", headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert first.json()["id"] != second.json()["id"]
+
+    db = SessionLocal()
+    try:
+        outputs = [db.get(Document, response.json()["id"]) for response in (first, second)]
+        assert outputs[0].file_path == outputs[1].file_path
+        source_hash = db.get(Document, doc_id).file_hash
+        entry = db.query(OperationResult).filter_by(source_hash=source_hash, operation="compress").one()
+        assert entry.hit_count == 1
+    finally:
+        db.close()
+    for document_id in (first.json()["id"], second.json()["id"], doc_id):
+        client.delete(f"/api/v1/documents/{document_id}", headers=headers)
+
+def test_merge_page_ranges_and_outlines(tmp_path):
+    import fitz
+    import pytest
+    from app.core.merge_engine import merge_pdfs
+
+    paths = []
+    for n in range(2):
+        doc = fitz.open()
+        for i in range(4):
+            doc.new_page().insert_text((72, 72), f"doc{n} page{i + 1}")
+        doc.set_toc([[1, f"Doc {n}", 1], [2, "Part two", 3]])
+        path = str(tmp_path / f"in{n}.pdf")
+        doc.save(path)
+        paths.append(path)
+
+    output_path = str(tmp_path / "merged.pdf")
+    merge_pdfs([(paths[0], None), (paths[1], "3-4,1")], output_path)
+    with fitz.open(output_path) as merged:
+        assert [page.get_text().strip() for page in merged][4:] == ["doc1 page3", "doc1 page4", "doc1 page1"]
+        assert merged.get_toc() == [[1, "Doc 0", 1], [2, "Part two", 3], [1, "Doc 1", 7], [2, "Part two", 5]]
+
+    with pytest.raises(ValueError):
+        merge_pdfs([(paths[0], "5")], output_path)
+
+def test_compress_downsamples_images_and_keeps_text(tmp_path):
+    import io
+    import fitz
+    from PIL import Image
+    from app.core.compression import compress_pdf
+
+    image = Image.effect_noise((1200, 900), 64).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    input_path = str(tmp_path / "photo.pdf")
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Selectable text")
+    page.insert_image(fitz.Rect(72, 100, 372, 325), stream=buffer.getvalue())  # ~288 dpi
+    doc.save(input_path)
+
+    output_path = str(tmp_path / "compressed.pdf")
+    stats = compress_pdf(input_path, output_path, "screen")
+    assert stats["recompressed"] == 1
+    with fitz.open(output_path) as compressed:
+        assert "Selectable text" in compressed[0].get_text()
+        width, height = compressed[0].get_images(full=True)[0][2:4]
+        assert (width, height) == (300, 225)
+    assert os.path.getsize(output_path) < os.path.getsize(input_path)
+
+def test_sharded_compression_matches_serial(tmp_path, monkeypatch):
+    import io
+    import fitz
+    from PIL import Image
+    from app.config import settings
+    from app.core import compression
+
+    input_path = str(tmp_path / "pages.pdf")
+    doc = fitz.open()
+    for i in range(4):
+        buffer = io.BytesIO()
+        Image.effect_noise((900, 600), 30 + i).convert("RGB").save(buffer, format="PNG")
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}")
+        page.insert_image(fitz.Rect(72, 100, 222, 200), stream=buffer.getvalue())
+    doc.set_toc([[1, "First", 1], [1, "Last", 4]])
+    doc.save(input_path)
+
+    serial_path, sharded_path = str(tmp_path / "serial.pdf"), str(tmp_path / "sharded.pdf")
+    compression.compress_pdf(input_path, serial_path, "screen", parallel=False)
+    monkeypatch.setattr(settings, "COMPRESS_MAX_WORKERS", 2)
+    monkeypatch.setattr(settings, "COMPRESS_PARALLEL_MIN_PAGES", 2)
+    try:
+        stats = compression.compress_pdf(input_path, sharded_path, "screen")
+    finally:
+        compression.reset_compression_pool()
+    assert stats["shards"] == 2 and stats["recompressed"] == 4
+    with fitz.open(serial_path) as serial, fitz.open(sharded_path) as sharded:
+        assert sharded.get_toc() == [[1, "First", 1], [1, "Last", 4]]
+        assert [p.get_images(full=True)[0][2:4] for p in sharded] == [p.get_images(full=True)[0][2:4] for p in serial]
+
+def test_watermark_shared_stamp_on_selected_pages(tmp_path):
+    import fitz
+    import pytest
+    from app.core.watermark import add_watermark
+
+    input_path = str(tmp_path / "mixed.pdf")
+    doc = fitz.open()
+    for i, size in enumerate([(612, 792), (842, 595), (300, 300)]):
+        doc.new_page(width=size[0], height=size[1]).insert_text((20, 40), f"Page {i + 1}")
+    doc.save(input_path)
+
+    output_path = str(tmp_path / "stamped.pdf")
+    assert add_watermark(input_path, output_path, text="DRAFT", opacity=0.5, page_range="1-2") == 2
+    with fitz.open(output_path) as stamped:
+        assert ["DRAFT" in page.get_text() for page in stamped] == [True, True, False]
+        # Every stamped page draws the same stamp XObject, fitted inside its own page
+        stamps = [{xref for xref, name, *_ in page.get_xobjects() if name == "fullpage"} for page in stamped]
+        assert len(stamps[0] | stamps[1]) == 1 and not stamps[2]
+        for page in stamped.pages(0, 2):
+            assert page.rect.contains(page.search_for("DRAFT")[0])
+
+    with pytest.raises(ValueError):
+        add_watermark(input_path, output_path, text="DRAFT", page_range="4")
+    with pytest.raises(ValueError):
+        add_watermark(input_path, output_path)
+
+def test_batch_watermark_streams_per_document_results():
+    import json
+    import uuid
+    import fitz
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc_ids = []
+    for i in range(2):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), f"Batch {i} {uuid.uuid4()}")
+        files = {"file": (f"batch{i}.pdf", doc.tobytes(), "application/pdf")}
+        doc_ids.append(client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"])
+
+    response = client.post(
+        "/api/v1/documents/watermark/batch",
+        data={"document_ids": doc_ids + ["missing"], "watermark_text": "BATCH"},
+        headers=headers
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"done": True, "succeeded": 2, "failed": 1}
+    results = {line["document_id"]: line for line in lines[:-1]}
+    assert results["missing"]["status"] == "error"
+    for document_id in doc_ids:
+        output_id = results[document_id]["id"]
+        download = client.get(f"/api/v1/documents/{output_id}/download", headers=headers)
+        with fitz.open("pdf", download.content) as stamped:
+            assert "BATCH" in stamped[0].get_text()
+        client.delete(f"/api/v1/documents/{output_id}", headers=headers)
+        client.delete(f"/api/v1/documents/{document_id}", headers=headers)
+
+def test_page_thumbnails_cached_with_content_etag():
+    import io
+    import uuid
+    import fitz
+    from PIL import Image
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    doc.new_page(width=612, height=792).insert_text((72, 72), f"Thumb {uuid.uuid4()}")
+    doc.new_page(width=842, height=595)
+    files = {"file": ("thumbs.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+
+    url = f"/api/v1/documents/{doc_id}/thumbnails/1"
+    first = client.get(url, params={"size": "small"}, headers=headers)
+    assert first.status_code == 200
+    assert max(Image.open(io.BytesIO(first.content)).size) == 160
+    second = client.get(url, params={"size": "small"}, headers=headers)
+    assert second.content == first.content and second.headers["etag"] == first.headers["etag"]
+    revalidated = client.get(url, params={"size": "small"}, headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert client.get(url, params={"size": "huge"}, headers=headers).status_code == 400
+    assert client.get(f"/api/v1/documents/{doc_id}/thumbnails/2", headers=headers).status_code == 400
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+
+def test_thumbnail_sprites_match_manifest(monkeypatch):
+    import io
+    import uuid
+    import fitz
+    from PIL import Image
+    from app.config import settings
+    monkeypatch.setattr(settings, "THUMBNAIL_SPRITE_PAGES", 2)
+    token = get_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    doc = fitz.open()
+    for i, size in enumerate([(612, 792), (842, 595), (300, 300)]):
+        doc.new_page(width=size[0], height=size[1]).insert_text((20, 40), f"Sprite {i} {uuid.uuid4()}")
+    files = {"file": ("sprites.pdf", doc.tobytes(), "application/pdf")}
+    doc_id = client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"]
+
+    manifest = client.get(f"/api/v1/documents/{doc_id}/sprites", headers=headers).json()
+    assert manifest["page_count"] == 3
+    assert [[cell["page"] for cell in sprite["pages"]] for sprite in manifest["sprites"]] == [[0, 1], [2]]
+    first = manifest["sprites"][0]
+    assert first["pages"][1]["y"] == first["pages"][0]["height"]
+    sprite = client.get(f"/api/v1/documents/{doc_id}/sprites/0", headers=headers)
+    assert sprite.status_code == 200
+    assert Image.open(io.BytesIO(sprite.content)).size == (first["width"], first["height"])
+    assert client.get(f"/api/v1/documents/{doc_id}/sprites/2", headers=headers).status_code == 400
+    client.delete(f"/api/v1/documents/{doc_id}", headers=headers)
+
+def test_rasterize_pages_in_parallel_chunks(tmp_path, monkeypatch):
+    import shutil
+    import fitz
+    from PIL import Image
+    from app.config import settings
+    from app.core.rasterizer import rasterize_pages
+
+    input_path = str(tmp_path / "pages.pdf")
+    doc = fitz.open()
+    for i in range(5):
+        doc.new_page(width=144, height=72).insert_text((10, 40), f"Page {i + 1}")
+    doc.save(input_path)
+
+    monkeypatch.setattr(settings, "RASTERIZE_CHUNK_PAGES", 2)
+    # Poppler is an opt-in fallback; check it too where it is installed
+    backends = ["pymupdf"] + (["poppler"] if shutil.which("pdftoppm") else [])
+    for backend in backends:
+        pages = sorted(rasterize_pages(input_path, str(tmp_path / backend), dpi=72, max_workers=2, backend=backend))
+        assert [page for page, _ in pages] == [1, 2, 3, 4, 5]
+        for page, path in pages:
+            assert path.endswith(f"page_{page}.jpg")
+            assert Image.open(path).size == (144, 72)
+
+    pages = list(rasterize_pages(input_path, str(tmp_path / "gray"), dpi=144, fmt="png",
+                                 page_range="2", colorspace="gray", alpha=True))
+    assert [page for page, _ in pages] == [2]
+    assert Image.open(pages[0][1]).mode == "LA"
+    assert Image.open(pages[0][1]).size == (288, 144)
+
+def test_stream_zip_and_page_selection(tmp_path):
+    import io
+    import zipfile
+    from app.core.rasterizer import select_pages, _chunks
+    from app.utils.streaming import stream_zip
+
+    assert select_pages("2-4,9,3", 10) == [2, 3, 4, 9]
+    assert _chunks([2, 3, 4, 9], 2) == [(2, 3), (4, 4), (9, 9)]
+
+    entries = []
+    for i in range(3):
+        path = tmp_path / f"page_{i + 1}.bin"
+        path.write_bytes(bytes([i]) * (1000 * (i + 1)))
+        entries.append((f"page_{i + 1}.bin", str(path)))
+    archive = b"".join(stream_zip(iter(entries), remove_files=True, chunk_size=512))
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["page_1.bin", "page_2.bin", "page_3.bin"]
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+        assert zf.read("page_2.bin") == bytes([1]) * 2000
+    assert not any(tmp_path.iterdir())
+
+class FakeOfficeListener:
+    """Stand-in for OfficeListener that converts by copying"""
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.conversions = 0
+        self.healthy = True
+        self.starts = 0
+        self.recycles = 0
+
+    def start(self):
+        self.starts += 1
+        self.conversions = 0
+        self.healthy = True
+
+    def stop(self):
+        self.healthy = False
+
+    def is_healthy(self):
+        return self.healthy
+
+    def recycle(self):
+        self.recycles += 1
+        self.stop()
+        self.start()
+
+    def destroy(self):
+        self.stop()
+
+    def convert(self, input_path, output_path, timeout):
+        if open(input_path).read() == "fail":
+            raise Exception("Conversion failed")
+        import shutil
+        shutil.copy(input_path, output_path)
+        self.conversions += 1
+
+def test_office_pool_acquire_recycle_and_restart(tmp_path, monkeypatch):
+    import pytest
+    from app.config import settings
+    from app.core.office_pool import OfficePool
+
+    monkeypatch.setattr(settings, "OFFICE_POOL_MAX_CONVERSIONS", 2)
+    listeners = []
+
+    def make_listener(slot):
+        listeners.append(FakeOfficeListener(slot))
+        return listeners[-1]
+
+    pool = OfficePool(size=2, listener_factory=make_listener)
+
+    # Both listeners checked out: a third acquire times out
+    with pool.acquire() as first, pool.acquire() as second:
+        assert {first.slot, second.slot} == {0, 1}
+        with pytest.raises(Exception, match="available in time"):
+            with pool.acquire(timeout=0.1):
+                pass
+    assert pool.get_stats()["idle"] == 2
+
+    source = tmp_path / "in.docx"
+    source.write_text("document")
+    for i in range(4):
+        pool.convert(str(source), str(tmp_path / f"out_{i}.pdf"))
+    assert sum(listener.recycles for listener in listeners) == 2
+    assert pool.get_stats()["recycles"] == 2
+
+    # A failed conversion stops the listener; it is restarted on its next checkout
+    source.write_text("fail")
+    with pytest.raises(Exception, match="Conversion failed"):
+        pool.convert(str(source), str(tmp_path / "failed.pdf"))
+    assert pool.get_stats()["failures"] == 1
+    stopped = [listener for listener in listeners if not listener.healthy]
+    assert len(stopped) == 1
+    with pool.acquire(), pool.acquire():
+        pass
+    assert stopped[0].healthy
+    assert pool.get_stats()["restarts"] == 1
+    pool.shutdown()
+
+def test_office_listener_converts_over_xmlrpc_and_times_out(tmp_path, monkeypatch):
+    import shutil
+    import threading
+    import time
+    import pytest
+    from xmlrpc.server import SimpleXMLRPCServer
+    from app.core import office_pool
+
+    # Stub of unoserver's XML-RPC API
+    def convert(inpath, indata, outpath, convert_to):
+        if inpath.endswith("slow.docx"):
+            time.sleep(2)
+        shutil.copy(inpath, outpath)
+        return None
+
+    server = SimpleXMLRPCServer(("127.0.0.1", 0), allow_none=True, logRequests=False)
+    server.register_function(convert)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(office_pool, "_unoserver_available", True)
+    listener = office_pool.OfficeListener(0, "soffice")
+    listener.port = server.server_address[1]
+    try:
+        source = tmp_path / "in.docx"
+        source.write_text("document")
+        listener.convert(str(source), str(tmp_path / "out.pdf"), timeout=5)
+        assert (tmp_path / "out.pdf").read_text() == "document"
+        assert listener.conversions == 1
+
+        slow = tmp_path / "slow.docx"
+        slow.write_text("document")
+        with pytest.raises(TimeoutError):
+            listener.convert(str(slow), str(tmp_path / "slow.pdf"), timeout=0.3)
+        assert listener.conversions == 1
+    finally:
+        server.shutdown()
+        listener.destroy()
+
+def _job_queue(monkeypatch):
+    """Point the job service at an in-memory Redis and a controllable clock"""
+    import pytest
+    from types import SimpleNamespace
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.services import job_service as job_module
+    from app.services.redis_service import redis_service
+
+    monkeypatch.setattr(redis_service, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(redis_service, "is_connected", True)
+    clock = [1000.0]
+    monkeypatch.setattr(job_module, "time", SimpleNamespace(time=lambda: clock[0]))
+    return job_module.job_service, redis_service.redis_client, clock
+
+def test_job_retry_backoff_then_failure(monkeypatch):
+    from app.config import settings
+    job_service, redis, clock = _job_queue(monkeypatch)
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_SECONDS", 10)
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 3)
+
+    job = job_service.create_job("compress", "doc-1", "owner-1")
+    for attempt, delay in ((1, 10), (2, 20)):
+        raw_task, reserved = job_service.reserve(timeout=1)
+        assert reserved["attempts"] == attempt
+        assert redis.llen(job_service.processing_name) == 1
+        job_service.fail(raw_task, reserved, "boom")
+        # Acked from processing and parked in the delayed set for the doubled backoff
+        assert redis.llen(job_service.processing_name) == 0
+        assert redis.zscore(job_service.delayed_name, job["id"]) == clock[0] + delay
+        assert job_service.get_job(job["id"])["status"] == "retrying"
+        assert job_service.promote_delayed() == 0
+        clock[0] += delay
+        assert job_service.promote_delayed() == 1
+        assert job_service.get_job(job["id"])["status"] == "queued"
+
+    raw_task, reserved = job_service.reserve(timeout=1)
+    job_service.fail(raw_task, reserved, "boom")
+    failed = job_service.get_job(job["id"])
+    assert failed["status"] == "failed" and failed["attempts"] == 3
+    assert redis.zcard(job_service.delayed_name) == 0
+    assert redis.llen(job_service.processing_name) == 0
+
+def test_job_visibility_timeout_requeue_and_ack(monkeypatch):
+    from app.config import settings
+    job_service, redis, clock = _job_queue(monkeypatch)
+    monkeypatch.setattr(settings, "JOB_VISIBILITY_TIMEOUT", 60)
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_SECONDS", 0)
+
+    job = job_service.create_job("compress", "doc-1", "owner-1")
+    job_service.reserve(timeout=1)
+    # A heartbeat extends the lease
+    clock[0] += 50
+    job_service.update_progress(job["id"], 40)
+    clock[0] += 50
+    assert job_service.requeue_expired() == 0
+    # No heartbeat for longer than the visibility timeout: the task goes back for a retry
+    clock[0] += 61
+    assert job_service.requeue_expired() == 1
+    assert redis.llen(job_service.processing_name) == 0
+    assert job_service.promote_delayed() == 1
+
+    raw_task, reserved = job_service.reserve(timeout=1)
+    assert reserved["attempts"] == 2
+    job_service.complete(raw_task, job["id"], {"document_id": "out"})
+    done = job_service.get_job(job["id"])
+    assert done["status"] == "succeeded" and done["lease_until"] is None
+    assert redis.llen(job_service.processing_name) == 0
+    assert redis.ttl(job_service._job_key(job["id"])) == settings.JOB_RESULT_TTL
+    assert job_service.requeue_expired() == 0
+
+def test_worker_heartbeat_stops_before_completion(monkeypatch):
+    import time
+    import pytest
+    from app import worker
+    from app.config import settings
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.services.job_service import job_service
+    from app.services.redis_service import redis_service
+
+    monkeypatch.setattr(redis_service, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(redis_service, "is_connected", True)
+    monkeypatch.setattr(settings, "JOB_VISIBILITY_TIMEOUT", 3)  # heartbeat every second
+
+    def slow_handler(db, job, progress):
+        time.sleep(1.5)
+        return {"ok": True}
+
+    monkeypatch.setitem(worker.JOB_HANDLERS, "compress", slow_handler)
+    job = job_service.create_job("compress", "doc-1", "owner-1")
+    worker.process_job(*job_service.reserve(timeout=1))
+    time.sleep(1.2)
+    done = job_service.get_job(job["id"])
+    assert done["status"] == "succeeded"
+    assert done["lease_until"] is None and done["progress"] == 100
+
+def test_list_fields_cursor_paging_and_has_text():
+    import uuid
+    import fitz
+    from datetime import datetime
+    from app.db.models import Document
+    from app.db.session import SessionLocal
+    from app.services.text_store_service import text_store_service
+
+    email = f"lister_{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/api/v1/auth/register", json={"email": email, "password": "listpassword"})
+    token = client.post("/api/v1/auth/token", data={"username": email, "password": "listpassword"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    doc_ids = []
+    for i in range(3):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), f"List page {i} {uuid.uuid4()}")
+        files = {"file": (f"list_{i}.pdf", doc.tobytes(), "application/pdf")}
+        doc_ids.append(client.post("/api/v1/documents/upload", files=files, headers=headers).json()["id"])
+
+    # Same created_at for all three: order and paging fall back to the id
+    db = SessionLocal()
+    try:
+        same_time = datetime(2024, 1, 1, 12, 0, 0)
+        db.query(Document).filter(Document.id.in_(doc_ids)).update({"created_at": same_time}, synchronize_session=False)
+        db.commit()
+        stripped_hash = db.query(Document).filter(Document.id == doc_ids[0]).one().file_hash
+        text_store_service.invalidate(db, stripped_hash)
+    finally:
+        db.close()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 1, "fields": "id,has_text"} | ({"cursor": cursor} if cursor else {})
+        page = client.get("/api/v1/documents/list", params=params, headers=headers).json()
+        assert len(page["documents"]) == 1
+        assert set(page["documents"][0]) == {"id", "has_text"}
+        seen.extend(page["documents"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert [item["id"] for item in seen] == sorted(doc_ids, reverse=True)
+    has_text = {item["id"]: item["has_text"] for item in seen}
+    assert has_text[doc_ids[0]] is False
+    assert has_text[doc_ids[1]] is True and has_text[doc_ids[2]] is True
+
+    assert client.get("/api/v1/documents/list", params={"fields": "id,secret"}, headers=headers).status_code == 400
+    assert client.get("/api/v1/documents/list", params={"cursor": "not-a-cursor"}, headers=headers).status_code == 400
+    for doc_id in doc_ids:
+        client.delete(f"/api/v1/documents/{doc_id}", headers=headers)